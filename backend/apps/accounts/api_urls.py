@@ -0,0 +1,10 @@
+from rest_framework.routers import DefaultRouter
+from . import views as api_views
+
+app_name = 'accounts-api'
+
+router = DefaultRouter()
+router.register(r'users', api_views.UserViewSet)
+router.register(r'profiles', api_views.ProfileViewSet, basename='profile')
+
+urlpatterns = router.urls
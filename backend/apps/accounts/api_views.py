@@ -1,10 +1,10 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from .authentication import issue, revoke
 from .serializers import (
     UserSerializer, UserCreateSerializer,
     PasswordChangeSerializer, ProfileSerializer
@@ -106,7 +106,7 @@ class UserViewSet(viewsets.ModelViewSet):
             )
 
         # Get or create token
-        token, _ = Token.objects.get_or_create(user=user)
+        token = issue(user)
         
         return Response({
             'token': token.key,
@@ -137,7 +137,8 @@ class UserViewSet(viewsets.ModelViewSet):
 
             user.set_password(serializer.validated_data['new_password'])
             user.save()
-            return Response({'status': 'password changed'})
+            revoke(user)
+            return Response({'status': 'password changed', 'token': issue(user).key})
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
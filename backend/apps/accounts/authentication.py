@@ -0,0 +1,138 @@
+"""
+Token authentication without a database query per request.
+
+``CachedTokenAuthentication`` resolves a token to its user from an
+in-process LRU (``AUTH_TOKEN_LOCAL_CACHE_SIZE`` entries, kept for
+``AUTH_TOKEN_LOCAL_CACHE_TTL`` seconds) and then from the shared cache
+(``AUTH_TOKEN_CACHE_TIMEOUT``), and only joins ``authtoken_token`` and
+``auth_user`` on a miss. Cache keys are hashes of the tokens and the cached
+user is loaded without its password hash.
+
+Saving or deleting a user (password change, deactivation, role change) and
+deleting a token evict the user's entry from the shared cache and from this
+process; other processes may keep using their local copy for up to
+``AUTH_TOKEN_LOCAL_CACHE_TTL`` seconds, so keep that short (0 disables the
+local layer).
+
+With ``AUTH_TOKEN_TTL`` set, tokens older than that many seconds are
+rejected and deleted; ``issue`` replaces an expired token on login.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache_key(key):
+    return 'accounts:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+class LocalCache:
+    """A small thread-safe LRU whose entries expire after ``AUTH_TOKEN_LOCAL_CACHE_TTL`` seconds."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        ttl = _setting('AUTH_TOKEN_LOCAL_CACHE_TTL', 5)
+        if ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > _setting('AUTH_TOKEN_LOCAL_CACHE_SIZE', 10000):
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalCache()
+
+
+def _expired(created):
+    ttl = _setting('AUTH_TOKEN_TTL', None)
+    return ttl is not None and created <= timezone.now() - timedelta(seconds=ttl)
+
+
+def _load(key):
+    token = Token.objects.select_related('user').defer('user__password').filter(key=key).first()
+    if token is None:
+        return None
+    entry = {'user': token.user, 'created': token.created}
+    cache.set(_cache_key(key), entry, _setting('AUTH_TOKEN_CACHE_TIMEOUT', 15 * 60))
+    return entry
+
+
+def evict(*keys):
+    if keys:
+        cache.delete_many([_cache_key(key) for key in keys])
+        for key in keys:
+            local_cache.delete(_cache_key(key))
+
+
+def evict_user(user_id):
+    evict(*Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+def issue(user):
+    """The user's token, created on first login and replaced once expired."""
+    token, created = Token.objects.get_or_create(user=user)
+    if not created and _expired(token.created):
+        token.delete()
+        token = Token.objects.create(user=user)
+    return token
+
+
+def revoke(user):
+    """Delete the user's token (logout); the next API call has to log in again."""
+    Token.objects.filter(user=user).delete()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        entry = local_cache.get(cache_key) or cache.get(cache_key) or _load(key)
+        if entry is None:
+            raise AuthenticationFailed('Invalid token.')
+        if _expired(entry['created']):
+            Token.objects.filter(key=key).delete()
+            raise AuthenticationFailed('Token has expired.')
+        if not entry['user'].is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        local_cache.set(cache_key, entry)
+
+        # Every request gets its own user; views may modify and save it
+        user = copy.copy(entry['user'])
+        return user, Token(key=key, user=user, created=entry['created'])
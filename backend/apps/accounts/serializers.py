@@ -11,6 +11,11 @@ class UserSerializer(serializers.ModelSerializer):
                  'phone', 'address', 'profile_image', 'date_joined')
         read_only_fields = ('date_joined',)
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'username')
+
 class UserCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
@@ -48,4 +53,32 @@ class ProfileSerializer(serializers.ModelSerializer):
             'username', 'email', 'first_name', 'last_name',
             'phone', 'address', 'profile_image', 'created_at', 'updated_at'
         )
-        read_only_fields = ('username', 'email', 'created_at', 'updated_at')
\ No newline at end of file
+        read_only_fields = ('username', 'email', 'created_at', 'updated_at')
+
+class SnapshotLoanSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    book = serializers.DictField()
+    issue_date = serializers.DateTimeField()
+    due_date = serializers.DateTimeField()
+    return_date = serializers.DateTimeField(allow_null=True)
+    status = serializers.CharField()
+    is_overdue = serializers.BooleanField()
+    days_overdue = serializers.IntegerField()
+
+
+class SnapshotFineSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    loan_id = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    reason = serializers.CharField()
+    status = serializers.CharField()
+    due_date = serializers.DateTimeField()
+
+
+class AccountSummarySerializer(serializers.Serializer):
+    total_loans = serializers.IntegerField()
+    overdue_count = serializers.IntegerField()
+    outstanding_fine_total = serializers.DecimalField(max_digits=10, decimal_places=2)
+    active_loans = SnapshotLoanSerializer(many=True)
+    recent_loans = SnapshotLoanSerializer(many=True)
+    outstanding_fines = SnapshotFineSerializer(many=True)
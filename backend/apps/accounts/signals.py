@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from apps.fines.models import Fine
+from apps.loans.models import BookLoan
+from . import authentication, snapshot
+
+@receiver([post_save, post_delete], sender=BookLoan)
+@receiver([post_save, post_delete], sender=Fine)
+def invalidate_owner_snapshot(sender, instance, **kwargs):
+    snapshot.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def evict_user_tokens(sender, instance, **kwargs):
+    transaction.on_commit(lambda: authentication.evict_user(instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: authentication.evict(instance.key))
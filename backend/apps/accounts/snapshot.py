@@ -0,0 +1,130 @@
+"""
+Cached per-user library account snapshots.
+
+``get`` returns the user's active loans, recent loan history, outstanding
+fines and totals from the cache, building them (five queries) on a miss.
+Loan, return and fine events (payments save their fine) call ``invalidate``, which bumps the
+user's version key after commit; a snapshot built from an older version is
+ignored, so a rebuild racing with an event never serves stale data.
+
+Overdue flags are derived from ``due_date`` at read time, so a snapshot
+does not go stale when a loan passes its due date.
+
+``catalog_counts`` holds the global book counters, computed at most once
+per ``CATALOG_COUNTS_TIMEOUT`` seconds and shared by everybody.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.books.models import Book
+from apps.fines.models import Fine
+from apps.loans.models import BookLoan
+
+HISTORY_SIZE = 5
+CATALOG_COUNTS_KEY = 'accounts:catalog_counts'
+
+
+def _data_key(user_id):
+    return f'accounts:snapshot:{user_id}'
+
+
+def _version_key(user_id):
+    return f'accounts:snapshot:{user_id}:version'
+
+
+def _timeout():
+    return getattr(settings, 'ACCOUNT_SNAPSHOT_TIMEOUT', 15 * 60)
+
+
+def _loan(row):
+    return {
+        'id': row['pk'],
+        'book': {'id': row['book_id'], 'title': row['book__title']},
+        'issue_date': row['issue_date'],
+        'due_date': row['due_date'],
+        'return_date': row['return_date'],
+        'status': row['status'],
+    }
+
+
+def build(user_id):
+    """Compute a snapshot from the loan and fine tables."""
+    fields = ('pk', 'book_id', 'book__title', 'issue_date', 'due_date', 'return_date', 'status')
+    loans = BookLoan.objects.filter(user_id=user_id)
+    active = loans.filter(return_date__isnull=True).order_by('due_date', 'pk').values(*fields)
+    recent = loans.order_by('-issue_date', '-pk').values(*fields)[:HISTORY_SIZE]
+    history = loans.filter(return_date__isnull=False).order_by('-return_date', '-pk').values(*fields)[:HISTORY_SIZE]
+    fines = list(
+        Fine.objects.filter(user_id=user_id, payment_date__isnull=True).order_by('due_date', 'pk')
+        .values('pk', 'loan_id', 'amount', 'reason', 'status', 'due_date')
+    )
+    return {
+        'total_loans': loans.count(),
+        'active_loans': [_loan(row) for row in active],
+        'recent_loans': [_loan(row) for row in recent],
+        'loan_history': [_loan(row) for row in history],
+        'outstanding_fines': [{'id': fine.pop('pk'), **fine} for fine in fines],
+        'outstanding_fine_total': sum((fine['amount'] for fine in fines), Decimal('0')),
+    }
+
+
+def _with_overdue(snapshot):
+    now = timezone.now()
+    for loan in snapshot['active_loans'] + snapshot['recent_loans'] + snapshot['loan_history']:
+        loan['is_overdue'] = loan['return_date'] is None and loan['due_date'] < now
+        loan['days_overdue'] = (now - loan['due_date']).days if loan['is_overdue'] else 0
+    snapshot['overdue_loans'] = [loan for loan in snapshot['active_loans'] if loan['is_overdue']]
+    snapshot['overdue_count'] = len(snapshot['overdue_loans'])
+    return snapshot
+
+
+def get(user):
+    """The snapshot for ``user`` (a user or user id)."""
+    user_id = getattr(user, 'pk', user)
+    data_key, version_key = _data_key(user_id), _version_key(user_id)
+    cached = cache.get_many([data_key, version_key])
+    version = cached.get(version_key)
+    if version is None:
+        cache.add(version_key, 0, None)
+        version = cache.get(version_key, 0)
+
+    entry = cached.get(data_key)
+    if entry is None or entry['version'] != version:
+        entry = {'version': version, 'snapshot': build(user_id)}
+        cache.set(data_key, entry, _timeout())
+    return _with_overdue(entry['snapshot'])
+
+
+def invalidate(*user_ids):
+    """Drop the snapshots of ``user_ids`` once the current transaction commits."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+
+    def bump():
+        for user_id in user_ids:
+            key = _version_key(user_id)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+    transaction.on_commit(bump)
+
+
+def catalog_counts():
+    """``{'total_books': .., 'available_books': ..}``, shared across users."""
+    counts = cache.get(CATALOG_COUNTS_KEY)
+    if counts is None:
+        counts = Book.objects.aggregate(
+            total_books=Count('pk'),
+            available_books=Count('pk', filter=Q(available_copies__gt=0))
+        )
+        cache.set(CATALOG_COUNTS_KEY, counts, getattr(settings, 'CATALOG_COUNTS_TIMEOUT', 60))
+    return counts
@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout, authenticate, get_user_model
 from django.contrib.auth.decorators import login_required
@@ -13,14 +14,14 @@ from django.conf import settings
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
+from library_system.shortcuts import arender
+from .authentication import issue, revoke
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 from .serializers import (
     UserSerializer, UserCreateSerializer,
-    PasswordChangeSerializer, ProfileSerializer
+    PasswordChangeSerializer, ProfileSerializer, AccountSummarySerializer
 )
-from apps.loans.models import BookLoan
-from apps.fines.models import Fine
+from . import snapshot
 
 User = get_user_model()
 
@@ -47,7 +48,7 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = UserCreateSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            token, _ = Token.objects.get_or_create(user=user)
+            token = issue(user)
             return Response({
                 'token': token.key,
                 'user': UserSerializer(user).data
@@ -72,7 +73,7 @@ class UserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        token, _ = Token.objects.get_or_create(user=user)
+        token = issue(user)
         return Response({
             'token': token.key,
             'user': UserSerializer(user).data
@@ -155,12 +156,12 @@ def password_change_view(request):
     
     return render(request, 'accounts/password_change.html', {'form': form})
 
-def password_reset_view(request):
+async def password_reset_view(request):
     if request.method == 'POST':
         form = PasswordResetForm(request.POST)
         if form.is_valid():
             email = form.cleaned_data['email']
-            user = User.objects.filter(email=email).first()
+            user = await User.objects.filter(email=email).afirst()
             if user:
                 # Generate reset token
                 token = default_token_generator.make_token(user)
@@ -180,8 +181,8 @@ def password_reset_view(request):
                 email_subject = 'Reset your password'
                 email_body = render_to_string('accounts/emails/password_reset_email.html', context)
                 
-                # Send email
-                send_mail(
+                # Send email; mail backends block, so off the event loop
+                await sync_to_async(send_mail, thread_sensitive=False)(
                     email_subject,
                     email_body,
                     settings.DEFAULT_FROM_EMAIL,
@@ -194,7 +195,7 @@ def password_reset_view(request):
     else:
         form = PasswordResetForm()
     
-    return render(request, 'accounts/password_reset.html', {'form': form})
+    return await arender(request, 'accounts/password_reset.html', {'form': form})
 
 def password_reset_confirm_view(request, uidb64, token):
     try:
@@ -235,34 +236,12 @@ def profile_view(request):
     else:
         form = CustomUserChangeForm(instance=request.user)
     
-    # Get user's loan statistics
-    active_loans = BookLoan.objects.filter(
-        user=request.user,
-        return_date__isnull=True
-    ).select_related('book')
-    
-    loan_history = BookLoan.objects.filter(
-        user=request.user,
-        return_date__isnull=False
-    ).select_related('book').order_by('-return_date')[:5]
-    
-    # Get user's fine statistics
-    outstanding_fines = Fine.objects.filter(
-        user=request.user,
-        payment_date__isnull=True
-    ).select_related('loan', 'loan__book')
-    
-    paid_fines = Fine.objects.filter(
-        user=request.user,
-        payment_date__isnull=False
-    ).select_related('loan', 'loan__book').order_by('-payment_date')[:5]
-    
+    account = snapshot.get(request.user)
     context = {
         'form': form,
-        'active_loans': active_loans,
-        'loan_history': loan_history,
-        'outstanding_fines': outstanding_fines,
-        'paid_fines': paid_fines,
+        'active_loans': account['active_loans'],
+        'loan_history': account['loan_history'],
+        'outstanding_fines': account['outstanding_fines'],
     }
     
     return render(request, 'accounts/profile.html', context)
@@ -285,6 +264,7 @@ def password_change_view(request):
             
         request.user.set_password(new_password1)
         request.user.save()
+        revoke(request.user)
         messages.success(request, 'Your password was successfully updated!')
         return redirect('accounts:profile')
     
@@ -302,7 +282,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return self.serializer_class
 
     def get_permissions(self):
-        if self.action == 'create':
+        if self.action in ['create', 'login']:
             return [permissions.AllowAny()]
         return super().get_permissions()
 
@@ -328,11 +308,41 @@ class UserViewSet(viewsets.ModelViewSet):
 
             user.set_password(serializer.validated_data['new_password'])
             user.save()
-            return Response({"status": "password changed"})
+            # Tokens issued before the change stop working
+            revoke(user)
+            response = {"status": "password changed"}
+            if user == request.user:
+                response['token'] = issue(user).key
+            return Response(response)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def login(self, request):
+        user = authenticate(
+            username=request.data.get('username'),
+            password=request.data.get('password')
+        )
+        if not user:
+            return Response(
+                {'error': 'Invalid credentials'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        return Response({
+            'token': issue(user).key,
+            'user': UserSerializer(user).data
+        })
+
+    @action(detail=False, methods=['post'])
+    def logout(self, request):
+        revoke(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(detail=False, methods=['get'])
     def me(self, request):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='me/summary')
+    def me_summary(self, request):
+        return Response(AccountSummarySerializer(snapshot.get(request.user)).data)
@@ -1,5 +1,5 @@
 from rest_framework.routers import DefaultRouter
-from . import api_views
+from . import views as api_views
 
 app_name = 'books-api'
 
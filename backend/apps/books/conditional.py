@@ -0,0 +1,119 @@
+"""
+Conditional GETs (ETag / Last-Modified) for the catalog.
+
+A book's representation only changes when the book row, one of its copies,
+authors or categories changes, so ``book_modified`` takes the latest
+``updated_at`` over those rows in one query on the primary key and the
+relation indexes. Loans move ``updated_at`` through ``apps.loans.inventory``;
+changes that would not move the maximum (a copy deleted, an author unlinked)
+touch the book row instead, see ``signals``.
+
+Lists cannot afford that per page. Every catalog change registers
+``catalog_changed``, which after commit replaces the catalog version, a
+timestamp kept in the cache; a list response is tagged with the version
+read *before* the data, so a response racing a change is revalidated.
+The same hook drops the cached pages of the books involved
+(``library_system.fragments``).
+
+A matching request is answered 304 before the queryset is evaluated or
+anything is serialized.
+"""
+import hashlib
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from library_system import fragments
+from .models import Author, Book, BookCopy, Category
+
+VERSION_KEY = 'books:catalog:version'
+
+
+def catalog_version():
+    """Nanosecond timestamp of the last catalog change (set on first use)."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY, 0)
+    return version
+
+
+def catalog_changed(book_ids=()):
+    """
+    Register a catalog change (of ``book_ids`` if known): after commit the
+    catalog version moves and the books' cached pages are dropped.
+    """
+    tags = [f'book:{book_id}' for book_id in book_ids]
+
+    def publish():
+        cache.set(VERSION_KEY, time.time_ns(), None)
+        fragments.invalidate(*tags)
+
+    transaction.on_commit(publish)
+
+
+def touch_books(book_ids):
+    """Move ``updated_at`` of books whose related rows changed without leaving a newer timestamp."""
+    book_ids = list(book_ids)
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).update(updated_at=timezone.now())
+    catalog_changed(book_ids)
+
+
+def _latest(queryset):
+    return Coalesce(Subquery(queryset.order_by('-updated_at').values('updated_at')[:1]), 'updated_at')
+
+
+def book_modified(book_id):
+    """Latest ``updated_at`` of the book and its copies, authors and categories; None if no such book."""
+    try:
+        book = Book.objects.filter(pk=book_id)
+    except (TypeError, ValueError):
+        return None
+    return book.annotate(modified=Greatest(
+        'updated_at',
+        _latest(BookCopy.objects.filter(book=OuterRef('pk'))),
+        _latest(Author.objects.filter(books=OuterRef('pk'))),
+        _latest(Category.objects.filter(books=OuterRef('pk'))),
+    )).values_list('modified', flat=True).first()
+
+
+def etag(*parts):
+    digest = hashlib.blake2b(':'.join(str(part) for part in parts).encode(), digest_size=12)
+    return f'"{digest.hexdigest()}"'
+
+
+def respond(request, etag, last_modified, render):
+    """
+    ``304 Not Modified`` if the client's copy matches ``etag`` / ``last_modified``
+    (a POSIX timestamp), else ``render()``; successful responses carry both validators.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Clients may keep the response but must revalidate it
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class CatalogListMixin:
+    """Tag ``list`` responses with the catalog version; a client polling an unchanged catalog gets 304."""
+
+    def list(self, request, *args, **kwargs):
+        version = catalog_version()
+        return respond(
+            request,
+            etag('list', version, request.user.pk, request.accepted_renderer.format, request.get_full_path()),
+            version // 10 ** 9,
+            partial(super().list, request, *args, **kwargs)
+        )
@@ -0,0 +1,199 @@
+"""
+Precomputed catalog facet counts.
+
+The catalog is summarised as a small grid of book counts keyed by
+``(category_id, available, decade)`` (``category_id`` None holds the
+distinct-book totals) plus per-author ``(books, available)`` pairs. The grid
+is built with a few grouped queries and kept in the cache, so rendering the
+category / availability / decade filters only walks the grid instead of
+running a GROUP BY over the books on every page view.
+
+Book, copy, category and author changes, and loans that move a book across
+the "no copies available" boundary, call ``mark_dirty``. The grid is rebuilt
+by the ``refresh_facets`` task, or by the first reader once it has been
+dirty for ``FACETS_MAX_STALENESS`` seconds. Both marking and rebuilding
+drop the cached listing pages (``CATALOG_TAG``).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, ExtractYear
+
+from library_system import fragments
+from .models import Author, Book, Category
+
+FACETS_KEY = 'books:facets'
+AUTHORS_KEY = 'books:facets:authors'
+DIRTY_KEY = 'books:facets:dirty'
+LOCK_KEY = 'books:facets:lock'
+LOCK_TIMEOUT = 60
+
+# Fragment tag of cached pages that list books or show facet counts
+CATALOG_TAG = 'catalog'
+
+
+def _max_staleness():
+    return getattr(settings, 'FACETS_MAX_STALENESS', 60)
+
+
+def _grid_rows(books, category_field=None):
+    fields = ['decade', 'is_available'] + ([category_field] if category_field else [])
+    return books.annotate(
+        # EXTRACT is numeric on PostgreSQL; integer division needs an integer
+        decade=Cast(ExtractYear('publication_date'), IntegerField()) / 10 * 10,
+        is_available=Case(
+            When(available_copies__gt=0, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField()
+        )
+    ).values(*fields).annotate(n=Count('pk', distinct=True)).order_by().values_list(*fields, 'n')
+
+
+def build():
+    """Compute the facet structure from the catalog tables."""
+    grid = {}
+    for decade, available, n in _grid_rows(Book.objects.all()):
+        grid[None, bool(available), decade] = n
+    for decade, available, category_id, n in _grid_rows(
+        Book.objects.filter(categories__isnull=False), 'categories'
+    ):
+        grid[category_id, bool(available), decade] = n
+
+    authors = Author.objects.annotate(
+        book_count=Count('books'),
+        available_books=Count('books', filter=Q(books__available_copies__gt=0))
+    ).order_by().values_list('pk', 'book_count', 'available_books')
+    return {
+        'built_at': time.time(),
+        'categories': dict(Category.objects.order_by('name', 'pk').values_list('pk', 'name')),
+        'authors': {pk: (books, available) for pk, books, available in authors},
+        'grid': grid,
+    }
+
+
+def rebuild():
+    # Clear the flag first so changes made while building mark it again
+    cache.delete(DIRTY_KEY)
+    data = build()
+    # Authors are kept apart so reading the grid stays small
+    cache.set_many({FACETS_KEY: {**data, 'authors': None}, AUTHORS_KEY: data['authors']}, None)
+    # Pages showing counts were rendered from the previous grid
+    fragments.invalidate(CATALOG_TAG)
+    return data
+
+
+def refresh():
+    """Rebuild if anything changed since the last build; returns True if it did."""
+    if cache.get(DIRTY_KEY) is None and cache.get(FACETS_KEY) is not None:
+        return False
+    rebuild()
+    return True
+
+
+def get():
+    data = cache.get(FACETS_KEY)
+    if data is None:
+        return rebuild()
+    dirty_since = cache.get(DIRTY_KEY)
+    if dirty_since is not None and time.time() - dirty_since >= _max_staleness():
+        # One reader rebuilds, the others keep serving the current grid
+        if cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+            try:
+                data = rebuild()
+            finally:
+                cache.delete(LOCK_KEY)
+    return data
+
+
+def mark_dirty():
+    """Flag the facets for a rebuild once the current transaction commits."""
+    def publish():
+        cache.add(DIRTY_KEY, time.time(), None)
+        # Which books a listing holds may have changed
+        fragments.invalidate(CATALOG_TAG)
+
+    transaction.on_commit(publish)
+
+
+def parse_filters(params):
+    """``category``, ``available`` and ``decade`` from query params; ValueError if malformed."""
+    category = params.get('category') or None
+    available = params.get('available') or None
+    decade = params.get('decade') or None
+    if available not in (None, 'true', 'false'):
+        raise ValueError("available must be 'true' or 'false'")
+    return {
+        'category': int(category) if category is not None else None,
+        'available': None if available is None else available == 'true',
+        'decade': int(decade) if decade is not None else None,
+    }
+
+
+def _matches(value, wanted):
+    return wanted is None or value == wanted
+
+
+def counts(category=None, available=None, decade=None):
+    """
+    Book counts for the given filters, with each facet broken down under the
+    other filters (so every option shows how many books it would leave).
+    """
+    data = get()
+    total = 0
+    by_category = dict.fromkeys(data['categories'], 0)
+    by_availability = {True: 0, False: 0}
+    by_decade = {}
+    for (category_id, is_available, book_decade), n in data['grid'].items():
+        if category_id is not None:
+            if _matches(is_available, available) and _matches(book_decade, decade):
+                by_category[category_id] = by_category.get(category_id, 0) + n
+        if category_id != category:
+            continue
+        if _matches(is_available, available) and _matches(book_decade, decade):
+            total += n
+        if _matches(book_decade, decade):
+            by_availability[is_available] += n
+        if _matches(is_available, available):
+            by_decade[book_decade] = by_decade.get(book_decade, 0) + n
+
+    return {
+        'total': total,
+        'categories': [
+            {'id': pk, 'name': name, 'count': by_category.get(pk, 0)}
+            for pk, name in data['categories'].items()
+        ],
+        'availability': {'available': by_availability[True], 'unavailable': by_availability[False]},
+        'decades': [
+            {'decade': book_decade, 'count': n}
+            for book_decade, n in sorted(by_decade.items(), key=lambda item: (item[0] is None, item[0]))
+        ],
+    }
+
+
+def category_counts():
+    """``[{'id', 'name', 'book_count', 'available_books'}]`` for every category."""
+    data = get()
+    book_count = {}
+    available_books = {}
+    for (category_id, is_available, _), n in data['grid'].items():
+        if category_id is None:
+            continue
+        book_count[category_id] = book_count.get(category_id, 0) + n
+        if is_available:
+            available_books[category_id] = available_books.get(category_id, 0) + n
+    return [
+        {'id': pk, 'name': name, 'book_count': book_count.get(pk, 0),
+         'available_books': available_books.get(pk, 0)}
+        for pk, name in data['categories'].items()
+    ]
+
+
+def author_counts(author_ids):
+    """``{author_id: (book_count, available_books)}`` for the given authors."""
+    authors = get()['authors'] or cache.get(AUTHORS_KEY)
+    if authors is None:
+        authors = rebuild()['authors']
+    return {pk: authors.get(pk, (0, 0)) for pk in author_ids}
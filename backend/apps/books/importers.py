@@ -0,0 +1,301 @@
+"""
+Set-based catalog import.
+
+Rows are processed in chunks: authors and categories are resolved into
+name -> id maps once per chunk (creating the missing ones with
+``bulk_create``), then books, both M2M through tables and all copies are
+inserted with batched ``bulk_create`` calls inside one transaction per chunk.
+
+Uploads are read as a stream (CSV in fixed-size chunks, XLSX in openpyxl
+read-only mode), so peak memory is bounded by the batch size rather than
+the file size.
+"""
+from datetime import date, datetime
+from itertools import islice
+
+import pandas as pd
+from openpyxl import load_workbook
+from django.db import DatabaseError, transaction
+from django.utils.dateparse import parse_date
+
+from .models import Author, Category, Book, BookCopy
+from . import conditional, facets, search
+
+REQUIRED_COLUMNS = ('title', 'isbn', 'authors', 'categories', 'publication_date', 'total_copies')
+
+
+def _is_blank(value):
+    # NaN / NaT (as produced by pandas for empty cells) never equal themselves
+    return value is None or value != value or (isinstance(value, str) and not value.strip())
+
+
+def _to_text(value):
+    if _is_blank(value):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if hasattr(value, 'date') and callable(value.date):  # pandas Timestamp
+        return value.date()
+    parsed = parse_date(_to_text(value)[:10])
+    if parsed is None:
+        raise ValueError(f"Invalid publication_date: {value!r}")
+    return parsed
+
+
+def _split_names(value, max_length):
+    names = []
+    for name in _to_text(value).split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if len(name) > max_length:
+            raise ValueError(f"Name longer than {max_length} characters: {name[:20]}...")
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def iter_csv_rows(file, chunk_size=1000):
+    for frame in pd.read_csv(file, dtype={'isbn': str}, chunksize=chunk_size):
+        yield from frame.to_dict('records')
+
+
+def iter_xlsx_rows(file):
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_to_text(cell) for cell in next(rows, ())]
+        for values in rows:
+            if all(_is_blank(value) for value in values):
+                continue
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def iter_catalog_rows(file, chunk_size=1000):
+    """Stream row dicts from an uploaded CSV or XLSX file."""
+    if file.name.endswith('.csv'):
+        return iter_csv_rows(file, chunk_size=chunk_size)
+    return iter_xlsx_rows(file)
+
+
+class ImportResult:
+    """Counters and a (capped) per-row error report for one import run."""
+
+    def __init__(self, max_errors=1000):
+        self.rows_processed = 0
+        self.books_created = 0
+        self.copies_created = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows_processed': self.rows_processed,
+            'books_created': self.books_created,
+            'copies_created': self.copies_created,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
+
+
+class BookImporter:
+    """
+    Import catalog rows (dicts keyed by column name) in chunks of
+    ``batch_size``. Row numbers in the error report are 1-based and do not
+    count the header line. ``progress`` is called with the running
+    ``ImportResult`` after every chunk.
+    """
+
+    def __init__(self, batch_size=1000, max_errors=1000, progress=None):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.progress = progress
+        self.author_ids = {}
+        self.category_ids = {}
+
+    def import_rows(self, rows, result=None):
+        result = result or ImportResult(max_errors=self.max_errors)
+        numbered = enumerate(rows, start=result.rows_processed + 1)
+        while True:
+            chunk = list(islice(numbered, self.batch_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk, result)
+            if self.progress:
+                self.progress(result)
+        return result
+
+    def import_chunk(self, chunk, result):
+        """Import one list of ``(row_number, row)`` pairs in a single transaction."""
+        result.rows_processed += len(chunk)
+        rows = self._validate_chunk(chunk, result)
+        if not rows:
+            return
+
+        try:
+            with transaction.atomic():
+                copies_created = self._write_rows(rows)
+        except DatabaseError as e:
+            # Ids cached during the rolled back transaction may not exist
+            self.author_ids.clear()
+            self.category_ids.clear()
+            for row_number, _ in rows:
+                result.add_error(row_number, f"Database error: {e}")
+            return
+
+        result.books_created += len(rows)
+        result.copies_created += copies_created
+
+    def _parse_row(self, row):
+        missing = [column for column in REQUIRED_COLUMNS if _is_blank(row.get(column))]
+        if missing:
+            raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+
+        title = _to_text(row['title'])
+        if len(title) > 200:
+            raise ValueError("Title longer than 200 characters")
+
+        isbn = _to_text(row['isbn']).replace('-', '')
+        if not isbn.isdigit() or len(isbn) not in [10, 13]:
+            raise ValueError(f"ISBN must be 10 or 13 digits: {isbn!r}")
+
+        authors = _split_names(row['authors'], 200)
+        categories = _split_names(row['categories'], 100)
+        if not authors or not categories:
+            raise ValueError("At least one author and one category are required")
+
+        try:
+            total_copies = int(float(row['total_copies']))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid total_copies: {row['total_copies']!r}")
+        if total_copies < 0:
+            raise ValueError("total_copies cannot be negative")
+
+        return {
+            'title': title,
+            'isbn': isbn,
+            'authors': authors,
+            'categories': categories,
+            'publication_date': _to_date(row['publication_date']),
+            'description': _to_text(row.get('description')),
+            'total_copies': total_copies,
+        }
+
+    def _validate_chunk(self, chunk, result):
+        parsed = []
+        for row_number, row in chunk:
+            try:
+                parsed.append((row_number, self._parse_row(row)))
+            except ValueError as e:
+                result.add_error(row_number, str(e))
+
+        existing = set(
+            Book.objects.filter(
+                isbn__in=[data['isbn'] for _, data in parsed]
+            ).values_list('isbn', flat=True)
+        )
+        seen = set()
+        valid = []
+        for row_number, data in parsed:
+            if data['isbn'] in existing:
+                result.add_error(row_number, f"Book with ISBN {data['isbn']} already exists")
+            elif data['isbn'] in seen:
+                result.add_error(row_number, f"Duplicate ISBN {data['isbn']} in upload")
+            else:
+                seen.add(data['isbn'])
+                valid.append((row_number, data))
+        return valid
+
+    def _resolve(self, model, cache, names):
+        """Fill ``cache`` with ids for ``names``, creating missing rows in bulk."""
+        missing = [name for name in names if name not in cache]
+        if missing:
+            self._load_ids(model, cache, missing)
+            to_create = [name for name in missing if name not in cache]
+            if to_create:
+                model.objects.bulk_create(
+                    [model(name=name) for name in to_create],
+                    batch_size=self.batch_size
+                )
+                self._load_ids(model, cache, to_create)
+        return cache
+
+    def _load_ids(self, model, cache, names):
+        rows = model.objects.filter(name__in=names).order_by('pk').values_list('name', 'pk')
+        for name, pk in rows:
+            cache.setdefault(name, pk)
+
+    def _write_rows(self, rows):
+        author_ids = self._resolve(
+            Author, self.author_ids,
+            {name for _, data in rows for name in data['authors']}
+        )
+        category_ids = self._resolve(
+            Category, self.category_ids,
+            {name for _, data in rows for name in data['categories']}
+        )
+
+        books = Book.objects.bulk_create([
+            Book(
+                title=data['title'],
+                isbn=data['isbn'],
+                publication_date=data['publication_date'],
+                description=data['description'],
+                total_copies=data['total_copies'],
+                available_copies=data['total_copies'],
+            ) for _, data in rows
+        ], batch_size=self.batch_size)
+
+        if any(book.pk is None for book in books):
+            # Backends that cannot return ids from bulk inserts
+            book_ids = dict(
+                Book.objects.filter(
+                    isbn__in=[book.isbn for book in books]
+                ).values_list('isbn', 'pk')
+            )
+        else:
+            book_ids = {book.isbn: book.pk for book in books}
+
+        BookAuthor = Book.authors.through
+        BookCategory = Book.categories.through
+        book_authors = []
+        book_categories = []
+        copies = []
+        for _, data in rows:
+            book_id = book_ids[data['isbn']]
+            book_authors.extend(
+                BookAuthor(book_id=book_id, author_id=author_ids[name])
+                for name in data['authors']
+            )
+            book_categories.extend(
+                BookCategory(book_id=book_id, category_id=category_ids[name])
+                for name in data['categories']
+            )
+            copies.extend(
+                BookCopy(book_id=book_id, copy_number=i + 1, condition='NEW')
+                for i in range(data['total_copies'])
+            )
+
+        BookAuthor.objects.bulk_create(book_authors, batch_size=self.batch_size)
+        BookCategory.objects.bulk_create(book_categories, batch_size=self.batch_size)
+        BookCopy.objects.bulk_create(copies, batch_size=self.batch_size)
+        search.index_books(book_ids.values())
+        facets.mark_dirty()
+        conditional.catalog_changed()
+        return len(copies)
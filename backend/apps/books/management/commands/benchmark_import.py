@@ -0,0 +1,59 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.books.importers import BookImporter
+
+
+class Rollback(Exception):
+    pass
+
+
+def generate_rows(count, seed=0):
+    rng = random.Random(seed)
+    authors = [f'Benchmark Author {i}' for i in range(max(count // 10, 1))]
+    categories = [f'Benchmark Category {i}' for i in range(50)]
+    base = rng.randrange(10 ** 11, 9 * 10 ** 11)
+    for n in range(count):
+        yield {
+            'title': f'Benchmark Book {n}',
+            'isbn': f'9{base + n:012d}'[:13],
+            'authors': ', '.join(rng.sample(authors, k=min(len(authors), rng.randint(1, 3)))),
+            'categories': ', '.join(rng.sample(categories, k=rng.randint(1, 3))),
+            'publication_date': f'{rng.randint(1950, 2024)}-01-01',
+            'description': '',
+            'total_copies': rng.randint(1, 5),
+        }
+
+
+class Command(BaseCommand):
+    help = 'Measure BookImporter throughput (rows/second) on synthetic catalog rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true',
+                            help='Commit the imported rows instead of rolling them back.')
+
+    def handle(self, *args, **options):
+        for count in options['rows']:
+            rows = list(generate_rows(count, seed=options['seed']))
+            importer = BookImporter(batch_size=options['batch_size'])
+            try:
+                with transaction.atomic():
+                    started = time.perf_counter()
+                    result = importer.import_rows(rows)
+                    elapsed = time.perf_counter() - started
+                    if not options['keep']:
+                        raise Rollback
+            except Rollback:
+                pass
+
+            self.stdout.write(
+                f"{count:>8} rows: {elapsed:8.2f}s  {count / elapsed:10.0f} rows/s  "
+                f"books={result.books_created} copies={result.copies_created} "
+                f"errors={result.error_count}"
+            )
@@ -0,0 +1,113 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from apps.books import search
+from apps.books.importers import BookImporter
+from apps.books.models import Book
+
+
+class Rollback(Exception):
+    pass
+
+
+def make_vocabulary(rng, size=5000):
+    syllables = ['ka', 'lo', 'mi', 'ra', 'ven', 'tor', 'sil', 'an', 'dor', 'el', 'wyn', 'mar', 'is', 'ul', 'bre']
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def generate_rows(count, rng, vocabulary):
+    authors = [
+        f'{rng.choice(vocabulary).title()} {rng.choice(vocabulary).title()}'
+        for _ in range(max(count // 20, 1))
+    ]
+    categories = [rng.choice(vocabulary).title() for _ in range(60)]
+    base = rng.randrange(10 ** 11, 8 * 10 ** 11)
+    for n in range(count):
+        yield {
+            'title': ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(2, 6))).capitalize(),
+            'isbn': f'9{base + n:012d}',
+            'authors': ', '.join(rng.sample(authors, k=min(len(authors), rng.randint(1, 2)))),
+            'categories': ', '.join(rng.sample(categories, k=rng.randint(1, 3))),
+            'publication_date': f'{rng.randint(1950, 2024)}-01-01',
+            'total_copies': 1,
+        }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = ('Compare p50/p99 latency of the full-text search index with the '
+            'icontains query it replaced.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=0,
+                            help='Synthetic books to add (rolled back afterwards).')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=12)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                if options['books']:
+                    self.stdout.write(f"Importing {options['books']} synthetic books...")
+                    vocabulary = make_vocabulary(rng)
+                    BookImporter(batch_size=2000).import_rows(
+                        generate_rows(options['books'], rng, vocabulary)
+                    )
+                self.run_benchmark(rng, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run_benchmark(self, rng, options):
+        titles = list(Book.objects.order_by('?').values_list('title', flat=True)[:options['queries']])
+        if not titles:
+            self.stdout.write(self.style.WARNING('No books to search; pass --books N.'))
+            return
+        queries = []
+        for title in titles:
+            word = rng.choice(title.split() or [title])
+            queries.append(word[:max(3, len(word) - rng.randint(0, 2))])
+
+        limit = options['limit']
+
+        # Both paths do what the paginated catalog views do: count + first page
+        def icontains(query):
+            results = Book.objects.filter(
+                Q(title__icontains=query) |
+                Q(authors__name__icontains=query) |
+                Q(isbn__icontains=query) |
+                Q(categories__name__icontains=query)
+            ).distinct()
+            return results.count(), list(results[:limit])
+
+        def full_text(query):
+            results = search.search_books(Book.objects.all(), query)
+            return results.count(), list(results[:limit])
+
+        total = Book.objects.count()
+        self.stdout.write(f'{total} books, {len(queries)} queries, {connection.vendor}')
+        for name, run in (('icontains', icontains), ('full-text', full_text)):
+            samples = []
+            for query in queries:
+                started = time.perf_counter()
+                run(query)
+                samples.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{name:>10}: p50={percentile(samples, 50):8.2f}ms '
+                f'p99={percentile(samples, 99):8.2f}ms mean={statistics.mean(samples):8.2f}ms'
+            )
+
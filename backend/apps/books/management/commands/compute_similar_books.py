@@ -0,0 +1,33 @@
+import resource
+import sys
+
+from django.core.management.base import BaseCommand
+
+from apps.books import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed similar-books index from authors, categories and loan history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=recommendations.TOP_N, help='Similar books kept per book.')
+        parser.add_argument('--block-size', type=int, default=recommendations.BLOCK_SIZE)
+        parser.add_argument('--feature-cap', type=int, default=recommendations.FEATURE_CAP)
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f'\r{done}/{total} books', ending='')
+            self.stdout.flush()
+
+        result = recommendations.compute(
+            top_n=options['top'],
+            block_size=options['block_size'],
+            feature_cap=options['feature_cap'],
+            progress=progress if sys.stdout.isatty() else None
+        )
+        # ru_maxrss is in KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"\nIndexed {result['books']} books ({result['rows']} rows) in {result['seconds']} s, "
+            f"peak RSS {peak:.0f} MiB."
+        ))
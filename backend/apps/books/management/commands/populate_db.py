@@ -1,32 +1,247 @@
-from django.core.management.base import BaseCommand
+"""
+Synthetic library data at any scale.
+
+The defaults give a small demo library; ``--users``/``--books``/``--loans``
+scale it up (``--loans 1000000`` builds a load-testing dataset in a few
+minutes). Book popularity is Zipfian, so a few titles carry most of the
+loans, fully lent out books get reservation queues and ``--overdue-ratio``
+of the open loans are overdue (with fines), as are that share of past
+returns. The same ``--seed`` always gives the same library, whatever the
+number of ``--workers``.
+
+Rows are written with ``executemany`` and explicit primary keys, and the
+sequences are reset afterwards like ``loaddata`` does. The loan history is
+the bulk of the data: ``--workers`` processes turn chunks of it into
+ready-to-insert rows (each chunk owns a fixed id range) while this process
+streams them into the database.
+"""
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from multiprocessing import get_context
+
+import numpy as np
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
 from django.utils import timezone
-from datetime import timedelta, datetime
-import random
 from faker import Faker
 
-def make_aware(dt):
-    if timezone.is_naive(dt):
-        return timezone.make_aware(dt, timezone.get_current_timezone())
-    return dt
-
-# Import models
+from apps.accounts import snapshot
+from apps.books import conditional, facets, search
 from apps.books.models import Author, Category, Book, BookCopy
-from apps.loans.models import BookLoan, Reservation
 from apps.fines.models import Fine, Payment
+from apps.loans.models import BookLoan, Reservation
 
 User = get_user_model()
-fake = Faker()
+
+CATEGORY_NAMES = ['Fiction', 'Non-Fiction', 'Science', 'History', 'Biography', 'Technology',
+                  'Fantasy', 'Mystery', 'Romance', 'Science Fiction']
+LOAN_DAYS = 14
+CHUNK_SIZE = 50000
+TITLE_POOL = 2000
+DAY = 86400
+
+BOOK_FIELDS = ('id', 'title', 'isbn', 'publication_date', 'description', 'total_copies',
+               'available_copies', 'created_at', 'updated_at')
+COPY_FIELDS = ('id', 'book', 'copy_number', 'condition', 'status', 'acquisition_date', 'notes',
+               'created_at', 'updated_at')
+LOAN_FIELDS = ('id', 'user', 'book', 'book_copy', 'issue_date', 'due_date', 'return_date',
+               'status', 'notes', 'created_at', 'updated_at')
+FINE_FIELDS = ('id', 'user', 'loan', 'amount', 'reason', 'status', 'due_date', 'payment_date',
+               'created_at', 'updated_at')
+PAYMENT_FIELDS = ('id', 'fine', 'amount', 'payment_method', 'transaction_id', 'status', 'payment_date',
+                  'razorpay_order_id', 'razorpay_payment_id', 'created_at', 'updated_at')
+RESERVATION_FIELDS = ('user', 'book', 'reservation_date', 'status', 'notification_sent',
+                      'fulfillment_date', 'created_at', 'updated_at')
+
+# Set in each worker by _init_worker: everything a chunk needs to build its rows
+_plan = {}
+
+
+def _zipf_cdf(n, exponent, rng):
+    """Cumulative Zipf(``exponent``) weights over ``n`` items in random rank order."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    cdf = np.cumsum(weights[rng.permutation(n)])
+    return cdf / cdf[-1]
+
+
+def _pick(cdf, rng, size):
+    return np.minimum(np.searchsorted(cdf, rng.random(size), side='right'), len(cdf) - 1)
+
+
+def _init_worker(plan):
+    _plan.update(plan)
+
+
+def _db_datetimes(plan, seconds_ago):
+    """Database values for ``now - seconds_ago`` (None where NaN)."""
+    missing = np.isnan(seconds_ago)
+    stamps = plan['now'] - np.where(missing, 0, seconds_ago)
+    if plan['vendor'] == 'sqlite':
+        # What the SQLite backend stores for aware datetimes: naive UTC text
+        values = np.datetime_as_string((stamps * 1e6).astype('datetime64[us]'), unit='us')
+        values = [value.replace('T', ' ') for value in values.tolist()]
+    else:
+        adapt = connection.ops.adapt_datetimefield_value
+        values = [adapt(datetime.fromtimestamp(stamp, dt_timezone.utc)) for stamp in stamps.tolist()]
+    if missing.any():
+        values = [None if gap else value for value, gap in zip(values, missing.tolist())]
+    return values
+
+
+def _loan_rows(plan, first_id, first_fine_id, book, copy, user, issued_ago, returned_ago, statuses, paid):
+    """Loan, fine and payment rows; late returns and overdue loans get a fine."""
+    loan_ids = range(first_id, first_id + len(book))
+    issued = _db_datetimes(plan, issued_ago)
+    due_ago = issued_ago - LOAN_DAYS * DAY
+    due = _db_datetimes(plan, due_ago)
+    returned = _db_datetimes(plan, returned_ago)
+    book_ids = plan['book_ids'][book].tolist()
+    copy_ids = plan['copy_ids'][plan['first_copy'][book] + copy].tolist()
+    user_ids = plan['user_ids'][user].tolist()
+    loans = [
+        (loan_ids[i], user_ids[i], book_ids[i], copy_ids[i], issued[i], due[i], returned[i],
+         statuses[i], '', issued[i], returned[i] or issued[i])
+        for i in range(len(book_ids))
+    ]
+
+    # Days between the due date and the return (or now, for open loans)
+    days_late = ((due_ago - np.nan_to_num(returned_ago)) // DAY).astype(np.int64)
+    late = np.flatnonzero(days_late >= 1)
+    paid = paid[late] & ~np.isnan(returned_ago[late])
+    ended = np.where(np.isnan(returned_ago[late]), 0, returned_ago[late])
+    ended_at = _db_datetimes(plan, ended)
+    fine_due = _db_datetimes(plan, ended - 7 * DAY)
+    fines = []
+    payments = []
+    for k, (i, is_paid) in enumerate(zip(late.tolist(), paid.tolist())):
+        fine_id = first_fine_id + k
+        amount = int(days_late[i])
+        fines.append((
+            fine_id, user_ids[i], loan_ids[i], amount, f'Book overdue by {amount} days',
+            'PAID' if is_paid else 'PENDING', fine_due[k], ended_at[k] if is_paid else None,
+            ended_at[k], ended_at[k]
+        ))
+        if is_paid:
+            payments.append((
+                fine_id, fine_id, amount, 'RAZORPAY', f'order_gen{fine_id}', 'SUCCESS', ended_at[k],
+                f'order_gen{fine_id}', f'pay_gen{fine_id}', ended_at[k], ended_at[k]
+            ))
+    return loans, fines, payments
+
+
+def _history_chunk(task):
+    """
+    Returned loans of one chunk. Chunk ``index`` of ``chunks`` covers its own
+    slice of the history (oldest first), so loan ids follow issue dates; its
+    fines use the ids from ``index * CHUNK_SIZE`` on.
+    """
+    index, chunks, size, first_id = task
+    plan = _plan
+    rng = np.random.default_rng([plan['seed'], 1, index])
+    history = plan['days'] * DAY
+    oldest = history * (chunks - index) / chunks
+    issued_ago = np.sort(rng.uniform(oldest - history / chunks, oldest, size))[::-1]
+    book = _pick(plan['book_cdf'], rng, size)
+    late = rng.random(size) < plan['late_ratio']
+    kept = np.where(late, rng.uniform(LOAN_DAYS + 1, LOAN_DAYS + 45, size), rng.uniform(1, LOAN_DAYS, size))
+    return _loan_rows(
+        plan, first_id, plan['first_fine_id'] + index * CHUNK_SIZE,
+        book=book,
+        copy=(rng.random(size) * plan['copies'][book]).astype(np.int64),
+        user=_pick(plan['user_cdf'], rng, size),
+        issued_ago=issued_ago,
+        # Loans issued shortly before now are returned by now at the latest
+        returned_ago=np.maximum(issued_ago - kept * DAY, 0),
+        statuses=['RETURNED'] * size,
+        paid=rng.random(size) < 0.8
+    )
+
+
+def _insert(model, fields, rows, batch_size):
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(model._meta.get_field(name).column) for name in fields)
+    sql = (f'INSERT INTO {qn(model._meta.db_table)} ({columns}) '
+           f'VALUES ({", ".join(["%s"] * len(fields))})')
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
 
 class Command(BaseCommand):
-    help = 'Populate the database with sample data for demonstration purposes.'
+    help = ('Populate the database with synthetic users, books, loans, fines and reservations. '
+            'The defaults give a small demo library; scale it up for load testing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--books', type=int, default=30)
+        parser.add_argument('--loans', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes building the loan history rows (writes stay in this process)')
+        parser.add_argument('--days', type=int, default=730, help='Length of the loan history')
+        parser.add_argument('--open-ratio', type=float, default=0.05,
+                            help='Share of loans still open (capped by the copies available)')
+        parser.add_argument('--overdue-ratio', type=float, default=0.15,
+                            help='Share of open loans that are overdue, and of returns that were late')
+        parser.add_argument('--zipf', type=float, default=0.8, help='Zipf exponent of book popularity')
+        parser.add_argument('--batch-size', type=int, default=5000)
 
     def handle(self, *args, **options):
-        self.stdout.write('Starting to populate database...')
-        
-        # Create superuser if not exists
+        if min(options['users'], options['books']) < 1 or options['loans'] < 0:
+            raise CommandError('--users and --books must be at least 1 and --loans not negative')
+        self.options = options
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.counts = {'loans': 0, 'fines': 0}
+        started = time.perf_counter()
+
+        self._step('Creating users', self._create_users)
+        self._step('Planning catalog and open loans', self._plan)
+        self._step('Creating books', self._create_books)
+        self._step('Creating loan history', self._create_history)
+        self._step('Creating open loans', self._create_open_loans)
+        self._step('Creating reservations', self._create_reservations)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Book, BookCopy, BookLoan, Fine, Payment]):
+                cursor.execute(sql)
+        facets.mark_dirty()
+        conditional.catalog_changed()
+        snapshot.invalidate(*self.existing_user_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Populated {self.counts["users"]} users, {self.counts["books"]} books, '
+            f'{self.counts["loans"]} loans, {self.counts["fines"]} fines and '
+            f'{self.counts["reservations"]} reservations in {time.perf_counter() - started:.1f}s'
+        ))
+        self.stdout.write('Leaderboards, daily stats and similar books are derived data: run '
+                          f'rebuild_leaderboards, backfill_daily_stats --days {options["days"]} and '
+                          'compute_similar_books to bring them up to date.')
+        self.stdout.write('\nAdmin login details:')
+        self.stdout.write('Username: admin')
+        self.stdout.write('Password: admin123')
+        self.stdout.write(f'\nRegular user login (user1 through user{options["users"]}):')
+        self.stdout.write(f'Username: user1 (through user{options["users"]})')
+        self.stdout.write('Password: password123')
+
+    def _step(self, label, method):
+        self.stdout.write(f'{label}...', ending='')
+        self.stdout.flush()
+        started = time.perf_counter()
+        method()
+        self.stdout.write(f' {time.perf_counter() - started:.1f}s')
+
+    def _create_users(self):
         if not User.objects.filter(is_superuser=True).exists():
-            self.stdout.write('Creating superuser...')
             User.objects.create_superuser(
                 username='admin',
                 email='admin@library.com',
@@ -35,144 +250,210 @@ class Command(BaseCommand):
                 last_name='User'
             )
 
-        # Create regular users
-        self.stdout.write('Creating users...')
-        users = []
-        for i in range(1, 11):
-            username = f'user{i}'
-            if not User.objects.filter(username=username).exists():
-                user = User.objects.create_user(
-                    username=username,
-                    email=f'user{i}@example.com',
-                    password='password123',
-                    first_name=fake.first_name(),
-                    last_name=fake.last_name()
-                )
-                users.append(user)
-            else:
-                # If user exists, get the existing user
-                users.append(User.objects.get(username=username))
-
-        # Create authors
-        self.stdout.write('Creating authors...')
-        authors = []
-        for _ in range(10):
-            author = Author.objects.create(
-                name=fake.name(),
-                bio=fake.paragraph()
-            )
-            authors.append(author)
-
-        # Create categories
-        self.stdout.write('Creating categories...')
-        categories = []
-        category_names = ['Fiction', 'Non-Fiction', 'Science', 'History', 'Biography', 'Technology', 'Fantasy', 'Mystery', 'Romance', 'Science Fiction']
-        for name in category_names:
-            category = Category.objects.create(
-                name=name,
-                description=fake.paragraph()
-            )
-            categories.append(category)
-
-        # Create books with copies
-        self.stdout.write('Creating books...')
-        books = []
-        for i in range(1, 31):
-            book = Book.objects.create(
-                title=fake.catch_phrase(),
-                isbn=fake.isbn13(separator=''),
-                publication_date=fake.date_between(start_date='-20y', end_date='today'),
-                description='\n\n'.join(fake.paragraphs(nb=3)),
-                total_copies=random.randint(1, 5),
-                available_copies=0  # Will be updated after creating copies
-            )
-            
-            # Add authors and categories
-            book.authors.set(random.sample(authors, k=random.randint(1, 3)))
-            book.categories.set(random.sample(categories, k=random.randint(1, 3)))
-            
-            # Create copies
-            for copy_num in range(1, book.total_copies + 1):
-                BookCopy.objects.create(
-                    book=book,
-                    copy_number=copy_num,
-                    condition=random.choice(['NEW', 'GOOD', 'FAIR', 'POOR']),
-                    acquisition_date=fake.date_between(start_date='-5y', end_date='today')
-                )
-            
-            book.available_copies = book.total_copies  # Initially all copies are available
-            book.save()
-            books.append(book)
-
-        # Create book loans
-        self.stdout.write('Creating book loans...')
-        for _ in range(50):
-            book = random.choice(books)
-            available_copies = book.copies.all()
-            
-            if available_copies.exists():
-                book_copy = random.choice(list(available_copies))
-                user = random.choice(users)
-                issue_date = make_aware(fake.date_time_between(start_date='-60d', end_date='now'))
-                due_date = issue_date + timedelta(days=14)
-                
-                # 80% chance the book is returned
-                if random.random() < 0.8:
-                    return_date = make_aware(fake.date_time_between(start_date=issue_date, end_date='now'))
-                    status = 'RETURNED'
-                else:
-                    return_date = None
-                    status = 'OVERDUE' if timezone.now() > due_date else 'ACTIVE'
-                
-                loan = BookLoan.objects.create(
-                    user=user,
-                    book=book,
-                    book_copy=book_copy,
-                    issue_date=issue_date,
-                    due_date=due_date,
-                    return_date=return_date,
-                    status=status,
-                    notes=fake.sentence() if random.random() > 0.7 else ''
-                )
-                
-                # Update book copy status
-                book_copy.status = 'ON_LOAN' if status != 'RETURNED' else 'AVAILABLE'
-                book_copy.save()
-                
-                # Create fines for some overdue loans
-                if status == 'OVERDUE' and random.random() > 0.3:
-                    Fine.objects.create(
-                        user=user,
-                        loan=loan,
-                        amount=round(random.uniform(5.0, 50.0), 2),
-                        reason='Late return',
-                        status=random.choice(['PENDING', 'PAID']),
-                        due_date=make_aware(due_date + timedelta(days=14)),
-                        payment_date=make_aware(fake.date_time_between(start_date=due_date, end_date='now')) if random.random() > 0.5 else None
-                    )
-        
-        # Create some reservations
-        self.stdout.write('Creating reservations...')
-        for _ in range(20):
-            book = random.choice(books)
-            user = random.choice(users)
-            
-            # Only reserve books that are currently on loan
-            if book.available_copies < book.total_copies:
-                Reservation.objects.create(
-                    user=user,
-                    book=book,
-                    status=random.choices(
-                        ['PENDING', 'FULFILLED', 'CANCELLED'],
-                        weights=[0.6, 0.3, 0.1]
-                    )[0],
-                    notification_sent=random.choice([True, False])
+        fake = Faker()
+        fake.seed_instance(self.seed)
+        first_names = [fake.first_name() for _ in range(200)]
+        last_names = [fake.last_name() for _ in range(200)]
+        # One hash for everybody: hashing is the slow part of creating users
+        password = make_password('password123')
+        usernames = [f'user{i}' for i in range(1, self.options['users'] + 1)]
+        existing = dict(User.objects.filter(username__startswith='user').values_list('username', 'pk'))
+        new_users = [
+            User(username=name, email=f'{name}@example.com', password=password,
+                 first_name=first_names[i % 200], last_name=last_names[i * 7 % 200])
+            for i, name in enumerate(usernames) if name not in existing
+        ]
+        User.objects.bulk_create(new_users, batch_size=self.batch_size)
+        ids = dict(User.objects.filter(username__startswith='user').values_list('username', 'pk'))
+        self.existing_user_ids = [existing[name] for name in usernames if name in existing]
+        self.user_ids = np.array([ids[name] for name in usernames], dtype=np.int64)
+        self.counts['users'] = len(new_users)
+
+    def _plan(self):
+        """Popularity, copies and open loans per book, decided before anything is written."""
+        options = self.options
+        rng = np.random.default_rng([self.seed, 0])
+        n_books = options['books']
+        self.book_cdf = _zipf_cdf(n_books, options['zipf'], rng)
+        self.user_cdf = _zipf_cdf(len(self.user_ids), 0.6, rng)
+        # Popular books get more copies
+        concurrent = np.diff(self.book_cdf, prepend=0) * options['loans'] * LOAN_DAYS / max(options['days'], 1)
+        self.copies = np.clip(rng.integers(1, 4, n_books) + np.sqrt(concurrent).astype(np.int64), 1, 20)
+        wanted = np.bincount(
+            _pick(self.book_cdf, rng, int(options['loans'] * options['open_ratio'])), minlength=n_books
+        )
+        self.open_loans = np.minimum(wanted, self.copies)
+        self.plan = {
+            'seed': self.seed,
+            'vendor': connection.vendor,
+            'now': timezone.now().timestamp(),
+            'days': options['days'],
+            'late_ratio': options['overdue_ratio'],
+            'book_cdf': self.book_cdf,
+            'user_cdf': self.user_cdf,
+            'copies': self.copies,
+            'user_ids': self.user_ids,
+            # Index of each book's first copy in copy_ids
+            'first_copy': np.concatenate(([0], np.cumsum(self.copies)[:-1])),
+        }
+
+    def _pairs(self, rng, book_ids, related_ids):
+        """One to three distinct related ids per book, as through table rows."""
+        per_book = rng.integers(1, 4, len(book_ids))
+        books = np.repeat(book_ids, per_book)
+        related = related_ids[rng.integers(0, len(related_ids), len(books))]
+        pairs = np.unique(np.stack([books, related], axis=1), axis=0)
+        return [tuple(pair) for pair in pairs.tolist()]
+
+    def _create_books(self):
+        rng = np.random.default_rng([self.seed, 2])
+        fake = Faker()
+        fake.seed_instance(self.seed)
+        plan = self.plan
+        n_books = self.options['books']
+        titles = [fake.catch_phrase() for _ in range(min(n_books, TITLE_POOL))]
+        descriptions = ['\n\n'.join(fake.paragraphs(nb=3)) for _ in range(min(n_books, 50))]
+        authors = Author.objects.bulk_create([
+            Author(name=fake.name(), bio=fake.paragraph() if i < 1000 else '')
+            for i in range(max(10, n_books // 5))
+        ], batch_size=self.batch_size)
+        author_ids = np.array([author.pk for author in authors], dtype=np.int64)
+        categories = dict(Category.objects.filter(name__in=CATEGORY_NAMES).values_list('name', 'pk'))
+        for name in CATEGORY_NAMES:
+            if name not in categories:
+                categories[name] = Category.objects.create(name=name, description=fake.paragraph()).pk
+        category_ids = np.array(list(categories.values()), dtype=np.int64)
+
+        first_book_id = _next_id(Book)
+        first_copy_id = _next_id(BookCopy)
+        now = _db_datetimes(plan, np.zeros(1))[0]
+        today = timezone.now().date().isoformat()
+        years = rng.integers(1950, 2025, n_books).tolist()
+        copies = self.copies.tolist()
+        open_loans = self.open_loans.tolist()
+        for start in range(0, n_books, CHUNK_SIZE):
+            stop = min(start + CHUNK_SIZE, n_books)
+            book_ids = np.arange(first_book_id + start, first_book_id + stop)
+            books = [
+                (first_book_id + i, titles[i % len(titles)], f'979{first_book_id + i:010d}',
+                 f'{years[i]}-{i % 12 + 1:02d}-{i % 28 + 1:02d}', descriptions[i % len(descriptions)],
+                 copies[i], copies[i] - open_loans[i], now, now)
+                for i in range(start, stop)
+            ]
+            first_copy = first_copy_id + int(plan['first_copy'][start])
+            book_copies = [
+                (first_copy + k, book_id, n + 1, ('NEW', 'GOOD', 'FAIR', 'POOR')[(i + n) % 4],
+                 'ON_LOAN' if n < open_loans[i] else 'AVAILABLE', today, '', now, now)
+                for k, (i, book_id, n) in enumerate(
+                    (i, first_book_id + i, n) for i in range(start, stop) for n in range(copies[i])
                 )
+            ]
+            with transaction.atomic():
+                _insert(Book, BOOK_FIELDS, books, self.batch_size)
+                _insert(Book.authors.through, ('book', 'author'),
+                        self._pairs(rng, book_ids, author_ids), self.batch_size)
+                _insert(Book.categories.through, ('book', 'category'),
+                        self._pairs(rng, book_ids, category_ids), self.batch_size)
+                _insert(BookCopy, COPY_FIELDS, book_copies, self.batch_size)
+                search.index_books(book_ids.tolist())
+        self.counts['books'] = n_books
+        plan['book_ids'] = np.arange(first_book_id, first_book_id + n_books)
+        plan['copy_ids'] = np.arange(first_copy_id, first_copy_id + int(self.copies.sum()))
+        plan['first_fine_id'] = max(_next_id(Fine), _next_id(Payment))
 
-        self.stdout.write(self.style.SUCCESS('Successfully populated database with sample data!'))
-        self.stdout.write('\nAdmin login details:')
-        self.stdout.write('Username: admin')
-        self.stdout.write('Password: admin123')
-        self.stdout.write('\nRegular user login (user1 through user10):')
-        self.stdout.write('Username: user1 (through user10)')
-        self.stdout.write('Password: password123')
+    def _write(self, loans, fines, payments):
+        with transaction.atomic():
+            _insert(BookLoan, LOAN_FIELDS, loans, self.batch_size)
+            _insert(Fine, FINE_FIELDS, fines, self.batch_size)
+            _insert(Payment, PAYMENT_FIELDS, payments, self.batch_size)
+        self.counts['loans'] += len(loans)
+        self.counts['fines'] += len(fines)
+
+    def _create_history(self):
+        total = self.options['loans'] - int(self.open_loans.sum())
+        chunks = max(1, -(-total // CHUNK_SIZE))
+        sizes = [total * (index + 1) // chunks - total * index // chunks for index in range(chunks)]
+        self.first_loan_id = _next_id(BookLoan)
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).tolist()
+        tasks = [(index, chunks, sizes[index], self.first_loan_id + offsets[index]) for index in range(chunks)]
+        self.chunks = chunks
+
+        workers = max(1, self.options['workers'])
+        if workers == 1:
+            _init_worker(self.plan)
+            results = map(_history_chunk, tasks)
+            pool = None
+        else:
+            # Workers only build rows; every write happens here, in order
+            pool = get_context('fork').Pool(workers, initializer=_init_worker, initargs=(self.plan,))
+            results = pool.imap(_history_chunk, tasks)
+        try:
+            for rows in results:
+                self._write(*rows)
+                if chunks > 1:
+                    self.stdout.write(f' {self.counts["loans"]}', ending='')
+                    self.stdout.flush()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self.first_loan_id += total
+
+    def _create_open_loans(self):
+        rng = np.random.default_rng([self.seed, 3])
+        # One loan per lent out copy: copies 0..k-1 of a book with k open loans
+        book = np.repeat(np.arange(len(self.open_loans)), self.open_loans)
+        copy = np.arange(len(book)) - np.repeat(np.cumsum(self.open_loans) - self.open_loans, self.open_loans)
+        overdue = rng.random(len(book)) < self.options['overdue_ratio']
+        issued_ago = np.where(
+            overdue,
+            rng.uniform(LOAN_DAYS + 1, LOAN_DAYS + 45, len(book)),
+            rng.uniform(0, LOAN_DAYS, len(book))
+        ) * DAY
+        order = np.argsort(-issued_ago, kind='stable')
+        book, copy, overdue, issued_ago = book[order], copy[order], overdue[order], issued_ago[order]
+        self._write(*_loan_rows(
+            self.plan, self.first_loan_id, self.plan['first_fine_id'] + self.chunks * CHUNK_SIZE,
+            book=book,
+            copy=copy,
+            user=_pick(self.user_cdf, rng, len(book)),
+            issued_ago=issued_ago,
+            returned_ago=np.full(len(book), np.nan),
+            statuses=['OVERDUE' if is_overdue else 'ACTIVE' for is_overdue in overdue.tolist()],
+            paid=np.zeros(len(book), bool)
+        ))
+
+    def _create_reservations(self):
+        rng = np.random.default_rng([self.seed, 4])
+        plan = self.plan
+        n_users = len(self.user_ids)
+        # Queues on the books with every copy out: distinct members, oldest first
+        queued = np.flatnonzero(self.open_loans == self.copies)
+        lengths = np.minimum(rng.geometric(0.4, len(queued)) - 1, min(15, n_users))
+        book = np.repeat(queued, lengths)
+        user = np.concatenate([rng.choice(n_users, n, replace=False) for n in lengths.tolist()] or [[]])
+        waited = rng.uniform(0, 10 * DAY, len(book))
+        order = np.lexsort((-waited, book))
+        book, user, waited = book[order], user[order].astype(np.int64), waited[order]
+        dates = _db_datetimes(plan, waited)
+        rows = [
+            (int(self.user_ids[u]), int(plan['book_ids'][b]), date, 'PENDING', False, None, date, date)
+            for u, b, date in zip(user.tolist(), book.tolist(), dates)
+        ]
+
+        # Past reservations, spread over the history
+        count = self.options['loans'] // 25
+        book = plan['book_ids'][_pick(self.book_cdf, rng, count)].tolist()
+        user = self.user_ids[rng.integers(0, n_users, count)].tolist()
+        statuses = rng.choice(['FULFILLED', 'CANCELLED', 'EXPIRED'], count, p=[0.6, 0.25, 0.15]).tolist()
+        reserved_ago = rng.uniform(10 * DAY, self.options['days'] * DAY, count)
+        reserved = _db_datetimes(plan, reserved_ago)
+        closed = _db_datetimes(plan, reserved_ago - 3 * DAY)
+        rows.extend(
+            (user[i], book[i], reserved[i], statuses[i], statuses[i] != 'CANCELLED',
+             closed[i] if statuses[i] == 'FULFILLED' else None, reserved[i], closed[i])
+            for i in range(count)
+        )
+        with transaction.atomic():
+            _insert(Reservation, RESERVATION_FIELDS, rows, self.batch_size)
+        self.counts['reservations'] = len(rows)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.books import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for the book catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.INDEX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING(
+                'Full-text search is not supported on this database; nothing to do.'
+            ))
+            return
+        indexed = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} books.'))
@@ -0,0 +1,61 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE books_book_fts USING fts5("
+            "title, isbn, authors, categories, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO books_book_fts (rowid, title, isbn, authors, categories) "
+            "SELECT b.id, b.title, b.isbn, "
+            "COALESCE((SELECT group_concat(a.name, ' ') FROM books_book_authors ba "
+            "JOIN books_author a ON a.id = ba.author_id WHERE ba.book_id = b.id), ''), "
+            "COALESCE((SELECT group_concat(c.name, ' ') FROM books_book_categories bc "
+            "JOIN books_category c ON c.id = bc.category_id WHERE bc.book_id = b.id), '') "
+            "FROM books_book b"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE books_book_search ("
+            "book_id bigint PRIMARY KEY REFERENCES books_book (id) ON DELETE CASCADE "
+            "DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX books_book_search_document_idx ON books_book_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO books_book_search (book_id, document) "
+            "SELECT b.id, "
+            "setweight(to_tsvector('simple', b.title), 'A') || "
+            "setweight(to_tsvector('simple', b.isbn), 'A') || "
+            "setweight(to_tsvector('simple', COALESCE((SELECT string_agg(a.name, ' ') "
+            "FROM books_book_authors ba JOIN books_author a ON a.id = ba.author_id "
+            "WHERE ba.book_id = b.id), '')), 'B') || "
+            "setweight(to_tsvector('simple', COALESCE((SELECT string_agg(c.name, ' ') "
+            "FROM books_book_categories bc JOIN books_category c ON c.id = bc.category_id "
+            "WHERE bc.book_id = b.id), '')), 'C') "
+            "FROM books_book b"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS books_book_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS books_book_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:12
+
+from django.db import migrations, models
+
+
+def set_copy_status(apps, schema_editor):
+    BookCopy = apps.get_model('books', 'BookCopy')
+    BookLoan = apps.get_model('loans', 'BookLoan')
+    BookCopy.objects.filter(
+        pk__in=BookLoan.objects.filter(return_date__isnull=True).values('book_copy')
+    ).update(status='ON_LOAN')
+    BookCopy.objects.filter(
+        pk__in=BookLoan.objects.filter(status='LOST').values('book_copy')
+    ).update(status='LOST')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_book_search_index'),
+        ('loans', '0002_loan_lost_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookcopy',
+            name='status',
+            field=models.CharField(choices=[('AVAILABLE', 'Available'), ('ON_LOAN', 'On loan'), ('MAINTENANCE', 'Maintenance'), ('LOST', 'Lost')], default='AVAILABLE', max_length=11),
+        ),
+        migrations.AddIndex(
+            model_name='bookcopy',
+            index=models.Index(fields=['book', 'status'], name='books_copy_book_status_idx'),
+        ),
+        migrations.RunPython(set_copy_status, migrations.RunPython.noop),
+    ]
@@ -36,15 +36,23 @@ class Book(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(available_copies__lte=models.F('total_copies')),
+                name='books_available_within_total'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.isbn})"
 
     def update_available_copies(self):
-        """Update available copies based on current loans"""
+        """Recount available copies from current loans (loan transitions use apps.loans.inventory)"""
         from apps.loans.models import BookLoan
         active_loans = BookLoan.objects.filter(book=self, return_date__isnull=True).count()
-        self.available_copies = self.total_copies - active_loans
-        self.save()
+        self.available_copies = max(self.total_copies - active_loans, 0)
+        self.save(update_fields=['available_copies', 'updated_at'])
 
 class BookCopy(models.Model):
     CONDITION_CHOICES = (
@@ -53,10 +61,17 @@ class BookCopy(models.Model):
         ('FAIR', 'Fair'),
         ('POOR', 'Poor'),
     )
+    STATUS_CHOICES = (
+        ('AVAILABLE', 'Available'),
+        ('ON_LOAN', 'On loan'),
+        ('MAINTENANCE', 'Maintenance'),
+        ('LOST', 'Lost'),
+    )
     
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copies')
     copy_number = models.PositiveIntegerField()
     condition = models.CharField(max_length=4, choices=CONDITION_CHOICES, default='NEW')
+    status = models.CharField(max_length=11, choices=STATUS_CHOICES, default='AVAILABLE')
     acquisition_date = models.DateField(auto_now_add=True)
     last_maintenance = models.DateField(null=True, blank=True)
     notes = models.TextField(blank=True)
@@ -66,6 +81,26 @@ class BookCopy(models.Model):
     class Meta:
         unique_together = ('book', 'copy_number')
         verbose_name_plural = 'Book copies'
+        indexes = [
+            models.Index(fields=['book', 'status'], name='books_copy_book_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.book.title} - Copy #{self.copy_number}"
+
+
+class SimilarBook(models.Model):
+    """Top-N similar books per book, precomputed by ``apps.books.recommendations``."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_entries')
+    similar_book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='books_similar_book_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.similar_book_id} (#{self.rank})"
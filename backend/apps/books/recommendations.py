@@ -0,0 +1,204 @@
+"""
+Offline "similar books" index.
+
+Every book is described by sparse features: its authors, its categories and
+the users who borrowed it. Two books score the sum of the weights of the
+features they share, so shared authors, shared categories and co-borrowing
+all count:
+
+    score(a, b) = AUTHOR_WEIGHT * shared authors
+                + CATEGORY_WEIGHT * shared categories
+                + sum over shared borrowers of CO_BORROW_WEIGHT / log2(1 + books they borrowed)
+
+``compute`` loads the book/feature incidence once as NumPy arrays (CSR
+style, int32) and then scores books ``block_size`` at a time: the candidate
+pairs of a block are generated with vectorised CSR gathers, summed with
+``np.unique`` + ``np.bincount`` and cut to the top ``top_n`` per book. The
+block's rows in ``SimilarBook`` are replaced in one transaction, so readers
+never see a half-written index.
+
+To keep the pairs per block (and so memory and time per block) bounded,
+a feature only proposes its ``FEATURE_CAP`` most borrowed books as
+candidates and a book only uses its ``BOOK_FEATURE_CAP`` heaviest features
+(authors, categories, then its most specific borrowers); a block with more
+than ``MAX_CANDIDATES`` pairs is split. The catalog size only affects the
+incidence arrays, not the per-block work. Below the caps (small catalogs,
+and most books of large ones) scores are exact.
+"""
+import time
+
+import numpy as np
+from django.db import transaction
+
+from apps.loans.models import BookLoan
+from . import conditional
+from .models import Book, SimilarBook
+
+TOP_N = 10
+BLOCK_SIZE = 2000
+FEATURE_CAP = 200
+BOOK_FEATURE_CAP = 50
+MAX_CANDIDATES = 5000000
+AUTHOR_WEIGHT = 3.0
+CATEGORY_WEIGHT = 1.0
+CO_BORROW_WEIGHT = 2.0
+FETCH_SIZE = 10000
+
+
+def _fetch_pairs(queryset):
+    """``(n, 2)`` int64 array of a two-column values_list, streamed from the database."""
+    values = np.fromiter(
+        (value for row in queryset.iterator(chunk_size=FETCH_SIZE) for value in row),
+        dtype=np.int64
+    )
+    return values.reshape(-1, 2)
+
+
+def _book_index(book_ids, ids):
+    """Dense index of each id in the sorted ``book_ids``, and a mask of the ids found."""
+    index = np.minimum(np.searchsorted(book_ids, ids), max(len(book_ids) - 1, 0))
+    return index, book_ids[index] == ids if len(book_ids) else np.zeros(len(ids), bool)
+
+
+class Incidence:
+    """Book/feature incidence in both directions (books by dense index 0..n-1)."""
+
+    def __init__(self, book_ids, groups, popularity, feature_cap=FEATURE_CAP,
+                 book_feature_cap=BOOK_FEATURE_CAP):
+        # groups: [(pairs of (book_id, raw feature id), per-feature weight function)]
+        self.book_ids = book_ids
+        books = []
+        features = []
+        weights = []
+        offset = 0
+        for pairs, weight in groups:
+            if not len(pairs) or not len(book_ids):
+                continue
+            index, known = _book_index(book_ids, pairs[:, 0])
+            raw_ids, feature = np.unique(pairs[known, 1], return_inverse=True)
+            degree = np.bincount(feature, minlength=len(raw_ids))
+            books.append(index[known].astype(np.int32))
+            features.append((feature + offset).astype(np.int32))
+            weights.append(weight(degree).astype(np.float32))
+            offset += len(raw_ids)
+
+        book = np.concatenate(books) if books else np.empty(0, np.int32)
+        feature = np.concatenate(features) if features else np.empty(0, np.int32)
+        self.weights = np.concatenate(weights) if weights else np.empty(0, np.float32)
+        self.popularity = popularity
+
+        # book -> its heaviest features, at most book_feature_cap of them
+        order = np.lexsort((feature, -self.weights[feature], book))
+        by_book, by_book_feature = book[order], feature[order]
+        starts = np.searchsorted(by_book, np.arange(len(book_ids) + 1))
+        keep = np.arange(len(by_book)) - starts[by_book] < book_feature_cap
+        self.book_indptr = np.searchsorted(by_book[keep], np.arange(len(book_ids) + 1)).astype(np.int64)
+        self.book_features = by_book_feature[keep]
+
+        # feature -> its most borrowed books, at most feature_cap of them
+        order = np.lexsort((book, -popularity[book], feature))
+        feature, book = feature[order], book[order]
+        starts = np.searchsorted(feature, np.arange(offset + 1))
+        rank = np.arange(len(feature)) - starts[feature]
+        keep = rank < feature_cap
+        self.member_indptr = np.searchsorted(feature[keep], np.arange(offset + 1)).astype(np.int64)
+        self.members = book[keep]
+
+    def candidate_count(self, start, stop):
+        features = self.book_features[self.book_indptr[start]:self.book_indptr[stop]]
+        return int((self.member_indptr[features + 1] - self.member_indptr[features]).sum())
+
+    def candidates(self, start, stop):
+        """``(rows, cols, weights)`` for every (book in block, candidate, shared feature)."""
+        lo, hi = self.book_indptr[start], self.book_indptr[stop]
+        features = self.book_features[lo:hi]
+        rows = np.repeat(
+            np.arange(stop - start, dtype=np.int64),
+            np.diff(self.book_indptr[start:stop + 1])
+        )
+        lengths = self.member_indptr[features + 1] - self.member_indptr[features]
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+        # Position of every candidate inside ``members`` (a CSR gather)
+        group_start = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.arange(total) - group_start + np.repeat(self.member_indptr[features], lengths)
+        return (
+            np.repeat(rows, lengths),
+            self.members[positions].astype(np.int64),
+            np.repeat(self.weights[features], lengths)
+        )
+
+    def top(self, start, stop, top_n):
+        """``(rows, cols, scores, ranks)`` of the best ``top_n`` candidates per book in the block."""
+        if stop - start > 1 and self.candidate_count(start, stop) > MAX_CANDIDATES:
+            # Too many pairs for one pass: split the block to bound memory
+            middle = (start + stop) // 2
+            first = self.top(start, middle, top_n)
+            rows, cols, scores, ranks = self.top(middle, stop, top_n)
+            second = (rows + (middle - start), cols, scores, ranks)
+            return tuple(np.concatenate(parts) for parts in zip(first, second))
+        rows, cols, weights = self.candidates(start, stop)
+        keep = cols != rows + start
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+        n = len(self.book_ids)
+        keys, inverse = np.unique(rows * n + cols, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        rows, cols = keys // n, keys % n
+        # Best score first; ties go to the more borrowed book, then the lower id
+        order = np.lexsort((cols, -self.popularity[cols], -scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        keep = ranks < top_n
+        return rows[keep], cols[keep], scores[keep], ranks[keep] + 1
+
+
+def load(feature_cap=FEATURE_CAP):
+    book_ids = np.fromiter(
+        Book.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=FETCH_SIZE),
+        dtype=np.int64
+    )
+    borrowed = _fetch_pairs(BookLoan.objects.values_list('book_id', 'user_id').distinct().order_by())
+    index, known = _book_index(book_ids, borrowed[:, 0])
+    popularity = np.bincount(index[known], minlength=len(book_ids))
+    groups = [
+        (_fetch_pairs(Book.authors.through.objects.values_list('book_id', 'author_id').order_by()),
+         lambda degree: np.full(len(degree), AUTHOR_WEIGHT)),
+        (_fetch_pairs(Book.categories.through.objects.values_list('book_id', 'category_id').order_by()),
+         lambda degree: np.full(len(degree), CATEGORY_WEIGHT)),
+        (borrowed,
+         lambda degree: CO_BORROW_WEIGHT / np.log2(1 + degree)),
+    ]
+    return Incidence(book_ids, groups, popularity, feature_cap)
+
+
+def compute(top_n=TOP_N, block_size=BLOCK_SIZE, feature_cap=FEATURE_CAP, progress=None):
+    """Rebuild the ``SimilarBook`` index; returns ``{'books', 'rows', 'seconds'}``."""
+    started = time.perf_counter()
+    incidence = load(feature_cap)
+    book_ids = incidence.book_ids
+    written = 0
+    for start in range(0, len(book_ids), block_size):
+        stop = min(start + block_size, len(book_ids))
+        rows, cols, scores, ranks = incidence.top(start, stop, top_n)
+        entries = [
+            SimilarBook(book_id=book_id, similar_book_id=similar_id, rank=rank, score=round(score, 4))
+            for book_id, similar_id, rank, score in zip(
+                book_ids[rows + start].tolist(), book_ids[cols].tolist(), ranks.tolist(), scores.tolist()
+            )
+        ]
+        with transaction.atomic():
+            SimilarBook.objects.filter(
+                book_id__gte=int(book_ids[start]), book_id__lte=int(book_ids[stop - 1])
+            ).delete()
+            SimilarBook.objects.bulk_create(entries, batch_size=FETCH_SIZE)
+        written += len(entries)
+        if progress:
+            progress(stop, len(book_ids))
+    conditional.catalog_changed()
+    return {'books': len(book_ids), 'rows': written, 'seconds': round(time.perf_counter() - started, 2)}
+
+
+def similar_books(book, limit=4):
+    """Precomputed similar books in rank order (empty until the job has covered ``book``)."""
+    return Book.objects.filter(similar_to__book=book).order_by('similar_to__rank')[:limit]
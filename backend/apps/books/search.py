@@ -0,0 +1,159 @@
+"""
+Full-text search index for the book catalog.
+
+Each book is indexed as one document made of its title, ISBN, author names
+and category names. SQLite keeps the documents in an FTS5 virtual table
+(``books_book_fts``, rowid = book id); PostgreSQL keeps a weighted tsvector
+per book in ``books_book_search`` with a GIN index. Other backends fall back
+to the plain ``icontains`` query.
+
+The index is kept in sync by the handlers in ``apps.books.signals`` and by
+``BookImporter`` for bulk inserts, which bypass signals.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from rest_framework import filters
+
+from .models import Book
+
+SQLITE_TABLE = 'books_book_fts'
+POSTGRES_TABLE = 'books_book_search'
+INDEX_BATCH_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _tokens(query):
+    return TOKEN_RE.findall(query.lower())[:10]
+
+
+def _documents(book_ids):
+    documents = {
+        pk: {'title': title, 'isbn': isbn, 'authors': [], 'categories': []}
+        for pk, title, isbn in Book.objects.filter(pk__in=book_ids).values_list('pk', 'title', 'isbn')
+    }
+    authors = Book.authors.through.objects.filter(
+        book_id__in=documents
+    ).values_list('book_id', 'author__name')
+    for book_id, name in authors:
+        documents[book_id]['authors'].append(name)
+    categories = Book.categories.through.objects.filter(
+        book_id__in=documents
+    ).values_list('book_id', 'category__name')
+    for book_id, name in categories:
+        documents[book_id]['categories'].append(name)
+    return documents
+
+
+def _index_batch(cursor, book_ids):
+    documents = _documents(book_ids)
+    rows = [
+        (pk, doc['title'], doc['isbn'], ' '.join(doc['authors']), ' '.join(doc['categories']))
+        for pk, doc in documents.items()
+    ]
+    placeholders = ', '.join(['%s'] * len(book_ids))
+
+    if connection.vendor == 'sqlite':
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})', list(book_ids))
+        if rows:
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, title, isbn, authors, categories) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                rows
+            )
+    else:
+        cursor.execute(f'DELETE FROM {POSTGRES_TABLE} WHERE book_id IN ({placeholders})', list(book_ids))
+        if rows:
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (book_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('simple', %s), 'A') || "
+                f"setweight(to_tsvector('simple', %s), 'A') || "
+                f"setweight(to_tsvector('simple', %s), 'B') || "
+                f"setweight(to_tsvector('simple', %s), 'C'))",
+                rows
+            )
+
+
+def index_books(book_ids):
+    """(Re)index the given books; ids of deleted books are dropped from the index."""
+    if not is_supported():
+        return
+    book_ids = list(dict.fromkeys(book_ids))
+    with connection.cursor() as cursor:
+        for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+            _index_batch(cursor, book_ids[start:start + INDEX_BATCH_SIZE])
+
+
+def rebuild_index(batch_size=INDEX_BATCH_SIZE):
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        table = SQLITE_TABLE if connection.vendor == 'sqlite' else POSTGRES_TABLE
+        cursor.execute(f'DELETE FROM {table}')
+
+    last_id = 0
+    indexed = 0
+    while True:
+        book_ids = list(
+            Book.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not book_ids:
+            return indexed
+        index_books(book_ids)
+        indexed += len(book_ids)
+        last_id = book_ids[-1]
+
+
+def _match(query):
+    """``extra()`` arguments joining the index and ranking matches, best (lowest) first."""
+    tokens = _tokens(query)
+    book = f'"{Book._meta.db_table}"."id"'
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        return {
+            'tables': [SQLITE_TABLE],
+            'where': [f'{SQLITE_TABLE}.rowid = {book}', f'{SQLITE_TABLE} MATCH %s'],
+            'params': [match],
+            'select': {'search_rank': f'bm25({SQLITE_TABLE}, 10.0, 10.0, 5.0, 2.0)'},
+        }
+    match = ' & '.join(f'{token}:*' for token in tokens)
+    return {
+        'tables': [POSTGRES_TABLE],
+        'where': [f'{POSTGRES_TABLE}.book_id = {book}', f"{POSTGRES_TABLE}.document @@ to_tsquery('simple', %s)"],
+        'params': [match],
+        'select': {'search_rank': f"-ts_rank({POSTGRES_TABLE}.document, to_tsquery('simple', %s))"},
+        'select_params': [match],
+    }
+
+
+def search_books(queryset, query):
+    """Restrict ``queryset`` to books matching every term of ``query`` (as prefixes), best match first."""
+    if not is_supported():
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(authors__name__icontains=query) |
+            Q(isbn__icontains=query) |
+            Q(categories__name__icontains=query)
+        ).distinct()
+
+    if not _tokens(query):
+        return queryset.none()
+    # The index is joined in the same query, so further filters, counts and
+    # pagination see every match instead of a prefetched list of ids
+    return queryset.extra(order_by=['search_rank', f'{Book._meta.db_table}.id'], **_match(query))
+
+
+class BookSearchFilter(filters.SearchFilter):
+    """``SearchFilter`` for books that uses the full-text index when available."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not is_supported():
+            return super().filter_queryset(request, queryset, view)
+        return search_books(queryset, ' '.join(terms))
@@ -1,4 +1,6 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
+from library_system.serializers import DynamicFieldsMixin
 from .models import Author, Category, Book, BookCopy
 
 class AuthorSerializer(serializers.ModelSerializer):
@@ -20,7 +22,12 @@ class BookCopySerializer(serializers.ModelSerializer):
                  'last_maintenance', 'notes')
         read_only_fields = ('acquisition_date',)
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Book
+        fields = ('id', 'title', 'isbn', 'cover_image')
+
+class BookSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     authors = AuthorSerializer(many=True, read_only=True)
     categories = CategorySerializer(many=True, read_only=True)
     copies = BookCopySerializer(many=True, read_only=True)
@@ -44,6 +51,23 @@ class BookSerializer(serializers.ModelSerializer):
                  'ebook_file', 'created_at', 'copies', 'author_ids', 'category_ids')
         read_only_fields = ('created_at', 'available_copies')
 
+    @staticmethod
+    def setup_eager_loading(queryset, prefix=''):
+        """Prefetch the nested authors, categories and copies (``prefix`` for a related book)."""
+        return queryset.prefetch_related(
+            Prefetch(f'{prefix}authors', queryset=Author.objects.all()),
+            Prefetch(f'{prefix}categories', queryset=Category.objects.all()),
+            Prefetch(f'{prefix}copies', queryset=BookCopy.objects.all()),
+        )
+
+    def validate_total_copies(self, value):
+        # available_copies is read-only here; see books_available_within_total
+        if self.instance is not None and value < self.instance.available_copies:
+            raise serializers.ValidationError(
+                f"{self.instance.available_copies} copies are available; the total cannot be lower than that"
+            )
+        return value
+
     def validate_isbn(self, value):
         """Validate ISBN format"""
         if not value.isdigit() or len(value) not in [10, 13]:
@@ -52,6 +76,7 @@ class BookSerializer(serializers.ModelSerializer):
 
 class BookBulkUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
+    background = serializers.BooleanField(default=False)
 
     def validate_file(self, value):
         """Validate file extension"""
@@ -0,0 +1,91 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Author, Category, Book, BookCopy
+from . import conditional, facets, search
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, **kwargs):
+    search.index_books([instance.pk])
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    search.index_books([instance.pk])
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.categories.through)
+def index_books_on_relation_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_books([instance.pk])
+        return
+
+    # instance is an Author / Category and pk_set holds book ids
+    if action == 'pre_clear':
+        instance._search_book_ids = list(instance.books.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.index_books(getattr(instance, '_search_book_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        search.index_books(pk_set)
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Category)
+def index_books_on_name_change(sender, instance, created, **kwargs):
+    if not created:
+        search.index_books(instance.books.values_list('pk', flat=True))
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Category)
+def remember_books_before_delete(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.books.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Category)
+def index_books_after_delete(sender, instance, **kwargs):
+    search.index_books(getattr(instance, '_search_book_ids', []))
+
+@receiver([post_save, post_delete], sender=Book)
+@receiver([post_save, post_delete], sender=BookCopy)
+@receiver([post_save, post_delete], sender=Author)
+@receiver([post_save, post_delete], sender=Category)
+def mark_facets_dirty(sender, **kwargs):
+    facets.mark_dirty()
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.categories.through)
+def mark_facets_dirty_on_relation_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        facets.mark_dirty()
+
+@receiver([post_save, post_delete], sender=Book)
+def publish_book_change(sender, instance, **kwargs):
+    conditional.catalog_changed([instance.pk])
+
+@receiver(post_save, sender=BookCopy)
+def publish_copy_change(sender, instance, **kwargs):
+    conditional.catalog_changed([instance.book_id])
+
+@receiver(post_delete, sender=BookCopy)
+def touch_book_on_copy_delete(sender, instance, **kwargs):
+    conditional.touch_books([instance.book_id])
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Category)
+def publish_name_change(sender, instance, created, **kwargs):
+    conditional.catalog_changed([] if created else instance.books.values_list('pk', flat=True))
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.categories.through)
+def touch_books_on_relation_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        conditional.touch_books([instance.pk])
+    elif action == 'post_clear':
+        conditional.touch_books(getattr(instance, '_search_book_ids', []))
+    else:
+        conditional.touch_books(pk_set)
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Category)
+def touch_books_after_delete(sender, instance, **kwargs):
+    conditional.touch_books(getattr(instance, '_search_book_ids', []))
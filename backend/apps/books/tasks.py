@@ -0,0 +1,29 @@
+from celery import shared_task
+from django.core.files.storage import default_storage
+from apps.books.importers import BookImporter, iter_catalog_rows
+from apps.books import facets, recommendations
+
+@shared_task(bind=True)
+def import_catalog_file(self, path, batch_size=1000):
+    """Stream a stored catalog upload into the database, reporting progress."""
+    def report(result):
+        self.update_state(state='PROGRESS', meta=result.as_dict())
+
+    importer = BookImporter(batch_size=batch_size, progress=report)
+    try:
+        with default_storage.open(path, 'rb') as file:
+            result = importer.import_rows(iter_catalog_rows(file, chunk_size=batch_size))
+    finally:
+        default_storage.delete(path)
+
+    return result.as_dict()
+
+@shared_task
+def refresh_facets():
+    """Rebuild the catalog facet counts if the catalog changed."""
+    return facets.refresh()
+
+@shared_task
+def compute_similar_books():
+    """Rebuild the precomputed similar-books index."""
+    return recommendations.compute()
@@ -1,3 +1,64 @@
-from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from .models import Author, Category, Book, BookCopy
+
+User = get_user_model()
+
+
+def create_books(count, authors=1, copies=1):
+    """``count`` books, each with its own ``authors`` authors, a category and ``copies`` copies."""
+    start = Book.objects.count()
+    books = []
+    for n in range(start, start + count):
+        book = Book.objects.create(
+            title=f'Book {n}', isbn=f'978{n:010d}', publication_date=date(2001, 1, 1),
+            total_copies=copies, available_copies=copies
+        )
+        book.authors.set(Author.objects.create(name=f'Author {n}.{i}') for i in range(authors))
+        book.categories.add(Category.objects.create(name=f'Category {n}'))
+        BookCopy.objects.bulk_create(BookCopy(book=book, copy_number=i + 1) for i in range(copies))
+        books.append(book)
+    return books
+
+
+# Views log activity from a background thread that would outlive the test database
+@override_settings(ACTIVITY_LOG_ENABLED=False)
+class BookApiQueryCountTests(TestCase):
+    """The book endpoints run a fixed number of queries however many rows they render."""
+
+    # books page, count, and one prefetch each for authors, categories and copies
+    LIST_QUERIES = 5
+    # Last-Modified lookup (apps.books.conditional), book and the three prefetches
+    DETAIL_QUERIES = 5
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='librarian', role='LIBRARIAN'))
+
+    def test_list_at_one_row_and_a_full_page(self):
+        create_books(1)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get(reverse('books-api:book-list'))
+        self.assertEqual(len(response.data['results']), 1)
+
+        # PageNumberPagination takes no page_size parameter; fill its page instead
+        create_books(api_settings.PAGE_SIZE, authors=3, copies=3)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get(reverse('books-api:book-list'))
+        self.assertEqual(len(response.data['results']), api_settings.PAGE_SIZE)
+
+    def test_detail_with_few_and_many_related_rows(self):
+        for authors, copies in ((1, 1), (5, 8)):
+            book, = create_books(1, authors=authors, copies=copies)
+            with self.assertNumQueries(self.DETAIL_QUERIES):
+                response = self.client.get(reverse('books-api:book-detail', args=[book.pk]))
+            self.assertEqual(len(response.data['authors']), authors)
+            self.assertEqual(len(response.data['copies']), copies)
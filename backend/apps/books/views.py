@@ -1,18 +1,28 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.core.paginator import Paginator
+from django.core.files.storage import default_storage
 from django.db.models import Q, Count, Avg
+from django.views.decorators.http import condition
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
+import uuid
 from .models import Author, Category, Book, BookCopy
 from .serializers import (
     AuthorSerializer, CategorySerializer,
     BookSerializer, BookCopySerializer,
     BookBulkUploadSerializer)
+from .importers import BookImporter, iter_catalog_rows
+from .tasks import import_catalog_file
+from functools import partial
+from . import conditional, facets, recommendations, search
+from apps.dashboard import activity
+from library_system import fragments
 from django import forms
 from .models import Book, BookCopy
 
@@ -26,58 +36,84 @@ class BookForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 4}),
         }
 
+    def clean_total_copies(self):
+        total_copies = self.cleaned_data['total_copies']
+        # available_copies is not on the form; books_available_within_total
+        # would reject the save with an IntegrityError
+        if self.instance.pk is not None and total_copies < self.instance.available_copies:
+            raise forms.ValidationError(
+                f'{self.instance.available_copies} copies are available; '
+                f'the total cannot be lower than that.'
+            )
+        return total_copies
+
 class BookCopyForm(forms.ModelForm):
     class Meta:
         model = BookCopy
         fields = ['book', 'copy_number', 'condition']
 
-# Web Views
-@login_required
-def book_list_view(request):
+def _book_detail_etag(request, pk):
+    # The page also shows similar books, loan counts and who is logged in, so it
+    # follows the catalog version; pending flash messages always render
+    if len(messages.get_messages(request)):
+        return None
+    return conditional.etag('page', pk, conditional.catalog_version(), request.user.pk, request.user.updated_at)
+
+def _vary(request):
+    return sorted(request.GET.lists())
+
+def _render_book_list(request):
     books = Book.objects.all().prefetch_related('authors', 'categories')
     
     # Search functionality
     query = request.GET.get('q')
     if query:
-        books = books.filter(
-            Q(title__icontains=query) |
-            Q(authors__name__icontains=query) |
-            Q(isbn__icontains=query) |
-            Q(category__name__icontains=query)
-        ).distinct()
+        books = search.search_books(books, query)
+    
+    try:
+        facet_filters = facets.parse_filters(request.GET)
+    except ValueError:
+        facet_filters = {'category': None, 'available': None, 'decade': None}
     
     # Category filter
-    category_id = request.GET.get('category')
-    if category_id:
-        books = books.filter(category_id=category_id)
+    if facet_filters['category'] is not None:
+        books = books.filter(categories=facet_filters['category'])
     
     # Availability filter
-    availability = request.GET.get('available')
-    if availability:
-        if availability == 'true':
-            books = books.filter(available_copies__gt=0)
-        elif availability == 'false':
-            books = books.filter(available_copies=0)
+    if facet_filters['available'] is True:
+        books = books.filter(available_copies__gt=0)
+    elif facet_filters['available'] is False:
+        books = books.filter(available_copies=0)
+    
+    # Publication decade filter
+    if facet_filters['decade'] is not None:
+        books = books.filter(
+            publication_date__year__gte=facet_filters['decade'],
+            publication_date__year__lt=facet_filters['decade'] + 10
+        )
     
     # Pagination
     paginator = Paginator(books, 12)  # Show 12 books per page
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Get all categories for filter
-    categories = Category.objects.annotate(book_count=Count('books'))
+    # Filter options with their book counts (precomputed, see apps.books.facets)
+    facet_counts = facets.counts(**facet_filters)
     
     context = {
         'page_obj': page_obj,
-        'categories': categories,
+        'categories': facet_counts['categories'],
+        'availability_counts': facet_counts['availability'],
+        'decades': facet_counts['decades'],
         'query': query,
-        'selected_category': category_id,
-        'selected_availability': availability,
+        'selected_category': facet_filters['category'],
+        'selected_availability': request.GET.get('available'),
+        'selected_decade': facet_filters['decade'],
     }
-    return render(request, 'books/book_list.html', context)
+    tags = [facets.CATALOG_TAG] + [f'book:{book.pk}' for book in page_obj]
+    return render_to_string('books/fragments/book_list.html', context, request), tags
 
-@login_required
-def book_detail_view(request, pk):
+def _render_book_detail(request, pk):
     book = get_object_or_404(
         Book.objects.prefetch_related('authors', 'categories', 'copies'),
         pk=pk
@@ -90,51 +126,75 @@ def book_detail_view(request, pk):
         'loan_count': book.loans.count() if hasattr(book, 'loans') else 0,
     }
     
-    # Get similar books (by shared categories or same authors)
-    similar_books = Book.objects.filter(
-        Q(categories__in=book.categories.all()) |
-        Q(authors__in=book.authors.all())
-    ).exclude(pk=book.pk).distinct()[:4]
+    # Precomputed by the nightly compute_similar_books job
+    similar_books = recommendations.similar_books(book)
     
     context = {
         'book': book,
         'book_stats': book_stats,
         'similar_books': similar_books,
     }
-    return render(request, 'books/book_detail.html', context)
+    return render_to_string('books/fragments/book_detail.html', context, request), [f'book:{book.pk}']
+
+# Web Views
+# The catalog pages are the same for every member apart from the header, so
+# their content is cached as a fragment (library_system.fragments) and only
+# the page around it is rendered per request.
+@login_required
+def book_list_view(request):
+    content = fragments.get_or_render('books:list', _vary(request), partial(_render_book_list, request))
+    return render(request, 'books/book_list.html', {'content': content})
+
+@login_required
+@condition(etag_func=_book_detail_etag)
+def book_detail_view(request, pk):
+    content = fragments.get_or_render('books:detail', pk, partial(_render_book_detail, request, pk))
+    # The cached part does not prove the book exists; the rest of the page needs its title
+    book = get_object_or_404(Book.objects.only('title', 'available_copies', 'total_copies'), pk=pk)
+    activity.log(book.pk, 'view', request.user.pk)
+    loans = book.loans.select_related('user') if request.user.is_staff else None
+    return render(request, 'books/book_detail.html', {'content': content, 'book': book, 'loans': loans})
+
+def _render_category_list(request):
+    return render_to_string(
+        'books/fragments/category_list.html', {'categories': facets.category_counts()}, request
+    ), [facets.CATALOG_TAG]
 
 @login_required
 def category_list_view(request):
-    categories = Category.objects.annotate(
-        book_count=Count('books'),
-        available_books=Count('books', filter=Q(books__available_copies__gt=0))
-    )
-    return render(request, 'books/category_list.html', {'categories': categories})
+    content = fragments.get_or_render('books:categories', None, partial(_render_category_list, request))
+    return render(request, 'books/category_list.html', {'content': content})
+
+def _render_author_list(request):
+    authors = list(Author.objects.order_by('name'))
+    counts = facets.author_counts(author.pk for author in authors)
+    for author in authors:
+        author.book_count, author.available_books = counts[author.pk]
+    return render_to_string('books/fragments/author_list.html', {'authors': authors}, request), [facets.CATALOG_TAG]
 
 @login_required
 def author_list_view(request):
-    authors = Author.objects.annotate(
-        book_count=Count('books'),
-        avg_rating=Avg('books__reviews__rating')
-    )
-    return render(request, 'books/author_list.html', {'authors': authors})
+    content = fragments.get_or_render('books:authors', None, partial(_render_author_list, request))
+    return render(request, 'books/author_list.html', {'content': content})
 
 @login_required
 def book_search_view(request):
     query = request.GET.get('q', '')
-    results = []
+    results = Book.objects.none()
     
     if query:
-        results = Book.objects.filter(
-            Q(title__icontains=query) |
-            Q(authors__name__icontains=query) |
-            Q(isbn__icontains=query) |
-            Q(category__name__icontains=query)
-        ).distinct()
+        results = search.search_books(
+            Book.objects.prefetch_related('authors', 'categories'),
+            query
+        )
+    
+    # Every match is returned, so the results are paginated like the catalog
+    page_obj = Paginator(results, 12).get_page(request.GET.get('page'))
     
     context = {
         'query': query,
-        'results': results,
+        'results': page_obj,
+        'page_obj': page_obj,
     }
     return render(request, 'books/search_results.html', context)
 
@@ -181,88 +241,73 @@ def book_delete_view(request, pk):
     
     return render(request, 'books/book_confirm_delete.html', {'book': book})
 
-import pandas as pd
-
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(conditional.CatalogListMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(conditional.CatalogListMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(conditional.CatalogListMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     parser_classes = (MultiPartParser, FormParser)
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, search.BookSearchFilter, filters.OrderingFilter]
     filterset_fields = ['categories', 'authors', 'publication_date']
     search_fields = ['title', 'isbn', 'authors__name', 'categories__name']
     ordering_fields = ['title', 'publication_date', 'available_copies']
 
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(Book.objects.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        # Checked before the book is loaded, so a matching request costs one query
+        modified = conditional.book_modified(kwargs['pk'])
+        if modified is None:
+            return super().retrieve(request, *args, **kwargs)
+        response = conditional.respond(
+            request,
+            conditional.etag('book', kwargs['pk'], modified.isoformat(), request.user.pk,
+                             request.accepted_renderer.format, request.get_full_path()),
+            int(modified.timestamp()),
+            partial(super().retrieve, request, *args, **kwargs)
+        )
+        activity.log(int(kwargs['pk']), 'view', request.user.pk, source='api')
+        return response
+
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facet_counts(self, request):
+        try:
+            facet_filters = facets.parse_filters(request.query_params)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(facets.counts(**facet_filters))
+
     @action(detail=False, methods=['post'])
     def bulk_upload(self, request):
         serializer = BookBulkUploadSerializer(data=request.data)
         if serializer.is_valid():
             file = serializer.validated_data['file']
-            
+
+            if serializer.validated_data['background']:
+                path = default_storage.save(f'imports/{uuid.uuid4().hex}_{file.name}', file)
+                job = import_catalog_file.delay(path)
+                return Response({
+                    'status': 'queued',
+                    'job_id': job.id
+                }, status=status.HTTP_202_ACCEPTED)
+
             try:
-                if file.name.endswith('.csv'):
-                    df = pd.read_csv(file)
-                else:  # Excel file
-                    df = pd.read_excel(file)
-
-                books_created = 0
-                for _, row in df.iterrows():
-                    try:
-                        # Create or get authors
-                        author_names = row['authors'].split(',')
-                        authors = [
-                            Author.objects.get_or_create(name=name.strip())[0]
-                            for name in author_names
-                        ]
-
-                        # Create or get categories
-                        category_names = row['categories'].split(',')
-                        categories = [
-                            Category.objects.get_or_create(name=name.strip())[0]
-                            for name in category_names
-                        ]
-
-                        # Create book
-                        book = Book.objects.create(
-                            title=row['title'],
-                            isbn=row['isbn'],
-                            publication_date=row['publication_date'],
-                            description=row.get('description', ''),
-                            total_copies=row['total_copies'],
-                            available_copies=row['total_copies']
-                        )
-
-                        # Add relationships
-                        book.authors.add(*authors)
-                        book.categories.add(*categories)
-
-                        # Create book copies
-                        for i in range(int(row['total_copies'])):
-                            BookCopy.objects.create(
-                                book=book,
-                                copy_number=i + 1,
-                                condition='NEW'
-                            )
-
-                        books_created += 1
-
-                    except Exception as e:
-                        continue
+                result = BookImporter().import_rows(iter_catalog_rows(file))
 
                 return Response({
-                    'status': 'success',
-                    'books_created': books_created
+                    'status': 'success' if not result.error_count else 'partial',
+                    **result.as_dict()
                 })
 
             except Exception as e:
@@ -273,6 +318,16 @@ class BookViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'], url_path=r'bulk_upload/(?P<job_id>[^/.]+)')
+    def bulk_upload_status(self, request, job_id=None):
+        job = import_catalog_file.AsyncResult(job_id)
+        if job.failed():
+            return Response({'status': 'FAILURE', 'message': str(job.result)})
+        return Response({
+            'status': job.status,
+            'progress': job.result if isinstance(job.result, dict) else None
+        })
+
 class BookCopyViewSet(viewsets.ModelViewSet):
     queryset = BookCopy.objects.all()
     serializer_class = BookCopySerializer
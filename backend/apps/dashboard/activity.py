@@ -0,0 +1,184 @@
+"""
+Buffered ``BookActivity`` ingestion.
+
+``log`` only appends the event to an in-process buffer; a daemon thread
+writes the buffer with ``bulk_create`` every ``ACTIVITY_FLUSH_INTERVAL``
+seconds (or as soon as ``ACTIVITY_BATCH_SIZE`` events are waiting), so a
+request never waits on an INSERT. The buffer is bounded: when the database
+cannot keep up the oldest events are dropped and counted in ``dropped``.
+Events the database refuses (a book or user deleted meanwhile) are isolated
+by splitting the batch, logged and counted in ``rejected``; only the rest of
+the batch is retried after other errors. Whatever is buffered is flushed at
+interpreter exit.
+
+The hot table only keeps ``ACTIVITY_RETENTION_DAYS`` of events; ``rollover``
+moves older rows to ``BookActivityArchive`` in batches.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import BookActivity, BookActivityArchive
+
+logger = logging.getLogger(__name__)
+
+ROLLOVER_BATCH_SIZE = 5000
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ActivityBuffer:
+    def __init__(self):
+        self.events = deque()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.dropped = 0
+        self.rejected = 0
+        self.written = 0
+
+    def append(self, event):
+        max_size = _setting('ACTIVITY_MAX_BUFFER', 50000)
+        with self.lock:
+            if len(self.events) >= max_size:
+                self.events.popleft()
+                self.dropped += 1
+            self.events.append(event)
+            full = len(self.events) >= _setting('ACTIVITY_BATCH_SIZE', 500)
+        self._ensure_thread()
+        if full:
+            self.wakeup.set()
+
+    def _ensure_thread(self):
+        # A forked worker does not inherit the parent's thread
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self._run, name='activity-flusher', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(_setting('ACTIVITY_FLUSH_INTERVAL', 1.0))
+            self.wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception('Could not write book activities')
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written."""
+        batch_size = _setting('ACTIVITY_BATCH_SIZE', 500)
+        written = 0
+        while True:
+            with self.lock:
+                batch = [self.events.popleft() for _ in range(min(batch_size, len(self.events)))]
+            if not batch:
+                return written
+            count = self._write(batch)
+            written += count
+            self.written += count
+
+    def _write(self, batch):
+        # Halve a refused chunk until the offending events are alone
+        pending = [batch]
+        written = 0
+        while pending:
+            chunk = pending.pop()
+            try:
+                # Foreign keys are checked at commit, so commit per chunk
+                with transaction.atomic():
+                    BookActivity.objects.bulk_create(chunk)
+            except IntegrityError as exc:
+                if len(chunk) > 1:
+                    middle = len(chunk) // 2
+                    pending += [chunk[middle:], chunk[:middle]]
+                    continue
+                self.rejected += 1
+                event = chunk[0]
+                logger.warning('Dropped book activity %r for book %s, user %s: %s',
+                               event.action, event.book_id, event.user_id, exc)
+            except Exception:
+                # Put the unwritten events back (oldest first) and retry on the next tick
+                unwritten = chunk + [event for part in reversed(pending) for event in part]
+                with self.lock:
+                    self.events.extendleft(reversed(unwritten))
+                raise
+            else:
+                written += len(chunk)
+        return written
+
+    def __len__(self):
+        return len(self.events)
+
+
+buffer = ActivityBuffer()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception('Could not write book activities at exit')
+
+
+def log(book_id, action, user_id=None, **details):
+    """Record an event for a book ('view', 'loan', 'return', 'lost', 'reserve', ...)."""
+    if not _setting('ACTIVITY_LOG_ENABLED', True):
+        return
+    buffer.append(BookActivity(
+        book_id=book_id,
+        user_id=user_id,
+        action=action,
+        timestamp=timezone.now(),
+        details=details
+    ))
+
+
+def log_on_commit(book_id, action, user_id=None, **details):
+    """``log`` once the current transaction commits (nothing is logged on rollback)."""
+    transaction.on_commit(lambda: log(book_id, action, user_id, **details))
+
+
+def recent(hours=24, limit=20, book_id=None):
+    """Newest events of the last ``hours``, served from the (timestamp, id) index."""
+    activities = BookActivity.objects.filter(timestamp__gte=timezone.now() - timedelta(hours=hours))
+    if book_id is not None:
+        activities = activities.filter(book_id=book_id)
+    return activities.order_by('-timestamp', '-id')[:limit]
+
+
+def rollover(retention_days=None):
+    """Move events older than the retention window to the archive; returns rows moved."""
+    retention_days = retention_days or _setting('ACTIVITY_RETENTION_DAYS', 90)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    moved = 0
+    while True:
+        rows = list(
+            BookActivity.objects.filter(timestamp__lt=cutoff).order_by('timestamp', 'id')
+            .values('id', 'book_id', 'user_id', 'action', 'timestamp', 'details')[:ROLLOVER_BATCH_SIZE]
+        )
+        if not rows:
+            return moved
+        with transaction.atomic():
+            BookActivityArchive.objects.bulk_create(
+                [BookActivityArchive(**row) for row in rows],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+            BookActivity.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DailyStats, BookActivity
+from .models import DailyStats, BookActivity, LeaderboardEntry
 
 @admin.register(DailyStats)
 class DailyStatsAdmin(admin.ModelAdmin):
@@ -13,3 +13,9 @@ class BookActivityAdmin(admin.ModelAdmin):
     list_filter = ('action', 'timestamp')
     search_fields = ('book__title', 'user__username', 'action')
     raw_id_fields = ('book', 'user')
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'window', 'rank', 'label', 'loan_count', 'refreshed_at')
+    list_filter = ('kind', 'window')
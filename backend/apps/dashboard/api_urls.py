@@ -1,12 +1,12 @@
 from rest_framework.routers import DefaultRouter
-from . import api_views
+from . import views as api_views
 
 app_name = 'dashboard-api'
 
 router = DefaultRouter()
 router.register(r'statistics', api_views.DailyStatsViewSet)
 router.register(r'book-activities', api_views.BookActivityViewSet)
-router.register(r'popular-books', api_views.PopularBooksViewSet, basename='popular-books')
-router.register(r'overdue-loans', api_views.OverdueLoansViewSet, basename='overdue-loans')
+router.register(r'leaderboards', api_views.LeaderboardViewSet, basename='leaderboards')
+router.register(r'profiling', api_views.ProfilingViewSet, basename='profiling')
 
 urlpatterns = router.urls
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+Precomputed popularity leaderboards.
+
+Loans are tallied per day for each book, user, author and category in
+``LoanTally``. ``refresh`` folds in only the loans created since the last
+run (tracked by a loan id watermark) and then recomputes the top ``SIZE``
+entries of every rolling window into ``LeaderboardEntry`` and the cache, so
+readers fetch ``K`` rows instead of joining and sorting the loan history.
+
+Ids are not committed in order, so each run also re-reads the last
+``OVERLAP`` ids below the watermark and tallies the ones it has not seen
+(the ids already tallied there are kept with the watermark). A loan that
+commits later than that is picked up by the nightly rebuild.
+
+If the watermark is lost (cache flush) the tallies are rebuilt from scratch,
+which is also what the nightly ``rebuild`` does to pick up deleted loans.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.books.models import Author, Book, Category
+from apps.loans.models import BookLoan
+from .models import LeaderboardEntry, LoanTally
+
+SIZE = 50
+WINDOWS = {'7D': 7, '30D': 30, '365D': 365, 'ALL': None}
+KINDS = {
+    # kind: (loan field to group by, model, label field)
+    'BOOK': ('book_id', Book, 'title'),
+    'USER': ('user_id', get_user_model(), 'username'),
+    'AUTHOR': ('book__authors', Author, 'name'),
+    'CATEGORY': ('book__categories', Category, 'name'),
+}
+# {'last_id': watermark, 'tallied': ids above last_id - OVERLAP already counted}
+STATE_KEY = 'dashboard:leaderboards:state'
+OVERLAP = 1000
+REFRESHED_ON_KEY = 'dashboard:leaderboards:refreshed_on'
+BATCH_SIZE = 1000
+
+
+def _cache_key(kind, window):
+    return f'dashboard:leaderboards:{kind}:{window}'
+
+
+def _tally(loans):
+    """``{(kind, day, object_id): count}`` for the given loans, one grouped query per kind."""
+    counts = Counter()
+    for kind, (field, _, _) in KINDS.items():
+        rows = loans.filter(**{f'{field}__isnull': False}).annotate(
+            day=TruncDate('issue_date')
+        ).values('day', field).annotate(n=Count('pk')).values_list('day', field, 'n')
+        for day, object_id, n in rows:
+            counts[kind, day, object_id] += n
+    return counts
+
+
+def _add_tallies(counts, fresh=False):
+    existing = {}
+    keys = sorted(counts) if not fresh else []
+    for start in range(0, len(keys), BATCH_SIZE):
+        chunk = keys[start:start + BATCH_SIZE]
+        for kind in {key[0] for key in chunk}:
+            tallies = LoanTally.objects.filter(
+                kind=kind,
+                day__in={day for k, day, _ in chunk if k == kind},
+                object_id__in={object_id for k, _, object_id in chunk if k == kind}
+            )
+            for tally in tallies:
+                existing[tally.kind, tally.day, tally.object_id] = tally
+
+    updated = []
+    created = []
+    for key, n in counts.items():
+        if key in existing:
+            tally = existing[key]
+            tally.loan_count += n
+            updated.append(tally)
+        else:
+            created.append(LoanTally(kind=key[0], day=key[1], object_id=key[2], loan_count=n))
+    LoanTally.objects.bulk_update(updated, ['loan_count'], batch_size=BATCH_SIZE)
+    LoanTally.objects.bulk_create(created, batch_size=BATCH_SIZE)
+
+
+def _rank(kind, days, today):
+    tallies = LoanTally.objects.filter(kind=kind)
+    if days is not None:
+        tallies = tallies.filter(day__gt=today - timedelta(days=days))
+    top = list(
+        tallies.values('object_id').annotate(total=Sum('loan_count'))
+        .order_by('-total', 'object_id').values_list('object_id', 'total')[:SIZE]
+    )
+    _, model, label_field = KINDS[kind]
+    labels = dict(
+        model.objects.filter(pk__in=[object_id for object_id, _ in top]).values_list('pk', label_field)
+    )
+    return [
+        {'rank': rank, 'object_id': object_id, 'label': labels.get(object_id, ''), 'loan_count': total}
+        for rank, (object_id, total) in enumerate(top, start=1)
+    ]
+
+
+def _publish(today):
+    for kind in KINDS:
+        for window, days in WINDOWS.items():
+            entries = _rank(kind, days, today)
+            with transaction.atomic():
+                LeaderboardEntry.objects.filter(kind=kind, window=window).delete()
+                LeaderboardEntry.objects.bulk_create(
+                    LeaderboardEntry(kind=kind, window=window, **entry) for entry in entries
+                )
+            cache.set(_cache_key(kind, window), entries, None)
+    cache.set(REFRESHED_ON_KEY, today.isoformat(), None)
+
+
+def rebuild():
+    """Recount every tally from the loan table and republish the leaderboards."""
+    last_id = BookLoan.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+    recent = list(
+        BookLoan.objects.filter(pk__gt=last_id - OVERLAP, pk__lte=last_id).values_list('pk', flat=True)
+    )
+    with transaction.atomic():
+        LoanTally.objects.all().delete()
+        loans = BookLoan.objects.filter(Q(pk__lte=last_id - OVERLAP) | Q(pk__in=recent))
+        _add_tallies(_tally(loans), fresh=True)
+    cache.set(STATE_KEY, {'last_id': last_id, 'tallied': recent}, None)
+    _publish(timezone.localdate())
+    return last_id
+
+
+def refresh():
+    """Tally loans created since the last run; republish if anything changed or a day passed."""
+    state = cache.get(STATE_KEY)
+    if state is None:
+        return rebuild()
+
+    # Everything above the watermark, and late commits just below it
+    tallied = set(state['tallied'])
+    seen = list(
+        BookLoan.objects.filter(pk__gt=state['last_id'] - OVERLAP).order_by('pk').values_list('pk', flat=True)
+    )
+    new = [pk for pk in seen if pk not in tallied]
+    last_id = max(seen[-1] if seen else 0, state['last_id'])
+    today = timezone.localdate()
+    if new:
+        counts = Counter()
+        for start in range(0, len(new), BATCH_SIZE):
+            counts.update(_tally(BookLoan.objects.filter(pk__in=new[start:start + BATCH_SIZE])))
+        with transaction.atomic():
+            _add_tallies(counts)
+        cache.set(STATE_KEY, {'last_id': last_id, 'tallied': [pk for pk in seen if pk > last_id - OVERLAP]}, None)
+    elif cache.get(REFRESHED_ON_KEY) == today.isoformat():
+        return last_id
+    _publish(today)
+    return last_id
+
+
+def top(kind, window='ALL', limit=SIZE):
+    """The leaderboard as a list of dicts (rank, object_id, label, loan_count)."""
+    entries = cache.get(_cache_key(kind, window))
+    if entries is None:
+        entries = list(
+            LeaderboardEntry.objects.filter(kind=kind, window=window).order_by('rank')
+            .values('rank', 'object_id', 'label', 'loan_count')
+        )
+        cache.set(_cache_key(kind, window), entries, None)
+    return entries[:limit]
+
+
+def top_books(window='ALL', limit=10):
+    """``Book`` objects in leaderboard order, each with a ``loan_count`` attribute."""
+    entries = top('BOOK', window, limit)
+    books = Book.objects.prefetch_related('authors').in_bulk([entry['object_id'] for entry in entries])
+    ranked = []
+    for entry in entries:
+        book = books.get(entry['object_id'])
+        if book is not None:
+            book.loan_count = entry['loan_count']
+            ranked.append(book)
+    return ranked
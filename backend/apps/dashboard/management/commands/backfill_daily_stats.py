@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.dashboard import stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyStats rows for the last --days days (including today) from the raw tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='Days to rebuild, counting back from today')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        today = timezone.localdate()
+        rebuilt = stats.backfill(today - timedelta(days=options['days'] - 1), today)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} days of statistics.'))
@@ -0,0 +1,254 @@
+import json
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import WSGIServer, get_internal_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from apps.fines.models import Fine
+from apps.loans.models import BookLoan
+from .benchmark_http import QuietRequestHandler, percentile
+
+User = get_user_model()
+
+# name: (method, path, authenticated by)
+SCENARIOS = {
+    'api payment': ('POST', '/api/fines/{fine}/create_payment/', 'token'),
+    'web payment': ('GET', '/fines/{fine}/pay/', 'session'),
+}
+
+
+class StubGateway(ThreadingHTTPServer):
+    """Answers Razorpay order requests after ``latency`` seconds; ``peak`` is the most it had in progress."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.active = self.peak = 0
+        super().__init__(('127.0.0.1', 0), StubGatewayHandler)
+
+    def wait(self):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        self.server.wait()
+        body = json.dumps({
+            'id': f'order_stub{uuid.uuid4().hex[:14]}',
+            'entity': 'order',
+            'amount': payload.get('amount'),
+            'currency': payload.get('currency'),
+            'status': 'created',
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadPoolWSGIServer(ThreadingMixIn, WSGIServer):
+    """One WSGI worker with a fixed number of threads (gunicorn's gthread worker; 1 thread = its sync worker)."""
+
+    request_queue_size = 1024
+
+    def __init__(self, threads):
+        super().__init__(('127.0.0.1', 0), QuietRequestHandler)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(cancel_futures=True)
+
+
+class Command(BaseCommand):
+    help = ('Load test the payment views, which wait on the gateway, with one WSGI worker and one ASGI '
+            '(uvicorn) worker against a local stub gateway adding --latency ms, and report how many '
+            'requests each worker serves at a time. Needs a seeded database (populate_db) and uvicorn.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario and server')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent clients')
+        parser.add_argument('--latency', type=int, default=200, help='Stub gateway latency (ms)')
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Threads of the WSGI worker (1 = gunicorn sync worker)')
+        parser.add_argument('--servers', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError('The ASGI worker needs uvicorn: pip install uvicorn')
+        self.uvicorn = uvicorn
+        self.options = options
+
+        loan = BookLoan.objects.order_by('pk').first()
+        if loan is None:
+            raise CommandError('The database has no loans; seed it with populate_db first.')
+        self.gateway = gateway = StubGateway(options['latency'] / 1000)
+        threading.Thread(target=gateway.serve_forever, daemon=True).start()
+        self._create_client(loan)
+
+        self.stdout.write(
+            f"stub gateway latency {options['latency']} ms, {options['concurrency']} clients, "
+            f"WSGI worker threads {options['threads']}"
+        )
+        self.stdout.write(f"{'server':<6} {'scenario':<12} {'req/s':>8} {'p50':>8} {'p95':>8} {'concurrent':>11} errors")
+        try:
+            with override_settings(RAZORPAY_API_URL=f'http://127.0.0.1:{gateway.server_address[1]}/v1'):
+                for server in options['servers']:
+                    with getattr(self, f'_{server}')() as port:
+                        for name in options['scenarios']:
+                            self._print(server, name, self._run(port, name))
+        finally:
+            gateway.shutdown()
+            gateway.server_close()
+            # Fines and payments go with the user
+            self.user.delete()
+            connection.close()
+
+    def _create_client(self, loan):
+        tag = uuid.uuid4().hex[:8]
+        self.user = User.objects.create(username=f'bench_{tag}', email=f'bench_{tag}@example.com')
+        self.token = Token.objects.create(user=self.user).key
+        client = Client()
+        client.force_login(self.user)
+        self.session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.fines = [
+            fine.pk for fine in Fine.objects.bulk_create(
+                Fine(user=self.user, loan=loan, amount=Decimal('12.50'), reason='Benchmark',
+                     due_date=timezone.now() + timedelta(days=7))
+                for _ in range(self.options['concurrency'])
+            )
+        ]
+
+    def _wsgi(self):
+        command = self
+
+        class Worker:
+            def __enter__(self):
+                self.server = ThreadPoolWSGIServer(command.options['threads'])
+                self.server.set_app(get_internal_wsgi_application())
+                threading.Thread(target=self.server.serve_forever, daemon=True).start()
+                return self.server.server_address[1]
+
+            def __exit__(self, *exc_info):
+                self.server.shutdown()
+                self.server.server_close()
+
+        return Worker()
+
+    def _asgi(self):
+        command = self
+
+        class Worker:
+            def __enter__(self):
+                sock = socket.socket()
+                sock.bind(('127.0.0.1', 0))
+                config = command.uvicorn.Config(
+                    get_asgi_application(), lifespan='off', log_level='warning', backlog=1024
+                )
+                self.server = command.uvicorn.Server(config)
+                self.thread = threading.Thread(target=self.server.run, kwargs={'sockets': [sock]}, daemon=True)
+                self.thread.start()
+                while not self.server.started:
+                    time.sleep(0.01)
+                return sock.getsockname()[1]
+
+            def __exit__(self, *exc_info):
+                self.server.should_exit = True
+                self.thread.join()
+
+        return Worker()
+
+    def _request(self, port, method, path, auth):
+        headers = {'Host': 'localhost'}
+        if auth == 'session':
+            headers['Cookie'] = f'{settings.SESSION_COOKIE_NAME}={self.session}'
+        else:
+            headers['Authorization'] = f'Token {self.token}'
+        http = HTTPConnection('127.0.0.1', port, timeout=120)
+        started = time.perf_counter()
+        try:
+            http.request(method, path, headers=headers)
+            response = http.getresponse()
+            response.read()
+            status = response.status
+        finally:
+            http.close()
+        return status, (time.perf_counter() - started) * 1000
+
+    def _run(self, port, name):
+        method, template, auth = SCENARIOS[name]
+        samples = []
+        lock = threading.Lock()
+        remaining = [self.options['requests']]
+
+        def client(index):
+            path = template.format(fine=self.fines[index % len(self.fines)])
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                status, elapsed = self._request(port, method, path, auth)
+                with lock:
+                    samples.append((status == 200, elapsed))
+
+        self.gateway.peak = 0
+        clients = [threading.Thread(target=client, args=(index,)) for index in range(self.options['concurrency'])]
+        started = time.perf_counter()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _, latency in samples)
+        return {
+            'throughput': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50)),
+            'p95_ms': round(percentile(latencies, 0.95)),
+            # Requests the worker had waiting on the gateway at once
+            'concurrent': self.gateway.peak,
+            'errors': sum(1 for ok, _ in samples if not ok),
+        }
+
+    def _print(self, server, name, result):
+        self.stdout.write(
+            f"{server:<6} {name:<12} {result['throughput']:>8} {result['p50_ms']:>6}ms {result['p95_ms']:>6}ms "
+            f"{result['concurrent']:>11} {result['errors']}"
+        )
@@ -0,0 +1,78 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from apps.accounts import authentication
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Measure the cost of authenticating an API token: DRF TokenAuthentication '
+            'against the cached backend. Users and tokens are rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Distinct tokens to rotate through')
+        parser.add_argument('--requests', type=int, default=20000, help='Authentications per backend')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        try:
+            with transaction.atomic():
+                tag = uuid.uuid4().hex[:8]
+                users = User.objects.bulk_create(
+                    User(username=f'authbench_{tag}_{i}', email=f'authbench_{tag}_{i}@example.com')
+                    for i in range(options['users'])
+                )
+                keys = [Token.objects.create(user=user).key for user in users]
+                requests = [factory.get('/', HTTP_AUTHORIZATION=f'Token {key}') for key in keys]
+
+                backends = [
+                    ('TokenAuthentication', TokenAuthentication(), {}),
+                    ('cached, shared cache only', authentication.CachedTokenAuthentication(),
+                     {'AUTH_TOKEN_LOCAL_CACHE_TTL': 0}),
+                    ('cached, shared + in-process', authentication.CachedTokenAuthentication(), {}),
+                ]
+                for label, backend, overrides in backends:
+                    with override_settings(**overrides):
+                        authentication.local_cache.clear()
+                        authentication.evict(*keys)
+                        self._measure(label, backend, requests, options['requests'])
+
+                authentication.local_cache.clear()
+                authentication.evict(*keys)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _measure(self, label, backend, requests, count):
+        # Warm the caches with one pass over the tokens
+        for request in requests:
+            backend.authenticate(request)
+
+        queries = 0
+
+        def count_query(execute, *args):
+            nonlocal queries
+            queries += 1
+            return execute(*args)
+
+        with connection.execute_wrapper(count_query):
+            started = time.perf_counter()
+            for i in range(count):
+                backend.authenticate(requests[i % len(requests)])
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label:<30} {elapsed / count * 1e6:>8.1f} µs/auth  '
+            f'{queries / count:>5.2f} queries/auth'
+        )
@@ -0,0 +1,324 @@
+import json
+import platform
+import random
+import statistics
+import threading
+import time
+import uuid
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from apps.books.models import Book
+from apps.dashboard.models import DailyStats
+from apps.fines.models import Fine
+from apps.loans.models import BookLoan
+
+User = get_user_model()
+
+QUERIES_HEADER = 'X-Benchmark-Queries'
+
+# name: (method, path, who). Paths are filled in per request from the dataset;
+# checkout and return run as a pair so every loan taken out is brought back.
+SCENARIOS = {
+    'catalog list': ('GET', '/api/books/', 'member'),
+    'catalog search': ('GET', '/api/books/?search={word}', 'member'),
+    'book detail': ('GET', '/api/books/{book}/', 'member'),
+    'dashboard': ('GET', '/', 'member-session'),
+    'catalog page': ('GET', '/books/?page={page}', 'member-session'),
+    'book page': ('GET', '/books/{book}/', 'member-session'),
+    'loan checkout': ('POST', '/loans/api/book-loans/', 'member'),
+    'loan return': ('POST', '/loans/api/book-loans/{loan}/return_book/', 'member'),
+    'fines list': ('GET', '/api/fines/', 'member'),
+    'stats list': ('GET', '/api/statistics/', 'admin'),
+    'stats current': ('GET', '/api/statistics/current_stats/', 'admin'),
+    'stats summary': ('GET', '/api/statistics/summary/', 'admin'),
+}
+
+
+class QueryCountingApp:
+    """WSGI wrapper adding the number of queries a request ran as a response header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        count = [0]
+
+        def counter(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        def start(status, headers, exc_info=None):
+            return start_response(status, headers + [(QUERIES_HEADER, str(count[0]))], exc_info)
+
+        with connection.execute_wrapper(counter):
+            return self.app(environ, start)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Drive the hot HTTP endpoints with concurrent clients against the configured (seeded) '
+            'database and report throughput, p50/p95/p99 latency and queries per request. '
+            'Seed the database first, e.g. "populate_db --seed 1 --books 10000 --loans 100000". '
+            'With --baseline, fail if a scenario regressed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+        parser.add_argument('--seed', type=int, default=0, help='Seed for picking books and search words')
+        parser.add_argument('--target', help='Benchmark a running server (e.g. http://127.0.0.1:8000) '
+                                             'instead of an in-process one; queries are not counted')
+        parser.add_argument('--output', help='Write the JSON report here')
+        parser.add_argument('--baseline', help='Compare against this JSON report and fail on regressions')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 latency increase and throughput drop (fraction)')
+        parser.add_argument('--save-baseline', help='Also write the report here as the new baseline')
+        parser.add_argument('--no-fragment-cache', action='store_true',
+                            help='Render the catalog pages without the fragment cache (in-process server only)')
+
+    def handle(self, *args, **options):
+        if options['no_fragment_cache']:
+            with override_settings(FRAGMENT_CACHE_ENABLED=False):
+                return self._handle(options)
+        return self._handle(options)
+
+    def _handle(self, options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self._load_dataset()
+        server = None
+        if options['target']:
+            address = urlsplit(options['target'])
+            self.host, self.port = address.hostname, address.port or 80
+        else:
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+            server.set_app(QueryCountingApp(get_internal_wsgi_application()))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.host, self.port = server.server_address[:2]
+
+        self._create_clients()
+        self.stdout.write(f"{'scenario':<16} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} errors")
+        try:
+            results = {}
+            for name in options['scenarios']:
+                if name in results:
+                    continue
+                measured = self._run_loans() if name in ('loan checkout', 'loan return') else {name: self._run(name)}
+                for name, result in measured.items():
+                    results[name] = result
+                    self._print(name, result)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            self._cleanup()
+
+        report = {'meta': self._meta(), 'scenarios': results}
+        for path in (options['output'], options['save_baseline']):
+            if path:
+                with open(path, 'w') as file:
+                    json.dump(report, file, indent=2, sort_keys=True)
+        if options['baseline']:
+            self._compare(report, options['baseline'])
+
+    def _load_dataset(self):
+        books = list(Book.objects.order_by('pk').values_list('pk', 'title', 'available_copies')[:5000])
+        if not books or not BookLoan.objects.exists():
+            raise CommandError('The database has no books or loans; seed it with populate_db first.')
+        self.books = [pk for pk, _, _ in self.rng.sample(books, min(len(books), 200))]
+        self.lendable = [pk for pk, _, available in sorted(books, key=lambda book: -book[2])[:200] if available]
+        self.words = sorted({word for _, title, _ in books for word in title.split() if len(word) > 3})
+        self.words = self.rng.sample(self.words, min(len(self.words), 100)) or ['book']
+        self.dataset = {
+            'books': Book.objects.count(),
+            'loans': BookLoan.objects.count(),
+            'fines': Fine.objects.count(),
+            'users': User.objects.count(),
+            'daily_stats': DailyStats.objects.count(),
+        }
+
+    def _create_clients(self):
+        tag = uuid.uuid4().hex[:8]
+        self.users = [
+            User.objects.create(username=f'bench_{tag}_{n}', email=f'bench_{tag}_{n}@example.com')
+            for n in range(self.options['concurrency'])
+        ]
+        self.admin = User.objects.create(username=f'bench_{tag}_admin', email=f'bench_{tag}_admin@example.com',
+                                         role='ADMIN')
+        self.tokens = {user.pk: Token.objects.create(user=user).key for user in self.users + [self.admin]}
+        self.sessions = {}
+        for user in self.users:
+            client = Client()
+            client.force_login(user)
+            self.sessions[user.pk] = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def _cleanup(self):
+        # Loans, fines and tokens of the benchmark users go with them
+        User.objects.filter(pk__in=[user.pk for user in self.users + [self.admin]]).delete()
+        connection.close()
+
+    def _request(self, method, path, user, session=False, body=None):
+        headers = {'Host': 'localhost'}
+        if session:
+            headers['Cookie'] = f'{settings.SESSION_COOKIE_NAME}={self.sessions[user.pk]}'
+        else:
+            headers['Authorization'] = f'Token {self.tokens[user.pk]}'
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        http = HTTPConnection(self.host, self.port, timeout=60)
+        started = time.perf_counter()
+        try:
+            http.request(method, path, body=body, headers=headers)
+            response = http.getresponse()
+            content = response.read()
+        finally:
+            http.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        queries = response.getheader(QUERIES_HEADER)
+        return response.status, content, elapsed, int(queries) if queries is not None else None
+
+    def _path(self, template, rng):
+        return template.format(book=rng.choice(self.books), word=rng.choice(self.words), page=rng.randint(1, 50))
+
+    def _drive(self, work, count):
+        """Run ``work(worker, rng)`` ``count`` times over the worker threads; collect its samples."""
+        samples = {}
+        lock = threading.Lock()
+        remaining = [count]
+
+        def worker(index):
+            rng = random.Random(f'{self.options["seed"]}-{index}')
+            try:
+                while True:
+                    with lock:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                    for name, sample in work(index, rng):
+                        with lock:
+                            samples.setdefault(name, []).append(sample)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(self.options['concurrency'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - started
+
+    def _summarise(self, samples, elapsed):
+        latencies = sorted(latency for _, latency, _ in samples)
+        queries = [count for _, _, count in samples if count is not None]
+        errors = sum(1 for ok, _, _ in samples if not ok)
+        return {
+            'requests': len(samples),
+            'errors': errors,
+            'throughput': round(len(samples) / elapsed, 1),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'queries': statistics.median(queries) if queries else None,
+        }
+
+    def _run(self, name):
+        method, template, who = SCENARIOS[name]
+
+        def work(index, rng):
+            user = self.admin if who == 'admin' else self.users[index]
+            status, _, elapsed, queries = self._request(
+                method, self._path(template, rng), user, session=who == 'member-session'
+            )
+            yield name, (status == 200, elapsed, queries)
+
+        self._drive(work, self.options['warmup'])
+        samples, elapsed = self._drive(work, self.options['requests'])
+        return self._summarise(samples[name], elapsed)
+
+    def _run_loans(self):
+        def work(index, rng):
+            user = self.users[index]
+            status, content, elapsed, queries = self._request(
+                'POST', SCENARIOS['loan checkout'][1], user, body={'book_id': rng.choice(self.lendable)}
+            )
+            yield 'loan checkout', (status == 201, elapsed, queries)
+            if status != 201:
+                return
+            path = SCENARIOS['loan return'][1].format(loan=json.loads(content)['id'])
+            status, _, elapsed, queries = self._request('POST', path, user)
+            yield 'loan return', (status == 200, elapsed, queries)
+
+        if not self.lendable:
+            raise CommandError('No book has a copy available for the checkout scenario.')
+        self._drive(work, self.options['warmup'])
+        samples, elapsed = self._drive(work, self.options['requests'])
+        return {name: self._summarise(samples.get(name) or [(False, 0, None)], elapsed)
+                for name in ('loan checkout', 'loan return')}
+
+    def _print(self, name, result):
+        queries = '-' if result['queries'] is None else result['queries']
+        self.stdout.write(
+            f"{name:<16} {result['throughput']:>8} {result['p50_ms']:>6}ms {result['p95_ms']:>6}ms "
+            f"{result['p99_ms']:>6}ms {queries:>8} {result['errors']}"
+        )
+
+    def _meta(self):
+        return {
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'target': self.options['target'] or 'in-process',
+            'fragment_cache': not self.options['no_fragment_cache'],
+            'concurrency': self.options['concurrency'],
+            'requests': self.options['requests'],
+            'seed': self.options['seed'],
+            'dataset': self.dataset,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def _compare(self, report, path):
+        with open(path) as file:
+            baseline = json.load(file)
+        if baseline['meta'].get('dataset') != report['meta']['dataset']:
+            self.stderr.write('Warning: the baseline was recorded on a different dataset.')
+        tolerance = self.options['tolerance']
+        failures = []
+        for name, result in report['scenarios'].items():
+            before = baseline['scenarios'].get(name)
+            if before is None:
+                continue
+            if result['errors'] > before['errors']:
+                failures.append(f"{name}: {result['errors']} errors (baseline {before['errors']})")
+            if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                failures.append(f"{name}: p95 {result['p95_ms']} ms (baseline {before['p95_ms']} ms)")
+            if result['throughput'] < before['throughput'] * (1 - tolerance):
+                failures.append(f"{name}: {result['throughput']} req/s (baseline {before['throughput']} req/s)")
+            if None not in (result['queries'], before['queries']) and result['queries'] > before['queries']:
+                failures.append(f"{name}: {result['queries']} queries/request (baseline {before['queries']})")
+        if failures:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}'))
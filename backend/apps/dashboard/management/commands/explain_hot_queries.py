@@ -0,0 +1,94 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.dashboard.models import BookActivity
+from apps.fines.models import Fine, Payment
+from apps.loans import reservations
+from apps.loans.models import BookLoan
+
+# The filters the application runs on every request or sweep, keyed by the
+# code path they come from. Each builds a queryset from sample ids.
+HOT_QUERIES = {
+    'open loans of a member': lambda ids: BookLoan.objects.filter(
+        user_id=ids['user'], return_date__isnull=True
+    ).order_by('due_date', 'pk'),
+    'open loans of a book': lambda ids: BookLoan.objects.filter(
+        book_id=ids['book'], return_date__isnull=True
+    ).values('pk'),
+    'overdue sweep': lambda ids: BookLoan.objects.filter(
+        status='ACTIVE', due_date__lt=ids['now']
+    ).values('pk'),
+    'overdue count': lambda ids: BookLoan.objects.filter(status='OVERDUE').values('pk'),
+    'unpaid fine total of a member': lambda ids: Fine.objects.filter(
+        user_id=ids['user'], status='PENDING'
+    ).values('user').annotate(total=Sum('amount')),
+    'outstanding fines of a member': lambda ids: Fine.objects.filter(
+        user_id=ids['user'], payment_date__isnull=True
+    ).order_by('due_date', 'pk'),
+    'reservation queue head': lambda ids: reservations.queue(ids['book'])[:1],
+    'payment by gateway order': lambda ids: Payment.objects.filter(razorpay_order_id='order_explain'),
+    'payment by gateway payment': lambda ids: Payment.objects.filter(razorpay_payment_id='pay_explain'),
+    'recent activity': lambda ids: BookActivity.objects.filter(
+        timestamp__gte=ids['now']
+    ).order_by('-timestamp', '-id')[:20],
+}
+
+# Full table scans as reported by PostgreSQL and SQLite (``SCAN t USING INDEX``
+# walks an index and is not flagged)
+SEQUENTIAL_SCAN = re.compile(r'Seq Scan on (\w+)|\bSCAN (\w+)(?! USING)')
+
+
+class Command(BaseCommand):
+    help = ('Run EXPLAIN for the hot application queries and flag sequential scans. '
+            'Run it against a populated database: on small tables a sequential scan '
+            'is the right plan.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan')
+        parser.add_argument('--time', type=int, default=0, metavar='N',
+                            help='Also time each query, best of N runs')
+        parser.add_argument('--no-seqscan', action='store_true',
+                            help='PostgreSQL: disable sequential scans while planning, to check that '
+                                 'an index exists even when the planner would rightly not use it')
+
+    def handle(self, *args, **options):
+        ids = self._sample_ids()
+        flagged = []
+        with transaction.atomic():
+            if options['no_seqscan'] and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, build in HOT_QUERIES.items():
+                queryset = build(ids)
+                plan = queryset.explain()
+                scans = sorted({table for match in SEQUENTIAL_SCAN.finditer(plan) for table in match.groups() if table})
+                line = f"{'SCAN' if scans else 'ok  '} {name:<32}"
+                if scans:
+                    line += f" sequential scan on {', '.join(scans)}"
+                    flagged.append(name)
+                if options['time']:
+                    line += f"  {self._best_time(queryset, options['time']):8.2f} ms"
+                self.stdout.write(line)
+                if options['verbose_plans'] or scans:
+                    self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        if flagged:
+            raise CommandError(f"Sequential scans in: {', '.join(flagged)}")
+
+    def _sample_ids(self):
+        loan = BookLoan.objects.order_by('-pk').values('user_id', 'book_id').first() or {}
+        return {'user': loan.get('user_id', 0), 'book': loan.get('book_id', 0), 'now': timezone.now()}
+
+    def _best_time(self, queryset, runs):
+        best = None
+        for _ in range(runs):
+            started = time.perf_counter()
+            list(queryset.all())
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,97 @@
+import statistics
+import threading
+import time
+import uuid
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from apps.books.models import Book
+from apps.dashboard import activity
+from apps.dashboard.models import BookActivity
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Measure book detail API latency while book activities are ingested at a fixed rate, '
+            'with logging off, one INSERT per event, and the buffered pipeline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=int, default=1000, help='Background events per second.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per mode.')
+        parser.add_argument('--modes', nargs='+', default=['off', 'sync', 'buffered'],
+                            choices=['off', 'sync', 'buffered'])
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        self.user = User.objects.create(username=f'activity_{tag}', email=f'activity_{tag}@example.com')
+        self.book = Book.objects.create(
+            title=f'Activity load test {tag}', isbn=f'{uuid.uuid4().int % 10 ** 13:013d}',
+            publication_date=date.today(), total_copies=0, available_copies=0
+        )
+        try:
+            for mode in options['modes']:
+                with override_settings(ACTIVITY_LOG_ENABLED=mode != 'off'):
+                    self._run(mode, options['rate'], options['duration'])
+        finally:
+            BookActivity.objects.filter(book=self.book).delete()
+            self.book.delete()
+            self.user.delete()
+
+    def _produce(self, mode, rate, stop, produced):
+        # Paced against the clock: events owed after a late wakeup are caught up
+        started = time.perf_counter()
+        try:
+            while not stop.is_set():
+                due = int(rate * (time.perf_counter() - started))
+                while produced[0] < due and not stop.is_set():
+                    produced[0] += 1
+                    if mode == 'sync':
+                        BookActivity.objects.create(book=self.book, user=self.user, action='load-test')
+                    else:
+                        activity.log(self.book.pk, 'load-test', self.user.pk)
+                time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def _run(self, mode, rate, duration):
+        stop = threading.Event()
+        produced = [0]
+        producer = None
+        if mode != 'off':
+            producer = threading.Thread(target=self._produce, args=(mode, rate, stop, produced))
+            producer.start()
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(self.user)
+        url = f'/api/books/{self.book.pk}/'
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            request_started = time.perf_counter()
+            if client.get(url).status_code != 200:
+                errors += 1
+            latencies.append((time.perf_counter() - request_started) * 1000)
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        if producer:
+            producer.join()
+        activity.buffer.flush()
+        written = BookActivity.objects.filter(book=self.book, action='load-test').count()
+        BookActivity.objects.filter(book=self.book).delete()
+
+        latencies.sort()
+        self.stdout.write(
+            f"{mode:>9}: {len(latencies)} requests  p50 {statistics.median(latencies):6.2f} ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95)]:6.2f} ms  "
+            f"p99 {latencies[int(len(latencies) * 0.99)]:6.2f} ms  errors {errors}  "
+            f"events {produced[0] / elapsed:6.0f}/s  written {written}  dropped {activity.buffer.dropped}  "
+            f"rejected {activity.buffer.rejected}"
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.dashboard import leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Recount the leaderboard tallies from the loan table and republish the leaderboards.'
+
+    def handle(self, *args, **options):
+        last_id = leaderboards.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the leaderboards up to loan {last_id}.'))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('BOOK', 'Book'), ('USER', 'User'), ('AUTHOR', 'Author'), ('CATEGORY', 'Category')], max_length=8)),
+                ('window', models.CharField(choices=[('7D', 'Last 7 days'), ('30D', 'Last 30 days'), ('365D', 'Last 365 days'), ('ALL', 'All time')], max_length=4)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('label', models.CharField(max_length=200)),
+                ('loan_count', models.PositiveIntegerField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Leaderboard entries',
+                'ordering': ['kind', 'window', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'window', 'rank'), name='leaderboard_entry_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LoanTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('BOOK', 'Book'), ('USER', 'User'), ('AUTHOR', 'Author'), ('CATEGORY', 'Category')], max_length=8)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('day', models.DateField()),
+                ('loan_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'day', 'object_id'), name='loan_tally_unique')],
+            },
+        ),
+    ]
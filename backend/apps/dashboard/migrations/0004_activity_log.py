@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:26
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_bookcopy_status'),
+        ('dashboard', '0003_leaderboards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookActivityArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('book_id', models.BigIntegerField()),
+                ('user_id', models.BigIntegerField(null=True)),
+                ('action', models.CharField(max_length=50)),
+                ('timestamp', models.DateTimeField()),
+                ('details', models.JSONField(default=dict)),
+            ],
+            options={
+                'verbose_name_plural': 'Archived book activities',
+            },
+        ),
+        migrations.AlterField(
+            model_name='bookactivity',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='bookactivity',
+            index=models.Index(fields=['book', 'timestamp'], name='activity_book_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookactivityarchive',
+            index=models.Index(fields=['timestamp'], name='activity_archive_ts_idx'),
+        ),
+    ]
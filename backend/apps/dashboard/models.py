@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from apps.books.models import Book
 
 class DailyStats(models.Model):
@@ -22,11 +23,82 @@ class BookActivity(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='activities')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     action = models.CharField(max_length=50)  # e.g., 'view', 'loan', 'return', 'reserve'
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the buffered row is written
+    timestamp = models.DateTimeField(default=timezone.now)
     details = models.JSONField(default=dict)
 
     class Meta:
         verbose_name_plural = 'Book activities'
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='activity_timestamp_id_idx'),
+            models.Index(fields=['book', 'timestamp'], name='activity_book_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.book.title} - {self.action} by {self.user.username}"
+
+class BookActivityArchive(models.Model):
+    """``BookActivity`` rows past the retention window (see apps.dashboard.activity.rollover)."""
+    id = models.BigIntegerField(primary_key=True)
+    book_id = models.BigIntegerField()
+    user_id = models.BigIntegerField(null=True)
+    action = models.CharField(max_length=50)
+    timestamp = models.DateTimeField()
+    details = models.JSONField(default=dict)
+
+    class Meta:
+        verbose_name_plural = 'Archived book activities'
+        indexes = [
+            models.Index(fields=['timestamp'], name='activity_archive_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Book {self.book_id} - {self.action} at {self.timestamp}"
+
+class LoanTally(models.Model):
+    """Loans per day for one book, user, author or category (see apps.dashboard.leaderboards)."""
+    KIND_CHOICES = (
+        ('BOOK', 'Book'),
+        ('USER', 'User'),
+        ('AUTHOR', 'Author'),
+        ('CATEGORY', 'Category'),
+    )
+
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    day = models.DateField()
+    loan_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'day', 'object_id'], name='loan_tally_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} on {self.day}: {self.loan_count}"
+
+class LeaderboardEntry(models.Model):
+    WINDOW_CHOICES = (
+        ('7D', 'Last 7 days'),
+        ('30D', 'Last 30 days'),
+        ('365D', 'Last 365 days'),
+        ('ALL', 'All time'),
+    )
+
+    kind = models.CharField(max_length=8, choices=LoanTally.KIND_CHOICES)
+    window = models.CharField(max_length=4, choices=WINDOW_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    object_id = models.PositiveBigIntegerField()
+    label = models.CharField(max_length=200)
+    loan_count = models.PositiveIntegerField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['kind', 'window', 'rank']
+        verbose_name_plural = 'Leaderboard entries'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'window', 'rank'], name='leaderboard_entry_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.window} #{self.rank}: {self.label} ({self.loan_count})"
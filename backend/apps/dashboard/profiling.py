@@ -0,0 +1,257 @@
+"""
+Per-request cost profiling.
+
+``ProfilingMiddleware`` measures a sample of requests (``PROFILING_SAMPLE_RATE``):
+wall time, time spent in the database, the number of queries, how many of them
+repeat a statement already run by the same request (the N+1 signature) and
+cache hits and misses. Each sampled request is logged as one JSON line on the
+``apps.dashboard.profiling`` logger and described in a ``Server-Timing``
+header, so browser dev tools show the breakdown.
+
+Cache hits and misses are only seen through the instrumented backends below.
+The last ``PROFILING_WINDOW`` samples of every view are kept in-process for
+``view_stats``; with several worker processes each reports its own window.
+
+When ``PROFILING_PROFILE_DIR`` is set, sampled requests also run under
+cProfile and the profile of any request slower than ``PROFILING_SLOW_MS`` is
+written there (open it with ``python -m pstats`` or snakeviz). This roughly
+doubles the cost of a sampled request, so keep the sample rate low with it.
+
+The middleware runs sync or async, so it does not push async views (ASGI)
+back onto a thread. Queries are counted by a wrapper installed on every
+database connection, which reports to the profile in the request's context;
+the async ORM runs its queries in worker threads that inherit it. cProfile
+only sees the calling thread and is skipped for async requests.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_profile', default=None)
+_in_get_many = ContextVar('cache_get_many', default=False)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        return self.queries - len(self.statements)
+
+
+def _record(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record)
+
+
+class CacheStatsMixin:
+    """Counts hits and misses of the profiled request; costs a context lookup otherwise."""
+
+    _missing = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        profile = _current.get()
+        if profile is not None and not _in_get_many.get():
+            if value is self._missing:
+                profile.cache_misses += 1
+            else:
+                profile.cache_hits += 1
+        return default if value is self._missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        token = _in_get_many.set(True)
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            _in_get_many.reset(token)
+        profile = _current.get()
+        if profile is not None:
+            profile.cache_hits += len(found)
+            profile.cache_misses += len(keys) - len(found)
+        return found
+
+
+class InstrumentedRedisCache(CacheStatsMixin, RedisCache):
+    pass
+
+
+class InstrumentedLocMemCache(CacheStatsMixin, LocMemCache):
+    pass
+
+
+class ViewStats:
+    """The last ``PROFILING_WINDOW`` samples of every view."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=_setting('PROFILING_WINDOW', 1000)))
+
+    def add(self, view, sample):
+        with self.lock:
+            self.samples[view].append(sample)
+
+    def summary(self):
+        with self.lock:
+            samples = {view: list(window) for view, window in self.samples.items()}
+        result = []
+        for view, window in samples.items():
+            wall = sorted(sample['wall_ms'] for sample in window)
+            count = len(window)
+            hits = sum(sample['cache_hits'] for sample in window)
+            lookups = hits + sum(sample['cache_misses'] for sample in window)
+            result.append({
+                'view': view,
+                'samples': count,
+                'p50_ms': wall[int(count * 0.50)],
+                'p95_ms': wall[min(int(count * 0.95), count - 1)],
+                'p99_ms': wall[min(int(count * 0.99), count - 1)],
+                'db_ms': round(sum(sample['db_ms'] for sample in window) / count, 2),
+                'queries': round(sum(sample['queries'] for sample in window) / count, 1),
+                'max_duplicates': max(sample['duplicates'] for sample in window),
+                'cache_hit_ratio': round(hits / lookups, 3) if lookups else None,
+            })
+        return sorted(result, key=lambda row: row['p95_ms'], reverse=True)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+
+view_stats = ViewStats()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return f'{request.method} {match.view_name if match else "unresolved"}'
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= _setting('PROFILING_SAMPLE_RATE', 0.0):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profiler = cProfile.Profile() if _setting('PROFILING_PROFILE_DIR', None) else None
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler is already active on this thread
+                    profiler = None
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile, profiler, started)
+
+    async def __acall__(self, request):
+        if random.random() >= _setting('PROFILING_SAMPLE_RATE', 0.0):
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile, None, started)
+
+    def _finish(self, request, response, profile, profiler, started):
+        wall = (time.perf_counter() - started) * 1000
+
+        view = _view_name(request)
+        sample = {
+            'view': view,
+            'path': request.path,
+            'status': response.status_code,
+            'wall_ms': round(wall, 2),
+            'db_ms': round(profile.db_time * 1000, 2),
+            'queries': profile.queries,
+            'duplicates': profile.duplicates,
+            'cache_hits': profile.cache_hits,
+            'cache_misses': profile.cache_misses,
+        }
+        if profile.duplicates:
+            statement, count = profile.statements.most_common(1)[0]
+            sample['top_duplicate'] = {'sql': statement[:300], 'count': count}
+        if profiler is not None and wall >= _setting('PROFILING_SLOW_MS', 500):
+            sample['profile'] = self._dump(profiler, view, wall)
+        view_stats.add(view, sample)
+        logger.info(json.dumps(sample))
+
+        if _setting('PROFILING_SERVER_TIMING', True):
+            response['Server-Timing'] = (
+                f'total;dur={wall:.1f}, '
+                f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries, '
+                f'{profile.duplicates} duplicate", '
+                f'cache;desc="{profile.cache_hits} hit, {profile.cache_misses} miss"'
+            )
+        return response
+
+    def _dump(self, profiler, view, wall):
+        directory = _setting('PROFILING_PROFILE_DIR', None)
+        os.makedirs(directory, exist_ok=True)
+        name = ''.join(char if char.isalnum() else '-' for char in view).strip('-')
+        path = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{name}-{wall:.0f}ms.prof')
+        profiler.dump_stats(path)
+        return path
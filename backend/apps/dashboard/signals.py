@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from apps.loans.models import BookLoan, Reservation
+from . import activity, stats
+
+@receiver(post_save, sender=BookLoan)
+def count_new_loan(sender, instance, created, **kwargs):
+    if created:
+        stats.record('total_loans')
+        activity.log_on_commit(instance.book_id, 'loan', instance.user_id, loan=instance.pk)
+
+@receiver(post_save, sender=Reservation)
+def count_new_reservation(sender, instance, created, **kwargs):
+    if created:
+        stats.record('total_reservations')
+        activity.log_on_commit(instance.book_id, 'reserve', instance.user_id, reservation=instance.pk)
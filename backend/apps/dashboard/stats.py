@@ -0,0 +1,165 @@
+"""
+Incrementally maintained ``DailyStats`` rollups.
+
+Events bump buffered counters in the cache (``record``, applied on commit);
+``flush`` moves the buffered deltas into the ``DailyStats`` rows with atomic
+F() updates, so the request path never aggregates over loans or fines.
+
+``total_overdue_books`` is a gauge: the overdue sweep snapshots it once a day
+and returns/losses of overdue loans decrement it. ``backfill`` rebuilds any
+range of days from the raw tables (one grouped query per counter) and is run
+nightly to repair drift.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from apps.fines.models import Fine
+from apps.loans.models import BookLoan, Reservation
+from .models import DailyStats
+
+COUNTERS = ('total_loans', 'total_returns', 'total_reservations',
+            'total_fines_collected', 'total_overdue_books')
+KEY_PREFIX = 'dashboard:stats'
+KEY_TIMEOUT = 3 * 24 * 60 * 60
+
+
+def _key(day, field):
+    return f'{KEY_PREFIX}:{day.isoformat()}:{field}'
+
+
+def _to_cents(amount):
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def record(field, delta=1, day=None):
+    """Buffer ``delta`` for ``field`` of ``day`` (today); applied once the transaction commits."""
+    day = day or timezone.localdate()
+
+    def bump():
+        key = _key(day, field)
+        cache.add(key, 0, KEY_TIMEOUT)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.set(key, delta, KEY_TIMEOUT)
+
+    transaction.on_commit(bump)
+
+
+def record_fine_paid(fine):
+    record('total_fines_collected', _to_cents(fine.amount))
+
+
+def pending(day):
+    """Deltas buffered for ``day`` that have not been flushed yet."""
+    values = cache.get_many([_key(day, field) for field in COUNTERS])
+    return {field: values.get(_key(day, field), 0) for field in COUNTERS}
+
+
+def flush(days=None):
+    """Apply buffered deltas for ``days`` (today and yesterday) to their rows."""
+    today = timezone.localdate()
+    for day in days or (today - timedelta(days=1), today):
+        deltas = {field: value for field, value in pending(day).items() if value}
+        if not deltas:
+            continue
+
+        updates = {}
+        for field, value in deltas.items():
+            if field == 'total_fines_collected':
+                value = Decimal(value) / 100
+            updates[field] = Greatest(F(field) + Value(value), 0)
+        with transaction.atomic():
+            DailyStats.objects.get_or_create(date=day)
+            DailyStats.objects.filter(date=day).update(**updates, updated_at=timezone.now())
+            # Drop the deltas only once the row has them; if the update fails
+            # they stay buffered for the next flush
+            transaction.on_commit(partial(_consume, day, deltas))
+
+
+def _consume(day, deltas):
+    for field, value in deltas.items():
+        try:
+            # decr() keeps whatever was added after the read
+            cache.decr(_key(day, field), value)
+        except ValueError:
+            # Expired since the read; the row already has it
+            pass
+
+
+def current(day=None):
+    """Today's row (unsaved if nothing happened yet) including unflushed deltas."""
+    day = day or timezone.localdate()
+    stats = DailyStats.objects.filter(date=day).first() or DailyStats(date=day)
+    for field, value in pending(day).items():
+        if field == 'total_fines_collected':
+            value = Decimal(value) / 100
+        setattr(stats, field, max(getattr(stats, field) + value, 0))
+    return stats
+
+
+def snapshot_overdue(day=None):
+    """Set the overdue gauge from the loan table (run after the overdue sweep)."""
+    day = day or timezone.localdate()
+    count = BookLoan.objects.filter(status='OVERDUE').count()
+    DailyStats.objects.update_or_create(date=day, defaults={'total_overdue_books': count})
+    return count
+
+
+def _by_day(queryset, field, start, end, **aggregate):
+    rows = queryset.filter(**{f'{field}__gte': start, f'{field}__lt': end}).annotate(
+        day=TruncDate(field)
+    ).values('day').annotate(**aggregate).values_list('day', *aggregate)
+    return {day: value for day, value in rows}
+
+
+def backfill(start, end=None):
+    """Rebuild the rows for ``start`` .. ``end`` (inclusive dates) from raw data."""
+    end = end or start
+    tz = timezone.get_current_timezone()
+    since = timezone.make_aware(datetime.combine(start, time.min), tz)
+    until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+
+    # Deltas buffered for these days would be applied twice otherwise
+    flush([start + timedelta(days=n) for n in range((end - start).days + 1)])
+
+    loans = _by_day(BookLoan.objects.all(), 'issue_date', since, until, count=Count('pk'))
+    returns = _by_day(BookLoan.objects.filter(status='RETURNED'), 'return_date', since, until,
+                      count=Count('pk'))
+    reservations = _by_day(Reservation.objects.all(), 'reservation_date', since, until,
+                           count=Count('pk'))
+    fines = _by_day(Fine.objects.filter(status='PAID'), 'payment_date', since, until,
+                    total=Sum('amount'))
+
+    today = timezone.localdate()
+    day = start
+    rebuilt = 0
+    while day <= end:
+        if day >= today:
+            overdue = BookLoan.objects.filter(status='OVERDUE').count()
+        else:
+            # Loans past due and still out at the end of that day
+            day_end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+            overdue = BookLoan.objects.filter(
+                Q(return_date__isnull=True) | Q(return_date__gt=day_end),
+                due_date__lt=day_end,
+                issue_date__lt=day_end
+            ).count()
+        DailyStats.objects.update_or_create(date=day, defaults={
+            'total_loans': loans.get(day, 0),
+            'total_returns': returns.get(day, 0),
+            'total_reservations': reservations.get(day, 0),
+            'total_fines_collected': fines.get(day) or 0,
+            'total_overdue_books': overdue,
+        })
+        rebuilt += 1
+        day += timedelta(days=1)
+    return rebuilt
@@ -0,0 +1,29 @@
+from celery import shared_task
+from datetime import timedelta
+from django.utils import timezone
+from apps.dashboard import activity, leaderboards, stats
+
+@shared_task
+def flush_daily_stats():
+    # Move buffered counter deltas into today's/yesterday's DailyStats rows
+    stats.flush()
+
+@shared_task
+def backfill_daily_stats(days=2):
+    # Rebuild the last `days` days (including today) from the raw tables
+    today = timezone.localdate()
+    return stats.backfill(today - timedelta(days=days - 1), today)
+
+@shared_task
+def refresh_leaderboards():
+    # Fold loans created since the last run into the leaderboards
+    return leaderboards.refresh()
+
+@shared_task
+def rebuild_leaderboards():
+    return leaderboards.rebuild()
+
+@shared_task
+def rollover_book_activities():
+    # Move events past the retention window to the archive table
+    return activity.rollover()
@@ -1,3 +1,103 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import Sum
 from django.test import TestCase
+from django.utils import timezone
+
+from apps.books.tests import create_books
+from apps.loans.models import BookLoan
+from . import leaderboards, stats
+from .models import DailyStats, LoanTally
+
+User = get_user_model()
+
+
+class StatsFlushTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.record('total_loans', 3)
+            stats.record('total_fines_collected', 250)
+
+    def test_flush_moves_the_deltas_into_the_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.flush()
+        row = DailyStats.objects.get(date=self.today)
+        self.assertEqual((row.total_loans, row.total_fines_collected), (3, Decimal('2.50')))
+        self.assertEqual(stats.pending(self.today)['total_loans'], 0)
+        self.assertEqual(stats.current().total_loans, 3)
+
+    def test_failed_update_keeps_the_deltas_buffered(self):
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(DatabaseError):
+                stats.flush()
+        self.assertEqual(stats.pending(self.today)['total_loans'], 3)
+        self.assertEqual(stats.current().total_loans, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.flush()
+        self.assertEqual(DailyStats.objects.get(date=self.today).total_loans, 3)
+        self.assertEqual(stats.pending(self.today)['total_loans'], 0)
+
+    def test_deltas_recorded_during_a_flush_are_kept(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.flush()
+            # Recorded after flush read the counters, before its commit
+            stats.record('total_loans', 2)
+        self.assertEqual(DailyStats.objects.get(date=self.today).total_loans, 3)
+        self.assertEqual(stats.pending(self.today)['total_loans'], 2)
+
+
+class LeaderboardRefreshTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='member')
+        self.book, = create_books(1, copies=5)
+        self.first = self.loan()
+        leaderboards.rebuild()
+
+    def loan(self, pk=None):
+        return BookLoan.objects.create(
+            pk=pk, user=self.user, book=self.book, book_copy=self.book.copies.first(), status='ACTIVE',
+            due_date=timezone.now() + timedelta(days=14)
+        )
+
+    def tallied(self, kind='BOOK'):
+        return LoanTally.objects.filter(kind=kind).aggregate(n=Sum('loan_count'))['n']
+
+    def test_refresh_tallies_new_loans_once(self):
+        self.loan()
+        self.loan()
+        leaderboards.refresh()
+        self.assertEqual(self.tallied(), 3)
+        self.assertEqual(self.tallied('AUTHOR'), 3)
+        leaderboards.refresh()
+        self.assertEqual(self.tallied(), 3)
+        self.assertEqual(leaderboards.top('BOOK')[0]['loan_count'], 3)
+
+    def test_refresh_picks_up_a_loan_committed_below_the_watermark(self):
+        late_pk = self.first.pk + 1
+        # A higher id commits and is tallied first
+        self.loan(pk=late_pk + 1)
+        leaderboards.refresh()
+        self.assertEqual(self.tallied(), 2)
+
+        self.loan(pk=late_pk)
+        leaderboards.refresh()
+        self.assertEqual(self.tallied(), 3)
+        leaderboards.refresh()
+        self.assertEqual(self.tallied(), 3)
 
-# Create your tests here.
+    def test_rebuild_matches_refresh(self):
+        for _ in range(3):
+            self.loan()
+        leaderboards.refresh()
+        refreshed = self.tallied()
+        leaderboards.rebuild()
+        self.assertEqual(self.tallied(), refreshed)
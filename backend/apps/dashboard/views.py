@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -8,67 +9,48 @@ from django.contrib.auth.decorators import login_required
 from datetime import timedelta
 from .models import DailyStats, BookActivity
 from .serializers import DailyStatsSerializer, BookActivitySerializer
+from . import activity, leaderboards, profiling, stats
+from apps.accounts import snapshot
 from apps.books.models import Book
 from apps.loans.models import BookLoan
 from apps.fines.models import Fine
+from library_system import fragments
+from library_system.pagination import KeysetPagination
+from library_system.shortcuts import arender
 
 # Web Views
+# Async so the database work of a page does not hold a worker
 @login_required
-def dashboard_view(request):
-    # Get basic statistics
-    total_books = Book.objects.count()
-    available_books = Book.objects.filter(available_copies__gt=0).count()
-    total_loans = BookLoan.objects.filter(user=request.user).count()
-    active_loans = BookLoan.objects.filter(user=request.user, return_date__isnull=True).count()
-    
-    # Get overdue books
-    overdue_loans = BookLoan.objects.filter(
-        user=request.user,
-        return_date__isnull=True,
-        due_date__lt=timezone.now()
-    ).select_related('book')
-    
-    # Get recent loans
-    recent_loans = BookLoan.objects.filter(
-        user=request.user
-    ).select_related('book').order_by('-issue_date')[:5]
-    
-    # Get outstanding fines
-    outstanding_fines = Fine.objects.filter(
-        user=request.user,
-        payment_date__isnull=True
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
+async def dashboard_view(request):
+    user = await request.auser()
+    account = await sync_to_async(snapshot.get)(user)
     context = {
-        'total_books': total_books,
-        'available_books': available_books,
-        'total_loans': total_loans,
-        'active_loans': active_loans,
-        'overdue_loans': overdue_loans,
-        'recent_loans': recent_loans,
-        'outstanding_fines': outstanding_fines,
+        **await sync_to_async(snapshot.catalog_counts)(),
+        'total_loans': account['total_loans'],
+        'active_loans': len(account['active_loans']),
+        'overdue_loans': account['overdue_loans'],
+        'recent_loans': account['recent_loans'],
+        'outstanding_fines': account['outstanding_fine_total'],
     }
     
-    return render(request, 'dashboard/dashboard.html', context)
+    return await arender(request, 'dashboard/dashboard.html', context)
 
 @login_required
-def statistics_view(request):
+async def statistics_view(request):
     # Get loans statistics
     today = timezone.now()
     thirty_days_ago = today - timedelta(days=30)
     
-    monthly_loans = BookLoan.objects.filter(
+    monthly_loans = await BookLoan.objects.filter(
         issue_date__gte=thirty_days_ago
-    ).count()
+    ).acount()
     
-    popular_books = Book.objects.annotate(
-        loan_count=Count('loans')
-    ).order_by('-loan_count')[:10]
+    popular_books = await sync_to_async(leaderboards.top_books)(limit=10)
     
     # Category distribution
-    category_distribution = Book.objects.values(
+    category_distribution = [row async for row in Book.objects.values(
         'categories__name'
-    ).annotate(count=Count('id')).order_by('-count')
+    ).annotate(count=Count('id')).order_by('-count')]
     
     context = {
         'monthly_loans': monthly_loans,
@@ -76,47 +58,45 @@ def statistics_view(request):
         'category_distribution': category_distribution,
     }
     
-    return render(request, 'dashboard/statistics.html', context)
+    return await arender(request, 'dashboard/statistics.html', context)
 
 @login_required
-def book_activities_view(request):
+async def book_activities_view(request):
     # Get recent activities
-    recent_activities = BookLoan.objects.select_related(
+    recent_activities = [loan async for loan in BookLoan.objects.select_related(
         'book', 'user'
-    ).order_by('-issue_date')[:20]
+    ).order_by('-issue_date')[:20]]
     
     context = {
         'recent_activities': recent_activities,
     }
     
-    return render(request, 'dashboard/book_activities.html', context)
+    return await arender(request, 'dashboard/book_activities.html', context)
 
 @login_required
-def popular_books_view(request):
+async def popular_books_view(request):
     # Get popular books based on loan count
-    popular_books = Book.objects.annotate(
-        loan_count=Count('loans')
-    ).order_by('-loan_count')[:20]
+    popular_books = await sync_to_async(leaderboards.top_books)(limit=20)
     
     context = {
         'popular_books': popular_books,
     }
     
-    return render(request, 'dashboard/popular_books.html', context)
+    return await arender(request, 'dashboard/popular_books.html', context)
 
 @login_required
-def overdue_loans_view(request):
+async def overdue_loans_view(request):
     # Get all overdue loans
-    overdue_loans = BookLoan.objects.filter(
+    overdue_loans = [loan async for loan in BookLoan.objects.filter(
         return_date__isnull=True,
         due_date__lt=timezone.now()
-    ).select_related('book', 'user').order_by('due_date')
+    ).select_related('book', 'user').order_by('due_date')]
     
     context = {
         'overdue_loans': overdue_loans,
     }
     
-    return render(request, 'dashboard/overdue_loans.html', context)
+    return await arender(request, 'dashboard/overdue_loans.html', context)
 
 # API ViewSets
 class DailyStatsViewSet(viewsets.ModelViewSet):
@@ -144,47 +124,20 @@ class DailyStatsViewSet(viewsets.ReadOnlyModelViewSet):
         if request.user.role not in ['ADMIN', 'LIBRARIAN']:
             return Response({'detail': 'Not authorized'}, status=403)
 
-        today = timezone.now().date()
-        stats, _ = DailyStats.objects.get_or_create(date=today)
-
-        # Update stats
-        stats.total_loans = BookLoan.objects.filter(
-            issue_date__date=today
-        ).count()
-        
-        stats.total_returns = BookLoan.objects.filter(
-            return_date__date=today
-        ).count()
-        
-        stats.total_fines_collected = Fine.objects.filter(
-            payment_date__date=today,
-            status='PAID'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        stats.total_overdue_books = BookLoan.objects.filter(
-            status='OVERDUE'
-        ).count()
-        
-        stats.save()
-
-        return Response(self.get_serializer(stats).data)
+        # Maintained incrementally, see apps.dashboard.stats
+        return Response(self.get_serializer(stats.current()).data)
 
     @action(detail=False)
     def summary(self, request):
         if request.user.role not in ['ADMIN', 'LIBRARIAN']:
             return Response({'detail': 'Not authorized'}, status=403)
 
-        # Most borrowed books
-        most_borrowed = Book.objects.annotate(
-            loan_count=Count('loans')
-        ).order_by('-loan_count')[:5]
-
-        # Most active users
-        most_active_users = BookLoan.objects.values(
-            'user__username'
-        ).annotate(
-            loan_count=Count('id')
-        ).order_by('-loan_count')[:5]
+        # Most borrowed books and most active users, precomputed
+        most_borrowed = leaderboards.top('BOOK', limit=5)
+        most_active_users = [
+            {'user__username': entry['label'], 'loan_count': entry['loan_count']}
+            for entry in leaderboards.top('USER', limit=5)
+        ]
 
         # Total fines collected
         total_fines = Fine.objects.filter(
@@ -199,11 +152,11 @@ class DailyStatsViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({
             'most_borrowed_books': [
                 {
-                    'title': book.title,
-                    'loan_count': book.loan_count
-                } for book in most_borrowed
+                    'title': entry['label'],
+                    'loan_count': entry['loan_count']
+                } for entry in most_borrowed
             ],
-            'most_active_users': list(most_active_users),
+            'most_active_users': most_active_users,
             'total_fines_collected': total_fines,
             'overdue_books': overdue_books
         })
@@ -212,6 +165,8 @@ class BookActivityViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = BookActivity.objects.all()
     serializer_class = BookActivitySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-timestamp', '-id')
 
     def get_queryset(self):
         if self.request.user.role not in ['ADMIN', 'LIBRARIAN']:
@@ -220,5 +175,69 @@ class BookActivityViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False)
     def recent_activities(self, request):
-        activities = self.get_queryset().order_by('-timestamp')[:20]
+        if request.user.role not in ['ADMIN', 'LIBRARIAN']:
+            return Response([])
+        try:
+            hours = min(int(request.query_params.get('hours', 24)), 24 * 30)
+            book_id = int(request.query_params['book']) if 'book' in request.query_params else None
+        except ValueError:
+            return Response({'detail': 'Invalid parameters'}, status=400)
+        activities = activity.recent(hours=hours, limit=20, book_id=book_id)
         return Response(self.get_serializer(activities, many=True).data)
+
+class LeaderboardViewSet(viewsets.ViewSet):
+    """Precomputed top-K loans per book, user, author and category (``?window=7D|30D|365D|ALL``)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _params(self, request):
+        window = request.query_params.get('window', 'ALL').upper()
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), leaderboards.SIZE)
+        except ValueError:
+            limit = 10
+        return window, limit
+
+    def _kinds(self, request):
+        # Who borrows what is only visible to staff
+        if request.user.role in ['ADMIN', 'LIBRARIAN']:
+            return list(leaderboards.KINDS)
+        return [kind for kind in leaderboards.KINDS if kind != 'USER']
+
+    def list(self, request):
+        window, limit = self._params(request)
+        if window not in leaderboards.WINDOWS:
+            return Response({'detail': 'Unknown window'}, status=400)
+        return Response({
+            kind.lower(): leaderboards.top(kind, window, limit)
+            for kind in self._kinds(request)
+        })
+
+    def retrieve(self, request, pk=None):
+        window, limit = self._params(request)
+        kind = (pk or '').upper()
+        if kind not in self._kinds(request) or window not in leaderboards.WINDOWS:
+            return Response({'detail': 'Not found'}, status=404)
+        return Response(leaderboards.top(kind, window, limit))
+
+class ProfilingViewSet(viewsets.ViewSet):
+    """Per-view latency percentiles, DB time, queries and cache hit ratio of the profiled requests."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        if request.user.role != 'ADMIN':
+            return Response({'detail': 'Not authorized'}, status=403)
+        return Response(profiling.view_stats.summary())
+
+    @action(detail=False, methods=['post'])
+    def reset(self, request):
+        if request.user.role != 'ADMIN':
+            return Response({'detail': 'Not authorized'}, status=403)
+        profiling.view_stats.clear()
+        return Response(status=204)
+
+    @action(detail=False)
+    def fragments(self, request):
+        """Hit ratio of the cached page fragments (library_system.fragments) in this process."""
+        if request.user.role != 'ADMIN':
+            return Response({'detail': 'Not authorized'}, status=403)
+        return Response(fragments.stats())
@@ -1,5 +1,6 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from . import api_views
+from . import views as api_views
 
 app_name = 'fines-api'
 
@@ -7,4 +8,7 @@ router = DefaultRouter()
 router.register(r'fines', api_views.FineViewSet)
 router.register(r'payments', api_views.PaymentViewSet)
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    # Async, see views.create_payment_api
+    path('fines/<int:pk>/create_payment/', api_views.create_payment_api, name='fine-create-payment'),
+] + router.urls
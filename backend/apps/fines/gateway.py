@@ -0,0 +1,55 @@
+"""
+Razorpay orders over an async HTTP client.
+
+The Razorpay SDK is built on ``requests``: a view creating an order through
+it holds its worker for the whole round trip to the gateway. ``create_order``
+makes the same call with httpx, so async views (served over ASGI) leave the
+event loop free for other requests while they wait. Signature checks need no
+I/O and stay with the SDK.
+
+``RAZORPAY_API_URL`` points the client at another server (a local stub in
+``benchmark_asgi``); ``PAYMENT_GATEWAY_TIMEOUT`` bounds each call.
+"""
+import functools
+import ssl
+
+import certifi
+import httpx
+from django.conf import settings
+
+
+class GatewayError(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+@functools.cache
+def _ssl_context():
+    # Loading the CA bundle is the expensive part of creating a client
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+def _client():
+    return httpx.AsyncClient(
+        base_url=_setting('RAZORPAY_API_URL', 'https://api.razorpay.com/v1'),
+        auth=(settings.RAZORPAY_KEY_ID or '', settings.RAZORPAY_KEY_SECRET or ''),
+        timeout=_setting('PAYMENT_GATEWAY_TIMEOUT', 10),
+        verify=_ssl_context(),
+    )
+
+
+async def create_order(amount, receipt=None):
+    """Create an order for ``amount`` rupees and return it (``order['id']`` is the order id)."""
+    payload = {'amount': int(amount * 100), 'currency': 'INR', 'payment_capture': 1}
+    if receipt:
+        payload['receipt'] = receipt
+    try:
+        async with _client() as client:
+            response = await client.post('/orders', json=payload)
+            response.raise_for_status()
+            return response.json()
+    except (httpx.HTTPError, ValueError) as exc:
+        raise GatewayError(f'Razorpay order failed: {exc}') from exc
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fines', '0002_keyset_indexes'),
+        ('loans', '0005_query_pattern_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fine',
+            index=models.Index(fields=['user', 'status'], name='fines_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fine',
+            index=models.Index(condition=models.Q(('payment_date__isnull', True)), fields=['user', 'due_date'], name='fines_user_unpaid_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='fine',
+            constraint=models.CheckConstraint(condition=models.Q(('amount__gte', 0)), name='fines_amount_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('razorpay_order_id__isnull', False)), fields=('razorpay_order_id',), name='payments_razorpay_order_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('razorpay_payment_id__isnull', False)), fields=('razorpay_payment_id',), name='payments_razorpay_payment_uniq'),
+        ),
+    ]
@@ -22,6 +22,19 @@ class Fine(models.Model):
     def __str__(self):
         return f"{self.user.username} - ${self.amount} ({self.status})"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='fines_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='fines_user_created_id_idx'),
+            models.Index(fields=['user', 'status'], name='fines_user_status_idx'),
+            # Outstanding fines only, in due date order
+            models.Index(fields=['user', 'due_date'], name='fines_user_unpaid_idx',
+                         condition=models.Q(payment_date__isnull=True)),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(amount__gte=0), name='fines_amount_non_negative'),
+        ]
+
 class Payment(models.Model):
     STATUS_CHOICES = (
         ('PENDING', 'Pending'),
@@ -43,3 +56,19 @@ class Payment(models.Model):
 
     def __str__(self):
         return f"Payment for {self.fine} - {self.status}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='payments_created_id_idx'),
+        ]
+        constraints = [
+            # Gateway callbacks look payments up by these ids; unset ids are not indexed
+            models.UniqueConstraint(
+                fields=['razorpay_order_id'], condition=models.Q(razorpay_order_id__isnull=False),
+                name='payments_razorpay_order_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['razorpay_payment_id'], condition=models.Q(razorpay_payment_id__isnull=False),
+                name='payments_razorpay_payment_uniq'
+            ),
+        ]
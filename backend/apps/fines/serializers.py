@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from .models import Fine, Payment
 from apps.loans.serializers import BookLoanSerializer
+from library_system.serializers import DynamicFieldsMixin, nested_expansions
 
-class FineSerializer(serializers.ModelSerializer):
+class FineSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     loan = BookLoanSerializer(read_only=True)
 
     class Meta:
@@ -10,6 +11,13 @@ class FineSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'loan', 'amount', 'reason', 'status',
                  'due_date', 'payment_date', 'created_at')
         read_only_fields = ('created_at', 'payment_date')
+        expandable_fields = {'loan': BookLoanSerializer}
+
+    @staticmethod
+    def setup_eager_loading(queryset, expand=()):
+        return BookLoanSerializer.setup_eager_loading(
+            queryset, prefix='loan__', expand=nested_expansions(expand, 'loan')
+        )
 
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,3 +1,70 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.loans.tests import create_loans
+from .models import Fine, Payment
+
+User = get_user_model()
+
+
+def create_fines(user, count, **book_options):
+    """A fine with one payment on each of ``count`` new loans."""
+    fines = [
+        Fine.objects.create(
+            user=user, loan=loan, amount=1, reason='Overdue', due_date=timezone.now() + timedelta(days=7)
+        )
+        for loan in create_loans(user, count, **book_options)
+    ]
+    Payment.objects.bulk_create(
+        Payment(fine=fine, amount=1, payment_method='CASH', transaction_id=f'txn-{fine.pk}')
+        for fine in fines
+    )
+    return fines
+
+
+# Views log activity from a background thread that would outlive the test database
+@override_settings(ACTIVITY_LOG_ENABLED=False)
+class FineApiQueryCountTests(TestCase):
+    """The fine and payment endpoints run a fixed number of queries per request."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='librarian', role='LIBRARIAN')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertListQueries(self, url, queries, **params):
+        """A page of 1 row and a page of 25 rows take ``queries`` queries each."""
+        for page_size in (1, 25):
+            with self.subTest(params=params, page_size=page_size), self.assertNumQueries(queries):
+                response = self.client.get(url, {**params, 'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_fine_list(self):
+        create_fines(self.user, 25, authors=2, copies=2)
+        url = reverse('fines-api:fine-list')
+        # The keyset page (loan, its user and book joined)
+        self.assertListQueries(url, 1)
+        self.assertListQueries(url, 1, expand='loan')
+        # Plus one prefetch each for the book's authors, categories and copies
+        self.assertListQueries(url, 4, expand='loan.book')
+
+    def test_fine_detail(self):
+        for authors, copies in ((1, 1), (5, 8)):
+            fine, = create_fines(self.user, 1, authors=authors, copies=copies)
+            url = reverse('fines-api:fine-detail', args=[fine.pk])
+            with self.assertNumQueries(1):
+                self.client.get(url)
+            with self.assertNumQueries(4):
+                response = self.client.get(url, {'expand': 'loan.book'})
+            self.assertEqual(len(response.data['loan']['book']['copies']), copies)
+
+    def test_payment_list(self):
+        create_fines(self.user, 25)
+        self.assertListQueries(reverse('fines-api:payment-list'), 1)
@@ -1,14 +1,27 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Sum
 from django.conf import settings
+from django.http import JsonResponse
 from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
 import razorpay
+from apps.dashboard import stats
+from library_system.pagination import KeysetPagination
+from library_system.serializers import requested_expansions
+from library_system.shortcuts import arender
+from . import gateway
 from .models import Fine, Payment
 from .serializers import (
     FineSerializer, PaymentSerializer,
@@ -41,8 +54,9 @@ def fine_detail_view(request, pk):
     return render(request, 'fines/fine_detail.html', context)
 
 @login_required
-def process_payment_view(request, pk):
-    fine = get_object_or_404(Fine, pk=pk, user=request.user)
+async def process_payment_view(request, pk):
+    user = await request.auser()
+    fine = await aget_object_or_404(Fine, pk=pk, user=user)
     
     if fine.status == 'PAID':
         messages.error(request, 'This fine has already been paid.')
@@ -50,41 +64,34 @@ def process_payment_view(request, pk):
     
     try:
         # Create Razorpay Order
-        order_amount = int(fine.amount * 100)  # Convert to paisa
-        order_currency = 'INR'
-        order_receipt = f'fine_{fine.pk}'
-        
-        payment_order = razorpay_client.order.create({
-            'amount': order_amount,
-            'currency': order_currency,
-            'receipt': order_receipt,
-            'payment_capture': 1
-        })
+        payment_order = await gateway.create_order(fine.amount, receipt=f'fine_{fine.pk}')
         
         # Create a payment record
-        payment = Payment.objects.create(
+        await Payment.objects.acreate(
             fine=fine,
             amount=fine.amount,
+            payment_method='RAZORPAY',
+            transaction_id=payment_order['id'],
             razorpay_order_id=payment_order['id']
         )
-        
-        context = {
-            'fine': fine,
-            'razorpay_order_id': payment_order['id'],
-            'razorpay_key': settings.RAZORPAY_KEY_ID,
-            'callback_url': request.build_absolute_uri(
-                reverse('fines:payment_success')
-            ),
-            'cancel_url': request.build_absolute_uri(
-                reverse('fines:payment_cancel')
-            )
-        }
-        return render(request, 'fines/process_payment.html', context)
-        
-    except Exception as e:
+    except gateway.GatewayError:
         messages.error(request, 'Unable to initiate payment. Please try again.')
         return redirect('fines:fine_detail', pk=pk)
 
+    context = {
+        'fine': fine,
+        'razorpay_order_id': payment_order['id'],
+        'order_amount': payment_order['amount'],  # paise
+        'razorpay_key': settings.RAZORPAY_KEY_ID,
+        'callback_url': request.build_absolute_uri(
+            reverse('fines:payment_success')
+        ),
+        'cancel_url': request.build_absolute_uri(
+            reverse('fines:payment_cancel')
+        )
+    }
+    return await arender(request, 'fines/process_payment.html', context)
+
 @login_required
 def payment_success_view(request):
     payment_id = request.GET.get('payment_id')
@@ -94,8 +101,11 @@ def payment_success_view(request):
         payment.save()
         
         fine = payment.fine
-        fine.status = 'PAID'
-        fine.save()
+        if fine.status != 'PAID':
+            fine.status = 'PAID'
+            fine.payment_date = timezone.now()
+            fine.save()
+            stats.record_fine_paid(fine)
         
         messages.success(request, 'Payment completed successfully!')
     return redirect('fines:fine_list')
@@ -119,49 +129,19 @@ razorpay_client = razorpay.Client(
 class FineViewSet(viewsets.ModelViewSet):
     queryset = Fine.objects.all()
     serializer_class = FineSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'user']
 
     def get_queryset(self):
         user = self.request.user
-        if user.role in ['ADMIN', 'LIBRARIAN']:
-            return Fine.objects.all()
-        return Fine.objects.filter(user=user)
-
-    @action(detail=True, methods=['post'])
-    def create_payment(self, request, pk=None):
-        fine = self.get_object()
-        
-        if fine.status == 'PAID':
-            return Response(
-                {"detail": "Fine is already paid"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Create Razorpay Order
-        payment_order = razorpay_client.order.create({
-            'amount': int(fine.amount * 100),  # Convert to paisa
-            'currency': 'INR',
-            'payment_capture': 1
-        })
-
-        # Create a payment record
-        payment = Payment.objects.create(
-            fine=fine,
-            amount=fine.amount,
-            payment_method='RAZORPAY',
-            transaction_id=payment_order['id'],
-            status='PENDING',
-            razorpay_order_id=payment_order['id']
+        queryset = Fine.objects.all()
+        if user.role not in ['ADMIN', 'LIBRARIAN']:
+            queryset = queryset.filter(user=user)
+        return self.get_serializer_class().setup_eager_loading(
+            queryset, expand=requested_expansions(self.request)
         )
 
-        return Response({
-            'payment_id': payment.id,
-            'razorpay_order_id': payment_order['id'],
-            'razorpay_key_id': settings.RAZORPAY_KEY_ID,
-            'amount': fine.amount
-        })
-
     @action(detail=True, methods=['post'])
     def verify_payment(self, request, pk=None):
         fine = self.get_object()
@@ -194,9 +174,11 @@ class FineViewSet(viewsets.ModelViewSet):
             payment.save()
 
             # Update fine status
-            fine.status = 'PAID'
-            fine.payment_date = payment.payment_date
-            fine.save()
+            if fine.status != 'PAID':
+                fine.status = 'PAID'
+                fine.payment_date = payment.payment_date
+                fine.save()
+                stats.record_fine_paid(fine)
 
             return Response({'status': 'Payment successful'})
 
@@ -208,9 +190,68 @@ class FineViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+def _api_user(request):
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    return Request(request, authenticators=authenticators).user
+
+
+@csrf_exempt
+@require_POST
+async def create_payment_api(request, pk):
+    """
+    ``POST /api/fines/<pk>/create_payment/``: a plain async view rather than a
+    FineViewSet action (DRF views are synchronous), so waiting for the gateway
+    does not hold a worker. Authentication is DRF's, CSRF included.
+    """
+    try:
+        user = await sync_to_async(_api_user)(request)
+    except APIException as exc:
+        return JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+
+    fines = Fine.objects.filter(pk=pk)
+    if user.role not in ['ADMIN', 'LIBRARIAN']:
+        fines = fines.filter(user=user)
+    fine = await fines.afirst()
+    if fine is None:
+        return JsonResponse({'detail': 'No Fine matches the given query.'}, status=404)
+
+    if fine.status == 'PAID':
+        return JsonResponse(
+            {"detail": "Fine is already paid"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        payment_order = await gateway.create_order(fine.amount)
+    except gateway.GatewayError:
+        return JsonResponse(
+            {'detail': 'Payment gateway unavailable'},
+            status=status.HTTP_502_BAD_GATEWAY
+        )
+
+    # Create a payment record
+    payment = await Payment.objects.acreate(
+        fine=fine,
+        amount=fine.amount,
+        payment_method='RAZORPAY',
+        transaction_id=payment_order['id'],
+        status='PENDING',
+        razorpay_order_id=payment_order['id']
+    )
+
+    return JsonResponse({
+        'payment_id': payment.id,
+        'razorpay_order_id': payment_order['id'],
+        'razorpay_key_id': settings.RAZORPAY_KEY_ID,
+        'amount': fine.amount
+    })
+
 class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'payment_method']
 
@@ -1,7 +1,9 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils import timezone
 from .models import BookLoan, Reservation
+from . import inventory, reservations
 
 
 class BookLoanForm(forms.ModelForm):
@@ -11,11 +13,11 @@ class BookLoanForm(forms.ModelForm):
         
     def clean_book(self):
         book = self.cleaned_data['book']
-        if book.available_copies <= 0:
+        user = self.instance.user
+        if not reservations.can_borrow(user, book):
             raise ValidationError('This book is currently unavailable for borrowing.')
             
         # Check if user has any overdue books
-        user = self.instance.user
         overdue_loans = BookLoan.objects.filter(
             user=user,
             return_date__isnull=True,
@@ -38,26 +40,20 @@ class BookLoanForm(forms.ModelForm):
         
     def save(self, commit=True):
         loan = super().save(commit=False)
-        # Set due date to 14 days from now
-        loan.due_date = timezone.now().date() + timezone.timedelta(days=14)
+        # Set due date to 14 days from now, as the API does
+        loan.due_date = timezone.now() + timezone.timedelta(days=14)
+        loan.status = 'ACTIVE'
         
         if commit:
-            # Update book availability
             book = loan.book
-            book.available_copies -= 1
-            book.save()
-            
-            loan.save()
-            
-            # Check and fulfill any reservations
-            reservation = Reservation.objects.filter(
-                book=book,
-                fulfilled_date__isnull=True,
-                cancelled_date__isnull=True
-            ).first()
-            if reservation:
-                reservation.fulfilled_date = timezone.now()
-                reservation.save()
+            with transaction.atomic():
+                # Claim a copy and update book availability
+                try:
+                    loan.book_copy = inventory.checkout_copy(book.pk)
+                except inventory.NoCopyAvailable:
+                    raise ValidationError('This book is currently unavailable for borrowing.')
+                loan.save()
+                reservations.fulfil(loan.user, book.pk)
         
         return loan
 
@@ -71,8 +67,8 @@ class ReservationForm(forms.ModelForm):
         book = self.cleaned_data['book']
         user = self.instance.user
         
-        # Check if book is already available
-        if book.available_copies > 0:
+        # Check if book is already available (copies held for others don't count)
+        if reservations.can_borrow(user, book):
             raise ValidationError(
                 'This book is currently available. No need to reserve.'
             )
@@ -81,8 +77,7 @@ class ReservationForm(forms.ModelForm):
         existing_reservation = Reservation.objects.filter(
             user=user,
             book=book,
-            fulfilled_date__isnull=True,
-            cancelled_date__isnull=True
+            status__in=reservations.ACTIVE
         )
         if existing_reservation.exists():
             raise ValidationError('You already have an active reservation for this book.')
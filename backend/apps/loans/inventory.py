@@ -0,0 +1,191 @@
+"""
+Inventory bookkeeping for loans.
+
+``Book.available_copies`` is only touched on real loan state transitions
+(issue, return, lost), each applied as a single conditional UPDATE with F()
+expressions so concurrent checkouts cannot lose updates and the rest of the
+book row is left alone. Taking the last copy or bringing the first one back
+is a separate conditional UPDATE, so those transitions can flag the catalog
+facets (``apps.books.facets``) without reading the row. Every transition
+moves the book's ``updated_at`` and the catalog version
+(``apps.books.conditional``), which the API's ETags are derived from.
+``reconcile_available_copies`` repairs any drift (e.g. loans edited through
+the admin) in bulk.
+
+Physical copies carry their own indexed ``status``; a checkout claims one
+AVAILABLE copy with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the backend
+supports it, or with a compare-and-swap UPDATE on the status column
+otherwise (SQLite), so the cost does not depend on the loan history and two
+concurrent checkouts never get the same copy.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from apps.books import conditional, facets
+from apps.books.models import Book, BookCopy
+from apps.accounts import snapshot
+from apps.dashboard import activity, stats
+from .models import BookLoan
+from . import reservations
+
+CLAIM_ATTEMPTS = 5
+
+
+class NoCopyAvailable(Exception):
+    pass
+
+
+def issue_copy(book_id):
+    """Take one copy of a book out of circulation; False if none is available."""
+    books = Book.objects.filter(pk=book_id)
+    changes = {'available_copies': F('available_copies') - 1, 'updated_at': timezone.now()}
+    if books.filter(available_copies__gt=1).update(**changes):
+        return True
+    # Taking the last copy changes the availability facets
+    if books.filter(available_copies=1).update(**changes):
+        facets.mark_dirty()
+        return True
+    return False
+
+
+def release_copy(book_id):
+    """Put one copy of a book back into circulation."""
+    books = Book.objects.filter(pk=book_id, available_copies__lt=F('total_copies'))
+    changes = {'available_copies': F('available_copies') + 1, 'updated_at': timezone.now()}
+    if books.filter(available_copies__gt=0).update(**changes):
+        return True
+    if books.filter(available_copies=0).update(**changes):
+        facets.mark_dirty()
+        return True
+    return False
+
+
+def retire_copy(book_id, on_loan=True):
+    """
+    Drop a copy from the book's total. A copy out on loan is already missing
+    from ``available_copies``; an available one (``on_loan=False``) leaves both.
+    """
+    books = Book.objects.filter(pk=book_id)
+    now = timezone.now()
+    if on_loan:
+        return books.filter(total_copies__gt=F('available_copies')).update(
+            total_copies=F('total_copies') - 1,
+            updated_at=now
+        ) == 1
+    changes = {
+        'total_copies': F('total_copies') - 1,
+        'available_copies': F('available_copies') - 1,
+        'updated_at': now,
+    }
+    if books.filter(available_copies__gt=1).update(**changes):
+        return True
+    # Retiring the last available copy changes the availability facets
+    if books.filter(available_copies=1).update(**changes):
+        facets.mark_dirty()
+        return True
+    return False
+
+
+def claim_copy(book_id):
+    """Mark one AVAILABLE copy of a book ON_LOAN and return it, or None."""
+    now = timezone.now()
+    copies = BookCopy.objects.filter(book_id=book_id, status='AVAILABLE').order_by('copy_number')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            book_copy = copies.select_for_update(skip_locked=True).first()
+            if book_copy is None:
+                return None
+            BookCopy.objects.filter(pk=book_copy.pk).update(status='ON_LOAN', updated_at=now)
+    else:
+        # No row locks: claim by flipping the status only if it is still AVAILABLE
+        for copy_id in copies.values_list('pk', flat=True)[:CLAIM_ATTEMPTS]:
+            if BookCopy.objects.filter(pk=copy_id, status='AVAILABLE').update(
+                status='ON_LOAN', updated_at=now
+            ):
+                book_copy = BookCopy(pk=copy_id, book_id=book_id)
+                break
+        else:
+            return None
+
+    book_copy.status = 'ON_LOAN'
+    return book_copy
+
+
+def checkout_copy(book_id):
+    """
+    Claim a copy for a new loan and take it out of the available count.
+    Raises ``NoCopyAvailable`` (leaving nothing changed) if there is none.
+    """
+    with transaction.atomic():
+        book_copy = claim_copy(book_id)
+        if book_copy is None or not issue_copy(book_id):
+            raise NoCopyAvailable
+        conditional.catalog_changed([book_id])
+    return book_copy
+
+
+def _close_loan(loan, status):
+    now = timezone.now()
+    was_overdue = loan.status == 'OVERDUE'
+    with transaction.atomic():
+        closed = BookLoan.objects.filter(pk=loan.pk, return_date__isnull=True).update(
+            return_date=now,
+            status=status,
+            updated_at=now
+        )
+        if not closed:
+            return False
+        if status == 'LOST':
+            retire_copy(loan.book_id)
+        else:
+            release_copy(loan.book_id)
+            # Hand the copy to the next reservation in line, if any
+            reservations.promote([loan.book_id], now)
+        conditional.catalog_changed([loan.book_id])
+        BookCopy.objects.filter(pk=loan.book_copy_id).update(
+            status='LOST' if status == 'LOST' else 'AVAILABLE',
+            updated_at=now
+        )
+        activity.log_on_commit(loan.book_id, status.lower(), loan.user_id, loan=loan.pk)
+        snapshot.invalidate(loan.user_id)
+        if status == 'RETURNED':
+            stats.record('total_returns')
+        if was_overdue:
+            stats.record('total_overdue_books', -1)
+
+    loan.return_date = now
+    loan.status = status
+    loan.updated_at = now
+    return True
+
+
+def return_loan(loan):
+    """Close an open loan as returned; False if it was already closed."""
+    return _close_loan(loan, 'RETURNED')
+
+
+def mark_lost(loan):
+    """Close an open loan as lost; the copy does not come back into circulation."""
+    return _close_loan(loan, 'LOST')
+
+
+def reconcile_available_copies():
+    """Recompute ``available_copies`` for every book that drifted; returns the number fixed."""
+    open_loans = BookLoan.objects.filter(
+        book=OuterRef('pk'),
+        return_date__isnull=True
+    ).values('book').annotate(count=Count('pk')).values('count')
+    expected = Greatest(F('total_copies') - Coalesce(Subquery(open_loans), 0), 0)
+
+    drifted = list(Book.objects.annotate(expected=expected).exclude(
+        available_copies=F('expected')
+    ).values_list('pk', flat=True))
+    if not drifted:
+        return 0
+    fixed = Book.objects.filter(pk__in=drifted).update(available_copies=expected, updated_at=timezone.now())
+    facets.mark_dirty()
+    conditional.catalog_changed(drifted)
+    return fixed
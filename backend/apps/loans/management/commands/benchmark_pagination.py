@@ -0,0 +1,91 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.books.models import Book, BookCopy
+from apps.loans.models import BookLoan
+from library_system.pagination import KeysetPagination
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare page 1 vs deep page latency for page-number and keyset pagination over book loans.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=110000,
+                            help='Synthetic loans to create (rolled back afterwards).')
+        parser.add_argument('--page', type=int, default=10000)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._populate(options['loans'])
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _populate(self, count):
+        user = get_user_model().objects.create(username='pagination-benchmark', email='pagination@example.com')
+        book = Book.objects.create(
+            title='Pagination Benchmark', isbn='9999999999999',
+            publication_date=timezone.now().date(), total_copies=1, available_copies=0
+        )
+        copy = BookCopy.objects.create(book=book, copy_number=1, status='ON_LOAN')
+        due_date = timezone.now() + timedelta(days=14)
+        BookLoan.objects.bulk_create(
+            (BookLoan(user=user, book=book, book_copy=copy, due_date=due_date, status='RETURNED')
+             for _ in range(count)),
+            batch_size=5000
+        )
+        self.stdout.write(f"{BookLoan.objects.count()} loans")
+
+    def _time(self, paginator, params, repeat):
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+        timings = []
+        for _ in range(repeat):
+            request = Request(factory.get('/loans/api/book-loans/', params))
+            started = time.perf_counter()
+            page = paginator.paginate_queryset(BookLoan.objects.order_by('-created_at', '-id'), request)
+            paginator.get_paginated_response([loan.pk for loan in page])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def _run(self, options):
+        page, page_size, repeat = options['page'], options['page_size'], options['repeat']
+
+        class PageNumber(PageNumberPagination):
+            pass
+        PageNumber.page_size = page_size
+
+        class Keyset(KeysetPagination):
+            pass
+        Keyset.page_size = page_size
+
+        queryset = BookLoan.objects.order_by('-created_at', '-id')
+        results = [
+            ('page-number', 1, self._time(PageNumber(), {'page': 1}, repeat)),
+            ('page-number', page, self._time(PageNumber(), {'page': page}, repeat)),
+            ('keyset', 1, self._time(Keyset(), {}, repeat)),
+        ]
+
+        # The cursor a client following "next" links would hold at that depth
+        cursor = Keyset().encode_cursor(queryset[(page - 1) * page_size - 1])
+        results.append(('keyset', page, self._time(Keyset(), {'cursor': cursor}, repeat)))
+        results.append(('keyset+count', page, self._time(Keyset(), {'cursor': cursor, 'count': 'true'}, repeat)))
+
+        for name, number, median in results:
+            self.stdout.write(f"{name:>13} page {number:>6}: {median:8.2f} ms (median of {repeat})")
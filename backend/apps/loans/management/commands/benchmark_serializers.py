@@ -0,0 +1,91 @@
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from apps.books.models import Author, Category, Book, BookCopy
+from apps.fines.models import Fine
+from apps.fines.serializers import FineSerializer
+from apps.loans.models import BookLoan
+from apps.loans.serializers import BookLoanSerializer
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Compare payload size and serialization time of the compact (default) and '
+            'fully expanded loan and fine representations.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Loans (and fines) serialized per run.')
+        parser.add_argument('--copies', type=int, default=20, help='Physical copies per book.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._populate(options['rows'], options['copies'])
+                self._run(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _populate(self, rows, copies):
+        tag = uuid.uuid4().hex[:8]
+        isbn = uuid.uuid4().int % 10 ** 12
+        user = User.objects.create(username=f'serializers_{tag}', email=f'serializers_{tag}@example.com')
+        author = Author.objects.create(name=f'Benchmark Author {tag}', bio='Lorem ipsum dolor sit amet. ' * 80)
+        category = Category.objects.create(name=f'Benchmark {tag}', description='A benchmark category.')
+        now = timezone.now()
+        for n in range(rows):
+            book = Book.objects.create(
+                title=f'Serializer Benchmark {n}', isbn=f'9{isbn + n:012d}',
+                publication_date=date.today(), description='A book. ' * 40,
+                total_copies=copies, available_copies=copies - 1
+            )
+            book.authors.add(author)
+            book.categories.add(category)
+            BookCopy.objects.bulk_create([
+                BookCopy(book=book, copy_number=i + 1, status='ON_LOAN' if i == 0 else 'AVAILABLE')
+                for i in range(copies)
+            ])
+            loan = BookLoan.objects.create(
+                user=user, book=book, book_copy=book.copies.get(copy_number=1),
+                status='OVERDUE', due_date=now - timedelta(days=3)
+            )
+            Fine.objects.create(user=user, loan=loan, amount=3, reason='Benchmark', due_date=now)
+        self.user = user
+
+    def _time(self, serializer_class, queryset, expand, repeat):
+        queryset = serializer_class.setup_eager_loading(queryset, expand=expand)
+        timings = []
+        payload = b''
+        for _ in range(repeat):
+            rows = list(queryset.all())
+            started = time.perf_counter()
+            payload = JSONRenderer().render(serializer_class(rows, many=True, expand=expand).data)
+            timings.append((time.perf_counter() - started) * 1000)
+        return len(payload), statistics.median(timings)
+
+    def _run(self, repeat):
+        cases = [
+            ('loans', BookLoanSerializer, BookLoan.objects.filter(user=self.user), ['book', 'user']),
+            ('fines', FineSerializer, Fine.objects.filter(user=self.user), ['loan.book', 'loan.user']),
+        ]
+        for name, serializer_class, queryset, full in cases:
+            for label, expand in (('expanded', full), ('compact', [])):
+                size, median = self._time(serializer_class, queryset, expand, repeat)
+                self.stdout.write(
+                    f"{name:>6} {label:>9}: {size / 1024:9.1f} KiB  {median:8.2f} ms serialize "
+                    f"(median of {repeat}, ?expand={','.join(expand) or '-'})"
+                )
@@ -0,0 +1,98 @@
+import threading
+import uuid
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIClient
+
+from apps.books.models import Book, BookCopy
+from apps.loans.models import BookLoan
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Fire N concurrent checkouts at a book with K copies through the loans API '
+            'and check that exactly min(N, K) succeed and no copy is handed out twice.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=20)
+        parser.add_argument('--copies', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated book and users.')
+
+    def handle(self, *args, **options):
+        threads, copies = options['threads'], options['copies']
+        tag = uuid.uuid4().hex[:8]
+
+        book = Book.objects.create(
+            title=f'Stress test {tag}',
+            isbn=f'{uuid.uuid4().int % 10 ** 13:013d}',
+            publication_date=date.today(),
+            total_copies=copies,
+            available_copies=copies
+        )
+        BookCopy.objects.bulk_create([
+            BookCopy(book=book, copy_number=i + 1) for i in range(copies)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'stress_{tag}_{i}', email=f'stress_{tag}_{i}@example.com')
+            for i in range(threads)
+        ])
+
+        barrier = threading.Barrier(threads)
+        results = []
+        lock = threading.Lock()
+
+        def checkout(user):
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                response = client.post('/loans/api/book-loans/', {'book_id': book.pk})
+                outcome = response.status_code
+            except Exception as e:
+                outcome = repr(e)
+            finally:
+                connection.close()
+            with lock:
+                results.append(outcome)
+
+        workers = [threading.Thread(target=checkout, args=(user,)) for user in users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        succeeded = results.count(201)
+        rejected = results.count(400)
+        errors = [r for r in results if r not in (201, 400)]
+        book.refresh_from_db()
+        open_loans = BookLoan.objects.filter(book=book, return_date__isnull=True)
+        distinct_copies = open_loans.values('book_copy').distinct().count()
+        on_loan = BookCopy.objects.filter(book=book, status='ON_LOAN').count()
+
+        self.stdout.write(
+            f'{threads} checkouts, {copies} copies: {succeeded} succeeded, {rejected} rejected, '
+            f'{len(errors)} errors; available_copies={book.available_copies}, '
+            f'copies on loan={on_loan}, distinct copies in open loans={distinct_copies}'
+        )
+
+        expected = min(threads, copies)
+        ok = (
+            succeeded == expected
+            and not errors
+            and open_loans.count() == expected
+            and distinct_copies == expected
+            and on_loan == expected
+            and book.available_copies == copies - expected
+        )
+
+        if not options['keep']:
+            book.delete()
+            User.objects.filter(username__startswith=f'stress_{tag}_').delete()
+
+        if not ok:
+            raise CommandError(f'Concurrent checkout check failed: {errors[:3]}')
+        self.stdout.write(self.style.SUCCESS('OK'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookloan',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('ACTIVE', 'Active'), ('RETURNED', 'Returned'), ('OVERDUE', 'Overdue'), ('LOST', 'Lost')], default='PENDING', max_length=8),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+
+def cancel_duplicate_reservations(apps, schema_editor):
+    # The constraint below allows one open reservation per member and book;
+    # keep the oldest of any duplicates and cancel the rest
+    Reservation = apps.get_model('loans', 'Reservation')
+    active = Reservation.objects.filter(status__in=['PENDING', 'READY'])
+    older = active.filter(user=OuterRef('user'), book=OuterRef('book')).filter(
+        Q(reservation_date__lt=OuterRef('reservation_date')) |
+        Q(reservation_date=OuterRef('reservation_date'), pk__lt=OuterRef('pk'))
+    )
+    active.filter(Exists(older)).update(status='CANCELLED', hold_expires_at=None, updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_query_pattern_indexes'),
+        ('loans', '0004_reservation_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookloan',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['user', 'due_date'], name='loans_user_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookloan',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['book'], name='loans_book_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookloan',
+            index=models.Index(fields=['status', 'due_date'], name='loans_status_due_idx'),
+        ),
+        migrations.RunPython(cancel_duplicate_reservations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'READY'])), fields=('user', 'book'), name='reservation_one_active_per_user'),
+        ),
+    ]
@@ -8,6 +8,7 @@ class BookLoan(models.Model):
         ('ACTIVE', 'Active'),
         ('RETURNED', 'Returned'),
         ('OVERDUE', 'Overdue'),
+        ('LOST', 'Lost'),
     )
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='loans')
@@ -24,15 +25,27 @@ class BookLoan(models.Model):
     def __str__(self):
         return f"{self.book.title} - {self.user.username} ({self.status})"
 
-    def save(self, *args, **kwargs):
-        # Update book's available copies count
-        super().save(*args, **kwargs)
-        self.book.update_available_copies()
+    class Meta:
+        indexes = [
+            # Keyset pagination on (created_at, id), for everyone and per user
+            models.Index(fields=['created_at', 'id'], name='loans_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='loans_user_created_id_idx'),
+            # Open loans only (a small slice of the table): per member, ordered by
+            # due date, and per book for availability counts
+            models.Index(fields=['user', 'due_date'], name='loans_user_open_idx',
+                         condition=models.Q(return_date__isnull=True)),
+            models.Index(fields=['book'], name='loans_book_open_idx',
+                         condition=models.Q(return_date__isnull=True)),
+            # Overdue sweep and overdue counts
+            models.Index(fields=['status', 'due_date'], name='loans_status_due_idx'),
+        ]
 
 class Reservation(models.Model):
     STATUS_CHOICES = (
         ('PENDING', 'Pending'),
+        ('READY', 'Ready for pickup'),
         ('FULFILLED', 'Fulfilled'),
+        ('EXPIRED', 'Expired'),
         ('CANCELLED', 'Cancelled'),
     )
     
@@ -42,6 +55,7 @@ class Reservation(models.Model):
     status = models.CharField(max_length=9, choices=STATUS_CHOICES, default='PENDING')
     notification_sent = models.BooleanField(default=False)
     fulfillment_date = models.DateTimeField(null=True, blank=True)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -50,3 +64,14 @@ class Reservation(models.Model):
 
     class Meta:
         ordering = ['reservation_date']
+        indexes = [
+            # Per-book FIFO queue: head lookup, queue positions and hold counts
+            models.Index(fields=['book', 'status', 'reservation_date'], name='reservation_queue_idx'),
+            models.Index(fields=['status', 'hold_expires_at'], name='reservation_hold_expiry_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'book'], condition=models.Q(status__in=['PENDING', 'READY']),
+                name='reservation_one_active_per_user'
+            ),
+        ]
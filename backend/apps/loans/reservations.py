@@ -0,0 +1,168 @@
+"""
+Per-book FIFO reservation queues.
+
+A book's queue is its PENDING reservations in ``(reservation_date, id)``
+order, served by the ``(book, status, reservation_date)`` index: the head is
+a single index seek and a member's position is the number of entries ahead
+of it, counted on the same index. Positions are derived rather than stored,
+so a cancellation never renumbers the rest of the queue.
+
+When copies free up the head of the queue is promoted to a READY hold that
+expires after ``RESERVATION_HOLD_HOURS``. A book never has more READY holds
+than available copies, and copies under hold can only be borrowed by their
+holders. ``promote`` expires lapsed holds and promotes the next members of
+any number of queues in one transaction with a constant number of queries;
+returns drive it directly and the periodic tasks only catch up on expiry.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, When, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from apps.books.models import Book
+from apps.notifications import outbox
+from apps.notifications.tasks import send_outbox
+from .models import Reservation
+
+ACTIVE = ('PENDING', 'READY')
+
+
+def hold_period():
+    return timedelta(hours=getattr(settings, 'RESERVATION_HOLD_HOURS', 48))
+
+
+def queue(book_id):
+    """The book's waiting list, head first."""
+    return Reservation.objects.filter(book_id=book_id, status='PENDING').order_by('reservation_date', 'pk')
+
+
+def next_in_line(book_id):
+    return queue(book_id).first()
+
+
+def with_positions(queryset):
+    """Annotate ``position`` (1 = next in line) on PENDING reservations, None otherwise."""
+    ahead = Reservation.objects.filter(
+        Q(reservation_date__lt=OuterRef('reservation_date')) |
+        Q(reservation_date=OuterRef('reservation_date'), pk__lt=OuterRef('pk')),
+        book=OuterRef('book'),
+        status='PENDING'
+    ).order_by().values('book').annotate(n=Count('pk')).values('n')
+    return queryset.annotate(position=Case(
+        When(status='PENDING', then=Coalesce(Subquery(ahead), 0) + 1),
+        default=None,
+        output_field=IntegerField()
+    ))
+
+
+def held_copies(book_id):
+    return Reservation.objects.filter(book_id=book_id, status='READY').count()
+
+
+def can_borrow(user, book):
+    """False if every available copy of ``book`` is on hold for other members."""
+    if book.available_copies <= 0:
+        return False
+    if Reservation.objects.filter(book=book, user=user, status='READY').exists():
+        return True
+    return book.available_copies > held_copies(book.pk)
+
+
+def _pickup_notice(reservation):
+    return outbox.message(
+        f'reservation-available:{reservation.pk}',
+        'Book Available for Pickup',
+        f'Dear {reservation.user.get_full_name()},\n\n'
+        f'The book "{reservation.book.title}" is now available. '
+        f'Please visit the library to check it out before '
+        f'{timezone.localtime(reservation.hold_expires_at):%b %d, %H:%M}.',
+        reservation.user.email
+    )
+
+
+def promote(book_ids=None, now=None):
+    """
+    Expire lapsed holds and turn the heads of the queues into holds for every
+    free copy; ``book_ids`` limits this to some books. Returns
+    ``(expired, promoted)`` counts.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        lapsed = Reservation.objects.filter(status='READY', hold_expires_at__lte=now)
+        waiting = Reservation.objects.filter(status='PENDING')
+        books = Book.objects.all()
+        if book_ids is not None:
+            book_ids = sorted(book_ids)
+            # Serialise promotions of the same book (a return already holds this lock)
+            list(Book.objects.select_for_update().filter(pk__in=book_ids).order_by('pk').values_list('pk'))
+            lapsed = lapsed.filter(book_id__in=book_ids)
+            waiting = waiting.filter(book_id__in=book_ids)
+            books = books.filter(pk__in=book_ids)
+        expired = lapsed.update(status='EXPIRED', updated_at=now)
+
+        # Free copies per book with a queue: available minus already held
+        free = dict(
+            books.filter(pk__in=waiting.values('book_id')).annotate(
+                held=Count('reservations', filter=Q(reservations__status='READY'))
+            ).filter(available_copies__gt=F('held')).annotate(
+                free=F('available_copies') - F('held')
+            ).values_list('pk', 'free')
+        )
+        if not free:
+            return expired, 0
+
+        ranked = Reservation.objects.filter(status='PENDING', book_id__in=free).annotate(
+            place=Window(
+                RowNumber(),
+                partition_by=[F('book_id')],
+                order_by=[F('reservation_date').asc(), F('pk').asc()]
+            )
+        ).filter(place__lte=max(free.values())).values_list('pk', 'book_id', 'place')
+        ids = [pk for pk, book_id, place in ranked if place <= free[book_id]]
+
+        expires = now + hold_period()
+        promoted = Reservation.objects.filter(pk__in=ids, status='PENDING').update(
+            status='READY', hold_expires_at=expires, notification_sent=True, updated_at=now
+        )
+        outbox.enqueue_many(
+            _pickup_notice(reservation)
+            for reservation in Reservation.objects.filter(pk__in=ids).select_related('user', 'book')
+        )
+        if promoted:
+            transaction.on_commit(send_outbox.delay)
+    return expired, promoted
+
+
+def expire_holds(now=None):
+    """Expire lapsed holds and pass the copies on to the next in line."""
+    now = now or timezone.now()
+    book_ids = set(
+        Reservation.objects.filter(status='READY', hold_expires_at__lte=now).values_list('book_id', flat=True)
+    )
+    if not book_ids:
+        return 0, 0
+    return promote(book_ids, now)
+
+
+def fulfil(user, book_id, now=None):
+    """Close the user's open reservation for a book they just borrowed."""
+    now = now or timezone.now()
+    return Reservation.objects.filter(user=user, book_id=book_id, status__in=ACTIVE).update(
+        status='FULFILLED', fulfillment_date=now, hold_expires_at=None, updated_at=now
+    )
+
+
+def cancel(reservation, now=None):
+    """Cancel an open reservation; a cancelled hold goes to the next in line."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        cancelled = Reservation.objects.filter(pk=reservation.pk, status__in=ACTIVE).update(
+            status='CANCELLED', hold_expires_at=None, updated_at=now
+        )
+        if cancelled and reservation.status == 'READY':
+            promote([reservation.book_id], now)
+    reservation.status = 'CANCELLED'
+    return bool(cancelled)
@@ -1,12 +1,13 @@
 from rest_framework import serializers
 from .models import BookLoan, Reservation
-from apps.books.serializers import BookSerializer
+from apps.books.serializers import BookSerializer, BookSummarySerializer
 from apps.books.models import Book
-from apps.accounts.serializers import UserSerializer
+from apps.accounts.serializers import UserSerializer, UserSummarySerializer
+from library_system.serializers import DynamicFieldsMixin
 
-class BookLoanSerializer(serializers.ModelSerializer):
-    book = BookSerializer(read_only=True)
-    user = UserSerializer(read_only=True)
+class BookLoanSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    book = BookSummarySerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     book_id = serializers.PrimaryKeyRelatedField(
         source='book',
         queryset=Book.objects.all(),
@@ -17,20 +18,40 @@ class BookLoanSerializer(serializers.ModelSerializer):
         model = BookLoan
         fields = ('id', 'user', 'book', 'book_id', 'book_copy', 'issue_date',
                  'due_date', 'return_date', 'status', 'notes', 'created_at')
-        read_only_fields = ('issue_date', 'created_at', 'status')
+        read_only_fields = ('issue_date', 'created_at', 'status', 'book_copy', 'due_date',
+                           'return_date')
+        expandable_fields = {'book': BookSerializer, 'user': UserSerializer}
 
-class ReservationSerializer(serializers.ModelSerializer):
-    book = BookSerializer(read_only=True)
-    user = UserSerializer(read_only=True)
+    @staticmethod
+    def setup_eager_loading(queryset, prefix='', expand=()):
+        queryset = queryset.select_related(f'{prefix}user', f'{prefix}book')
+        if 'book' in expand:
+            queryset = BookSerializer.setup_eager_loading(queryset, prefix=f'{prefix}book__')
+        return queryset
+
+class ReservationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    book = BookSummarySerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     book_id = serializers.PrimaryKeyRelatedField(
         source='book',
         queryset=Book.objects.all(),
         write_only=True
     )
+    position = serializers.IntegerField(read_only=True, default=None)
 
     class Meta:
         model = Reservation
         fields = ('id', 'user', 'book', 'book_id', 'reservation_date',
-                 'status', 'notification_sent', 'fulfillment_date', 'created_at')
+                 'status', 'position', 'hold_expires_at', 'notification_sent',
+                 'fulfillment_date', 'created_at')
+        # The state only moves through apps.loans.reservations (promote, cancel)
         read_only_fields = ('reservation_date', 'created_at', 'notification_sent',
-                           'fulfillment_date')
\ No newline at end of file
+                           'fulfillment_date', 'hold_expires_at', 'status')
+        expandable_fields = {'book': BookSerializer, 'user': UserSerializer}
+
+    @staticmethod
+    def setup_eager_loading(queryset, expand=()):
+        queryset = queryset.select_related('user', 'book')
+        if 'book' in expand:
+            queryset = BookSerializer.setup_eager_loading(queryset, prefix='book__')
+        return queryset
\ No newline at end of file
@@ -1,128 +1,139 @@
 from celery import shared_task
-from django.core.mail import send_mail
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
-from django.conf import settings
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
-from apps.loans.models import BookLoan, Reservation
+from decimal import Decimal
+from apps.loans.models import BookLoan
 from apps.fines.models import Fine
+from apps.loans import inventory, reservations
+from apps.accounts import snapshot
+from apps.dashboard import stats
+from apps.notifications import outbox
+from apps.notifications.tasks import send_outbox
+
+OVERDUE_SWEEP_CHECKPOINT = 'loans:overdue_sweep:checkpoint'
+OVERDUE_SWEEP_CHUNK_SIZE = 1000
+
+def _sweep_overdue(cutoff, last_id, chunk_size):
+    # Walk loans due before the cutoff in primary key order, one chunk per
+    # transaction, checkpointing (cutoff + last loan id done) after each
+    processed = 0
+    while True:
+        loan_ids = list(
+            BookLoan.objects.filter(
+                status='ACTIVE',
+                due_date__lt=cutoff,
+                pk__gt=last_id
+            ).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not loan_ids:
+            break
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Update loan status
+            BookLoan.objects.filter(pk__in=loan_ids, status='ACTIVE').update(
+                status='OVERDUE',
+                updated_at=now
+            )
 
-@shared_task
-def check_overdue_books():
-    # Find all active loans that are overdue
-    overdue_loans = BookLoan.objects.filter(
-        status='ACTIVE',
-        due_date__lt=timezone.now()
-    )
-
-    for loan in overdue_loans:
-        # Update loan status
-        loan.status = 'OVERDUE'
-        loan.save()
-
-        # Create fine if not already created
-        if not Fine.objects.filter(loan=loan).exists():
-            days_overdue = (timezone.now() - loan.due_date).days
-            fine_amount = days_overdue * 1.0  # $1 per day
-
-            Fine.objects.create(
-                user=loan.user,
-                loan=loan,
-                amount=fine_amount,
-                reason=f"Book overdue by {days_overdue} days",
-                due_date=timezone.now() + timedelta(days=7)
+            # Create fines for loans that do not have one yet
+            loans_without_fine = BookLoan.objects.filter(
+                pk__in=loan_ids,
+                fines__isnull=True
+            ).values_list('pk', 'user_id', 'due_date')
+            fines = []
+            for loan_id, user_id, due_date in loans_without_fine:
+                days_overdue = (now - due_date).days
+                fines.append(Fine(
+                    user_id=user_id,
+                    loan_id=loan_id,
+                    amount=Decimal(days_overdue),  # $1 per day
+                    reason=f"Book overdue by {days_overdue} days",
+                    due_date=now + timedelta(days=7)
+                ))
+            Fine.objects.bulk_create(fines)
+            snapshot.invalidate(*(fine.user_id for fine in fines))
+
+            # Queue the notices with the status change, so a crash cannot leave
+            # overdue loans without one; the outbox sends them in pooled batches
+            notices = BookLoan.objects.filter(pk__in=loan_ids, status='OVERDUE').values_list(
+                'pk', 'user__first_name', 'user__last_name', 'user__email', 'book__title'
+            )
+            outbox.enqueue_many(
+                outbox.message(
+                    f'loan-overdue:{loan_id}',
+                    'Book Overdue Notice',
+                    f'Dear {f"{first_name} {last_name}".strip()},\n\n'
+                    f'The book "{title}" is overdue. '
+                    f'Please return it as soon as possible to avoid additional fines.',
+                    email
+                )
+                for loan_id, first_name, last_name, email, title in notices
             )
 
-        # Send email notification
-        send_mail(
-            'Book Overdue Notice',
-            f'Dear {loan.user.get_full_name()},\n\n'
-            f'The book "{loan.book.title}" is overdue. '
-            f'Please return it as soon as possible to avoid additional fines.',
-            settings.DEFAULT_FROM_EMAIL,
-            [loan.user.email],
-            fail_silently=True
+        last_id = loan_ids[-1]
+        processed += len(loan_ids)
+        cache.set(
+            OVERDUE_SWEEP_CHECKPOINT,
+            {'cutoff': cutoff.isoformat(), 'last_id': last_id},
+            timeout=None
         )
 
+    return processed
+
+@shared_task
+def check_overdue_books(chunk_size=OVERDUE_SWEEP_CHUNK_SIZE):
+    processed = 0
+    checkpoint = cache.get(OVERDUE_SWEEP_CHECKPOINT)
+    if checkpoint:
+        # Finish the crashed run first; loans that fell due since it started
+        # are left to the fresh pass below
+        processed += _sweep_overdue(parse_datetime(checkpoint['cutoff']), checkpoint['last_id'], chunk_size)
+    processed += _sweep_overdue(timezone.now(), 0, chunk_size)
+
+    cache.delete(OVERDUE_SWEEP_CHECKPOINT)
+    stats.snapshot_overdue()
+    if processed:
+        send_outbox.delay()
+    return processed
+
 @shared_task
 def send_due_date_reminders():
     # Find loans due in 2 days
     upcoming_due = BookLoan.objects.filter(
         status='ACTIVE',
         due_date__date=timezone.now().date() + timedelta(days=2)
-    )
+    ).select_related('user', 'book')
 
-    for loan in upcoming_due:
-        send_mail(
+    queued = outbox.enqueue_many(
+        outbox.message(
+            f'loan-due-reminder:{loan.pk}:{loan.due_date.date()}',
             'Book Due Date Reminder',
             f'Dear {loan.user.get_full_name()},\n\n'
             f'The book "{loan.book.title}" is due in 2 days. '
             f'Please return it on time to avoid fines.',
-            settings.DEFAULT_FROM_EMAIL,
-            [loan.user.email],
-            fail_silently=True
+            loan.user.email
         )
+        for loan in upcoming_due.iterator(chunk_size=2000)
+    )
+    if queued:
+        send_outbox.delay()
 
 @shared_task
 def process_reservations():
-    # Find books with available copies
-    available_books = set(
-        BookLoan.objects.filter(
-            return_date__date=timezone.now().date()
-        ).values_list('book_id', flat=True)
-    )
-
-    for book_id in available_books:
-        # Find oldest pending reservation for this book
-        reservation = Reservation.objects.filter(
-            book_id=book_id,
-            status='PENDING'
-        ).order_by('reservation_date').first()
-
-        if reservation:
-            # Send notification
-            send_mail(
-                'Book Available for Pickup',
-                f'Dear {reservation.user.get_full_name()},\n\n'
-                f'The book "{reservation.book.title}" is now available. '
-                f'Please visit the library to check it out within 48 hours.',
-                settings.DEFAULT_FROM_EMAIL,
-                [reservation.user.email],
-                fail_silently=True
-            )
-
-            reservation.notification_sent = True
-            reservation.save()
+    # Returns promote reservations as they happen; this catches up on copies
+    # that became available any other way (new copies, reconciliation)
+    return reservations.promote()
 
 @shared_task
 def cleanup_expired_reservations():
-    # Find reservations that were notified 48+ hours ago but not fulfilled
-    expired = Reservation.objects.filter(
-        notification_sent=True,
-        status='PENDING',
-        updated_at__lt=timezone.now() - timedelta(hours=48)
-    )
-
-    for reservation in expired:
-        # Cancel the reservation
-        reservation.status = 'CANCELLED'
-        reservation.save()
-
-        # Notify the next person in line
-        next_reservation = Reservation.objects.filter(
-            book=reservation.book,
-            status='PENDING'
-        ).order_by('reservation_date').first()
+    # Expire holds not picked up in time and pass the copies down the queues
+    return reservations.expire_holds()
 
-        if next_reservation:
-            send_mail(
-                'Book Available for Pickup',
-                f'Dear {next_reservation.user.get_full_name()},\n\n'
-                f'The book "{next_reservation.book.title}" is now available. '
-                f'Please visit the library to check it out within 48 hours.',
-                settings.DEFAULT_FROM_EMAIL,
-                [next_reservation.user.email],
-                fail_silently=True
-            )
-
-            next_reservation.notification_sent = True
-            next_reservation.save()
\ No newline at end of file
+@shared_task
+def reconcile_available_copies():
+    # Repair drift between available_copies and open loans in one statement
+    return inventory.reconcile_available_copies()
@@ -1,3 +1,296 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from apps.books.models import Book, BookCopy
+from apps.books.tests import create_books
+from . import inventory, tasks
+from .models import BookLoan, Reservation
+
+User = get_user_model()
+
+
+def create_loans(user, count, **book_options):
+    """One open loan of the first copy of each of ``count`` new books."""
+    return [
+        BookLoan.objects.create(
+            user=user, book=book, book_copy=book.copies.first(), status='ACTIVE',
+            due_date=timezone.now() + timedelta(days=14)
+        )
+        for book in create_books(count, **book_options)
+    ]
+
+
+# Views log activity from a background thread that would outlive the test database
+@override_settings(ACTIVITY_LOG_ENABLED=False)
+class LoanApiQueryCountTests(TestCase):
+    """The loan and reservation endpoints run a fixed number of queries per request."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='librarian', role='LIBRARIAN')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertListQueries(self, url, queries, sizes, **params):
+        """Each ``page_size: rows`` in ``sizes`` renders that many rows in ``queries`` queries."""
+        for page_size, rows in sizes.items():
+            with self.subTest(params=params, page_size=page_size), self.assertNumQueries(queries):
+                response = self.client.get(url, {**params, 'page_size': page_size})
+            self.assertEqual(len(response.data['results']), rows)
+
+    def test_loan_list(self):
+        create_loans(self.user, 25, authors=2, copies=2)
+        url = reverse('loans:bookloan-list')
+        # The keyset page (user and book joined)
+        self.assertListQueries(url, 1, {1: 1, 25: 25})
+        # Plus one prefetch each for the book's authors, categories and copies
+        self.assertListQueries(url, 4, {1: 1, 25: 25}, expand='book,user')
+
+    def test_loan_detail(self):
+        for authors, copies in ((1, 1), (5, 8)):
+            loan, = create_loans(self.user, 1, authors=authors, copies=copies)
+            url = reverse('loans:bookloan-detail', args=[loan.pk])
+            with self.assertNumQueries(1):
+                self.client.get(url)
+            with self.assertNumQueries(4):
+                response = self.client.get(url, {'expand': 'book,user'})
+            self.assertEqual(len(response.data['book']['copies']), copies)
+
+    def test_reservation_list(self):
+        url = reverse('loans:reservation-list')
+        for book in create_books(1):
+            Reservation.objects.create(user=self.user, book=book)
+        # PageNumberPagination takes no page_size parameter; 1 row, then a full page
+        self.assertListQueries(url, 2, {1: 1})
+        self.assertListQueries(url, 5, {1: 1}, expand='book')
+
+        for book in create_books(api_settings.PAGE_SIZE, authors=3, copies=3):
+            Reservation.objects.create(user=self.user, book=book)
+        # Count and page, then the book prefetches
+        self.assertListQueries(url, 2, {1: api_settings.PAGE_SIZE})
+        self.assertListQueries(url, 5, {1: api_settings.PAGE_SIZE}, expand='book')
+
+    def test_reservation_detail(self):
+        for authors, copies in ((1, 1), (5, 8)):
+            book, = create_books(1, authors=authors, copies=copies)
+            reservation = Reservation.objects.create(user=self.user, book=book)
+            url = reverse('loans:reservation-detail', args=[reservation.pk])
+            with self.assertNumQueries(1):
+                self.client.get(url)
+            with self.assertNumQueries(4):
+                response = self.client.get(url, {'expand': 'book'})
+            self.assertEqual(len(response.data['book']['authors']), authors)
+
+
+class InventoryTests(TestCase):
+    """Loan transitions move the book's counters with conditional F() updates."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='member')
+        self.book, = create_books(1, copies=3)
+
+    def counts(self):
+        self.book.refresh_from_db()
+        return self.book.total_copies, self.book.available_copies
+
+    def borrow(self):
+        return BookLoan.objects.create(
+            user=self.user, book=self.book, book_copy=inventory.checkout_copy(self.book.pk),
+            status='ACTIVE', due_date=timezone.now() + timedelta(days=14)
+        )
+
+    def test_checkout_takes_a_copy(self):
+        loan = self.borrow()
+        self.assertEqual(self.counts(), (3, 2))
+        self.assertEqual(BookCopy.objects.get(pk=loan.book_copy_id).status, 'ON_LOAN')
+
+    def test_checkout_with_no_copy_available(self):
+        for _ in range(3):
+            self.borrow()
+        self.assertFalse(inventory.issue_copy(self.book.pk))
+        with self.assertRaises(inventory.NoCopyAvailable):
+            inventory.checkout_copy(self.book.pk)
+        self.assertEqual(self.counts(), (3, 0))
+        self.assertEqual(BookCopy.objects.filter(book=self.book, status='ON_LOAN').count(), 3)
+
+    def test_checkout_rolls_back_the_claim_when_the_count_is_exhausted(self):
+        # The counter says none are left although a copy row is AVAILABLE
+        Book.objects.filter(pk=self.book.pk).update(available_copies=0)
+        with self.assertRaises(inventory.NoCopyAvailable):
+            inventory.checkout_copy(self.book.pk)
+        self.assertEqual(BookCopy.objects.filter(book=self.book, status='AVAILABLE').count(), 3)
+
+    def test_return_puts_the_copy_back(self):
+        loan = self.borrow()
+        self.assertTrue(inventory.return_loan(loan))
+        self.assertEqual(self.counts(), (3, 3))
+        self.assertEqual(BookCopy.objects.get(pk=loan.book_copy_id).status, 'AVAILABLE')
+        # Closing it again changes nothing
+        self.assertFalse(inventory.return_loan(BookLoan.objects.get(pk=loan.pk)))
+        self.assertEqual(self.counts(), (3, 3))
+
+    def test_release_at_total_changes_nothing(self):
+        self.assertFalse(inventory.release_copy(self.book.pk))
+        self.assertEqual(self.counts(), (3, 3))
+
+    def test_lost_loan_retires_the_copy_on_loan(self):
+        loan = self.borrow()
+        self.assertTrue(inventory.mark_lost(loan))
+        self.assertEqual(self.counts(), (2, 2))
+        self.assertEqual(BookCopy.objects.get(pk=loan.book_copy_id).status, 'LOST')
+
+    def test_retire_copy_on_loan(self):
+        self.borrow()
+        self.assertTrue(inventory.retire_copy(self.book.pk))
+        self.assertEqual(self.counts(), (2, 2))
+        # Nothing else is out on loan
+        self.assertFalse(inventory.retire_copy(self.book.pk))
+        self.assertEqual(self.counts(), (2, 2))
+
+    def test_retire_available_copy(self):
+        self.borrow()
+        self.assertTrue(inventory.retire_copy(self.book.pk, on_loan=False))
+        self.assertEqual(self.counts(), (2, 1))
+        self.assertTrue(inventory.retire_copy(self.book.pk, on_loan=False))
+        self.assertEqual(self.counts(), (1, 0))
+        # The remaining copy is on loan
+        self.assertFalse(inventory.retire_copy(self.book.pk, on_loan=False))
+        self.assertEqual(self.counts(), (1, 0))
+
+    def test_reconcile_fixes_drifted_rows(self):
+        self.borrow()
+        other, = create_books(1, copies=2)
+        Book.objects.filter(pk=self.book.pk).update(available_copies=3)
+        self.assertEqual(inventory.reconcile_available_copies(), 1)
+        self.assertEqual(self.counts(), (3, 2))
+        other.refresh_from_db()
+        self.assertEqual(other.available_copies, 2)
+        self.assertEqual(inventory.reconcile_available_copies(), 0)
+
+
+@mock.patch('apps.loans.tasks.send_outbox.delay')
+class OverdueSweepTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='member', email='member@example.com')
+
+    def loan(self, due):
+        loan, = create_loans(self.user, 1)
+        BookLoan.objects.filter(pk=loan.pk).update(due_date=due)
+        return loan
+
+    def test_sweep(self, send_outbox):
+        now = timezone.now()
+        overdue, current = self.loan(now - timedelta(days=3)), self.loan(now + timedelta(days=1))
+        self.assertEqual(tasks.check_overdue_books(), 1)
+        self.assertEqual(
+            dict(BookLoan.objects.values_list('pk', 'status')),
+            {overdue.pk: 'OVERDUE', current.pk: 'ACTIVE'}
+        )
+        self.assertEqual(overdue.fines.get().amount, 3)
+
+    def test_resumed_run_also_sweeps_loans_due_since_the_crash(self, send_outbox):
+        now = timezone.now()
+        # Done by the crashed run, then due after its cutoff, then left by it
+        done, since, left = (self.loan(now - timedelta(hours=hours)) for hours in (50, 1, 48))
+        BookLoan.objects.filter(pk=done.pk).update(status='OVERDUE')
+        cache.set(tasks.OVERDUE_SWEEP_CHECKPOINT,
+                  {'cutoff': (now - timedelta(hours=3)).isoformat(), 'last_id': since.pk}, None)
+
+        self.assertEqual(tasks.check_overdue_books(), 2)
+        self.assertEqual(set(BookLoan.objects.values_list('status', flat=True)), {'OVERDUE'})
+        self.assertIsNone(cache.get(tasks.OVERDUE_SWEEP_CHECKPOINT))
+        send_outbox.assert_called_once_with()
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Checkouts racing for the copies of one book (each thread has its own connection)."""
+
+    THREADS = 12
+    COPIES = 4
+
+    def test_each_copy_goes_to_exactly_one_checkout(self):
+        book, = create_books(1, copies=self.COPIES)
+        barrier = threading.Barrier(self.THREADS)
+        claimed, refused, errors = [], [], []
+        lock = threading.Lock()
+
+        def checkout():
+            try:
+                barrier.wait()
+                outcome, result = claimed, inventory.checkout_copy(book.pk)
+            except inventory.NoCopyAvailable:
+                outcome, result = refused, None
+            except Exception as exc:
+                # An IntegrityError here would be books_available_within_total
+                outcome, result = errors, exc
+            finally:
+                connection.close()
+            with lock:
+                outcome.append(result)
+
+        threads = [threading.Thread(target=checkout) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(claimed), self.COPIES)
+        self.assertEqual(len(refused), self.THREADS - self.COPIES)
+        self.assertEqual(len({book_copy.pk for book_copy in claimed}), self.COPIES)
+        self.assertEqual(BookCopy.objects.filter(book=book, status='ON_LOAN').count(), self.COPIES)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(book.total_copies, self.COPIES)
+
+
+class DuplicateReservationMigrationTests(TransactionTestCase):
+    """0005 cancels duplicate open reservations before adding the unique constraint."""
+
+    before = [('loans', '0004_reservation_queue')]
+    after = [('loans', '0005_query_pattern_indexes')]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_keeps_the_oldest_open_reservation(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        user = apps.get_model('accounts', 'User').objects.create(username='member')
+        Book = apps.get_model('books', 'Book')
+        book, other = (
+            Book.objects.create(title=f'Book {n}', isbn=f'978000000000{n}', publication_date='2001-01-01',
+                                total_copies=1, available_copies=0)
+            for n in range(2)
+        )
+        Reservation = apps.get_model('loans', 'Reservation')
+        now = timezone.now()
+        oldest, newer, held, done, single = (
+            Reservation.objects.create(user=user, book=book, status=status)
+            for status in ('PENDING', 'PENDING', 'READY', 'FULFILLED', 'PENDING')
+        )
+        Reservation.objects.filter(pk=single.pk).update(book=other)
+        for offset, reservation in enumerate((oldest, newer, held, done)):
+            Reservation.objects.filter(pk=reservation.pk).update(reservation_date=now + timedelta(minutes=offset))
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+
+        self.assertEqual(
+            dict(Reservation.objects.values_list('pk', 'status')),
+            {oldest.pk: 'PENDING', newer.pk: 'CANCELLED', held.pk: 'CANCELLED',
+             done.pk: 'FULFILLED', single.pk: 'PENDING'}
+        )
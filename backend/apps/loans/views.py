@@ -1,7 +1,9 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
 from datetime import timedelta
 from rest_framework import viewsets, status, filters, serializers
@@ -11,8 +13,11 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import BookLoan, Reservation
 from .serializers import BookLoanSerializer, ReservationSerializer
 from .forms import BookLoanForm, ReservationForm
+from . import inventory, reservations
 from apps.books.models import Book, BookCopy
 from apps.fines.models import Fine
+from library_system.pagination import KeysetPagination
+from library_system.serializers import requested_expansions
 
 # Web Views
 @login_required
@@ -45,13 +50,16 @@ def loan_detail_view(request, pk):
 @login_required
 def create_loan_view(request):
     if request.method == 'POST':
-        form = BookLoanForm(request.POST)
+        form = BookLoanForm(request.POST, instance=BookLoan(user=request.user))
         if form.is_valid():
-            loan = form.save(commit=False)
-            loan.user = request.user
-            loan.save()
-            messages.success(request, f'Successfully borrowed {loan.book.title}')
-            return redirect('loans:loan_detail', pk=loan.pk)
+            try:
+                # Claims a copy through inventory.checkout_copy
+                loan = form.save()
+            except ValidationError as error:
+                form.add_error('book', error)
+            else:
+                messages.success(request, f'Successfully borrowed {loan.book.title}')
+                return redirect('loans:loan_detail', pk=loan.pk)
     else:
         form = BookLoanForm()
     
@@ -67,13 +75,9 @@ def return_loan_view(request, pk):
     )
     
     if request.method == 'POST':
-        loan.return_date = timezone.now()
-        loan.save()
-        
-        # Update book availability
-        book = loan.book
-        book.available_copies += 1
-        book.save()
+        if not inventory.return_loan(loan):
+            messages.error(request, 'This book has already been returned.')
+            return redirect('loans:loan_list')
         
         # Calculate and create fine if overdue
         if loan.is_overdue:
@@ -98,18 +102,15 @@ def return_loan_view(request, pk):
 
 @login_required
 def reservation_list_view(request):
-    active_reservations = Reservation.objects.filter(
-        user=request.user,
-        fulfilled_date__isnull=True,
-        cancelled_date__isnull=True
+    active_reservations = reservations.with_positions(
+        Reservation.objects.filter(user=request.user, status__in=reservations.ACTIVE)
     ).select_related('book')
     
     past_reservations = Reservation.objects.filter(
         user=request.user
     ).exclude(
-        fulfilled_date__isnull=True,
-        cancelled_date__isnull=True
-    ).select_related('book').order_by('-created_date')
+        status__in=reservations.ACTIVE
+    ).select_related('book').order_by('-reservation_date')
     
     context = {
         'active_reservations': active_reservations,
@@ -120,11 +121,9 @@ def reservation_list_view(request):
 @login_required
 def create_reservation_view(request):
     if request.method == 'POST':
-        form = ReservationForm(request.POST)
+        form = ReservationForm(request.POST, instance=Reservation(user=request.user))
         if form.is_valid():
-            reservation = form.save(commit=False)
-            reservation.user = request.user
-            reservation.save()
+            reservation = form.save()
             messages.success(request, f'Successfully reserved {reservation.book.title}')
             return redirect('loans:reservation_list')
     else:
@@ -138,13 +137,11 @@ def cancel_reservation_view(request, pk):
         Reservation,
         pk=pk,
         user=request.user,
-        fulfilled_date__isnull=True,
-        cancelled_date__isnull=True
+        status__in=reservations.ACTIVE
     )
     
     if request.method == 'POST':
-        reservation.cancelled_date = timezone.now()
-        reservation.save()
+        reservations.cancel(reservation)
         messages.success(request, 'Reservation cancelled successfully!')
         return redirect('loans:reservation_list')
     
@@ -153,15 +150,19 @@ def cancel_reservation_view(request, pk):
 class BookLoanViewSet(viewsets.ModelViewSet):
     queryset = BookLoan.objects.all()
     serializer_class = BookLoanSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['status', 'book']
     search_fields = ['book__title', 'user__username']
 
     def get_queryset(self):
         user = self.request.user
-        if user.role in ['ADMIN', 'LIBRARIAN']:
-            return BookLoan.objects.all()
-        return BookLoan.objects.filter(user=user)
+        queryset = BookLoan.objects.all()
+        if user.role not in ['ADMIN', 'LIBRARIAN']:
+            queryset = queryset.filter(user=user)
+        return self.get_serializer_class().setup_eager_loading(
+            queryset, expand=requested_expansions(self.request)
+        )
 
     def perform_create(self, serializer):
         book = serializer.validated_data['book']
@@ -177,28 +178,29 @@ class BookLoanViewSet(viewsets.ModelViewSet):
                 "Cannot borrow books while you have overdue items"
             )
 
-        # Check if book is available
+        # Check if book is available (copies on hold only go to their holders)
         if book.available_copies <= 0:
             raise serializers.ValidationError("Book is not available")
-
-        # Get available copy
-        book_copy = BookCopy.objects.filter(
-            book=book,
-            loans__isnull=True
-        ).first()
-
-        if not book_copy:
-            raise serializers.ValidationError("No copies available")
+        if not reservations.can_borrow(self.request.user, book):
+            raise serializers.ValidationError("All available copies are on hold for other members")
 
         # Set due date (e.g., 14 days from now)
         due_date = timezone.now() + timedelta(days=14)
 
-        serializer.save(
-            user=self.request.user,
-            book_copy=book_copy,
-            due_date=due_date,
-            status='ACTIVE'
-        )
+        with transaction.atomic():
+            # Claim a free copy
+            try:
+                book_copy = inventory.checkout_copy(book.pk)
+            except inventory.NoCopyAvailable:
+                raise serializers.ValidationError("No copies available")
+
+            serializer.save(
+                user=self.request.user,
+                book_copy=book_copy,
+                due_date=due_date,
+                status='ACTIVE'
+            )
+            reservations.fulfil(self.request.user, book.pk)
 
     @action(detail=True, methods=['post'])
     def return_book(self, request, pk=None):
@@ -209,8 +211,17 @@ class BookLoanViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        was_overdue = loan.status == 'OVERDUE' or timezone.now() > loan.due_date
+
+        # Update loan status and book availability
+        if not inventory.return_loan(loan):
+            return Response(
+                {"detail": "Book is not currently borrowed"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         # Calculate any fines
-        if loan.status == 'OVERDUE' or timezone.now() > loan.due_date:
+        if was_overdue:
             days_overdue = (timezone.now() - loan.due_date).days
             fine_amount = days_overdue * 1.0  # $1 per day
             
@@ -222,27 +233,21 @@ class BookLoanViewSet(viewsets.ModelViewSet):
                 due_date=timezone.now() + timedelta(days=7)
             )
 
-        # Update loan status
-        loan.return_date = timezone.now()
-        loan.status = 'RETURNED'
-        loan.save()
-
-        # Update book availability
-        loan.book.update_available_copies()
+        return Response({"status": "Book returned successfully"})
 
-        # Check for reservations
-        reservation = Reservation.objects.filter(
-            book=loan.book,
-            status='PENDING'
-        ).first()
+    @action(detail=True, methods=['post'])
+    def mark_lost(self, request, pk=None):
+        if request.user.role not in ['ADMIN', 'LIBRARIAN']:
+            return Response({'detail': 'Not authorized'}, status=403)
 
-        if reservation:
-            reservation.status = 'FULFILLED'
-            reservation.fulfillment_date = timezone.now()
-            reservation.notification_sent = True
-            reservation.save()
+        loan = self.get_object()
+        if not inventory.mark_lost(loan):
+            return Response(
+                {"detail": "Book is not currently borrowed"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        return Response({"status": "Book returned successfully"})
+        return Response({"status": "Loan marked as lost"})
 
 class ReservationViewSet(viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
@@ -253,15 +258,18 @@ class ReservationViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        if user.role in ['ADMIN', 'LIBRARIAN']:
-            return Reservation.objects.all()
-        return Reservation.objects.filter(user=user)
+        queryset = reservations.with_positions(Reservation.objects.all())
+        if user.role not in ['ADMIN', 'LIBRARIAN']:
+            queryset = queryset.filter(user=user)
+        return self.get_serializer_class().setup_eager_loading(
+            queryset, expand=requested_expansions(self.request)
+        )
 
     def perform_create(self, serializer):
         book = serializer.validated_data['book']
         
-        # Check if book is already available
-        if book.available_copies > 0:
+        # Check if book is already available (copies held for others don't count)
+        if reservations.can_borrow(self.request.user, book):
             raise serializers.ValidationError(
                 "Book is currently available. No need to reserve."
             )
@@ -270,7 +278,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
         existing_reservation = Reservation.objects.filter(
             user=self.request.user,
             book=book,
-            status='PENDING'
+            status__in=reservations.ACTIVE
         ).exists()
 
         if existing_reservation:
@@ -279,3 +287,17 @@ class ReservationViewSet(viewsets.ModelViewSet):
             )
 
         serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        reservations.cancel(instance)
+        instance.delete()
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        reservation = self.get_object()
+        if not reservations.cancel(reservation):
+            return Response(
+                {"detail": "Reservation is no longer active"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({"status": "Reservation cancelled"})
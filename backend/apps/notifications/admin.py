@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import OutboxMessage
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'status', 'attempts', 'available_at', 'sent_at')
+    list_filter = ('status', 'sent_at')
+    search_fields = ('recipient', 'subject', 'dedup_key')
+    readonly_fields = ('dedup_key', 'claimed_by', 'created_at', 'updated_at')
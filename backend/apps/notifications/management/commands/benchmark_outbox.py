@@ -0,0 +1,74 @@
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.notifications import outbox
+from apps.notifications.models import OutboxMessage
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure outbox throughput (enqueue + drain) against per-message delivery. '
+        'Use --backend django.core.mail.backends.smtp.EmailBackend with a local '
+        'debugging SMTP server to include connection costs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10000)
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE)
+        parser.add_argument('--rate-limit', type=float, default=None)
+        parser.add_argument('--backend', default='django.core.mail.backends.locmem.EmailBackend')
+        parser.add_argument('--skip-baseline', action='store_true',
+                            help='Do not time one connection per message.')
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        backend = options['backend']
+
+        if not options['skip_baseline']:
+            started = time.perf_counter()
+            for n in range(count):
+                # What send_mail() does: a fresh connection per message
+                get_connection(backend).send_messages([
+                    EmailMessage('Benchmark', f'Message {n}', None, [f'reader{n}@example.com'])
+                ])
+            self._report('per-message', count, time.perf_counter() - started)
+
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                outbox.enqueue_many(
+                    outbox.message(f'benchmark:{n}', 'Benchmark', f'Message {n}', f'reader{n}@example.com')
+                    for n in range(count)
+                )
+                enqueued = time.perf_counter() - started
+                # Running it again must not queue anything new
+                outbox.enqueue_many(
+                    outbox.message(f'benchmark:{n}', 'Benchmark', f'Message {n}', f'reader{n}@example.com')
+                    for n in range(count)
+                )
+                queued = OutboxMessage.objects.filter(dedup_key__startswith='benchmark:').count()
+
+                started = time.perf_counter()
+                sent, failed = outbox.drain(
+                    batch_size=options['batch_size'],
+                    rate_limit=options['rate_limit'],
+                    backend=backend
+                )
+                drained = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+
+        self._report('outbox enqueue', count, enqueued)
+        self._report('outbox drain', sent, drained)
+        self.stdout.write(f"queued={queued} sent={sent} failed={failed}")
+
+    def _report(self, label, count, elapsed):
+        self.stdout.write(f"{label:>16}: {count:>7} messages  {elapsed:8.2f}s  {count / elapsed:10.0f} msg/s")
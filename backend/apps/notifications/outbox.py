@@ -0,0 +1,148 @@
+"""
+Notification outbox.
+
+Tasks never talk to the mail server directly: they ``enqueue`` rendered
+messages, each with a ``dedup_key`` that is unique in the table, so running
+a task twice cannot queue (and therefore send) the same notice twice.
+
+``drain`` delivers the queue in batches. A batch is claimed by flipping its
+rows to SENDING with a lease (``available_at`` in the future), sent over a
+single opened connection with ``send_messages``, and marked SENT in one
+UPDATE. Failed messages are retried with exponential backoff up to
+``MAX_ATTEMPTS``; rows left in SENDING by a crashed worker become claimable
+again once their lease runs out.
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+LEASE = timedelta(minutes=5)
+RETENTION = timedelta(days=30)
+
+
+def message(dedup_key, subject, body, recipient, from_email=None):
+    """Build an unsaved outbox row."""
+    return OutboxMessage(
+        dedup_key=dedup_key,
+        subject=subject,
+        body=body,
+        recipient=recipient,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def enqueue_many(messages, batch_size=1000):
+    """Queue messages; ones whose ``dedup_key`` was already queued are skipped."""
+    messages = [m for m in messages if m.recipient]
+    OutboxMessage.objects.bulk_create(messages, batch_size=batch_size, ignore_conflicts=True)
+    return len(messages)
+
+
+def enqueue(dedup_key, subject, body, recipient, from_email=None):
+    return enqueue_many([message(dedup_key, subject, body, recipient, from_email)])
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    claimable = Q(status='PENDING') | Q(status='SENDING')
+    ids = list(
+        OutboxMessage.objects.filter(claimable, available_at__lte=now)
+        .order_by('available_at', 'pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+
+    # Only rows nobody else claimed in the meantime are flipped
+    token = uuid.uuid4().hex
+    OutboxMessage.objects.filter(claimable, pk__in=ids, available_at__lte=now).update(
+        status='SENDING',
+        claimed_by=token,
+        available_at=now + LEASE,
+        updated_at=now
+    )
+    return list(OutboxMessage.objects.filter(claimed_by=token, status='SENDING').order_by('pk'))
+
+
+def send_batch(batch_size=BATCH_SIZE, backend=None):
+    """Claim and deliver one batch over one connection; returns ``(sent, failed)``."""
+    batch = _claim(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent = []
+    failed = []
+    connection = get_connection(backend)
+    try:
+        connection.open()
+        for row in batch:
+            email = EmailMessage(row.subject, row.body, row.from_email, [row.recipient])
+            try:
+                connection.send_messages([email])
+            except Exception as e:
+                failed.append((row, e))
+            else:
+                sent.append(row.pk)
+    except Exception as e:
+        # Could not connect at all: nothing was sent
+        failed = [(row, e) for row in batch if row.pk not in sent]
+    finally:
+        connection.close()
+
+    now = timezone.now()
+    if sent:
+        OutboxMessage.objects.filter(pk__in=sent).update(
+            status='SENT',
+            sent_at=now,
+            attempts=F('attempts') + 1,
+            last_error='',
+            updated_at=now
+        )
+    for row, error in failed:
+        attempts = row.attempts + 1
+        OutboxMessage.objects.filter(pk=row.pk).update(
+            status='FAILED' if attempts >= MAX_ATTEMPTS else 'PENDING',
+            attempts=attempts,
+            last_error=str(error)[:1000],
+            available_at=now + timedelta(minutes=2 ** attempts),
+            updated_at=now
+        )
+    return len(sent), len(failed)
+
+
+def drain(batch_size=BATCH_SIZE, rate_limit=None, max_batches=None, backend=None):
+    """
+    Send batches until the queue is empty (or ``max_batches`` is reached),
+    sending at most ``rate_limit`` messages per second. Returns ``(sent, failed)``.
+    """
+    total_sent = total_failed = batches = 0
+    while max_batches is None or batches < max_batches:
+        started = time.monotonic()
+        sent, failed = send_batch(batch_size, backend=backend)
+        if not sent and not failed:
+            break
+        total_sent += sent
+        total_failed += failed
+        batches += 1
+        if rate_limit:
+            remaining = (sent + failed) / rate_limit - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+    return total_sent, total_failed
+
+
+def purge(older_than=RETENTION):
+    """Delete delivered messages past the retention window."""
+    deleted, _ = OutboxMessage.objects.filter(
+        status='SENT',
+        sent_at__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
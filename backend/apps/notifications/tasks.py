@@ -0,0 +1,16 @@
+from celery import shared_task
+from django.conf import settings
+from apps.notifications import outbox
+
+@shared_task
+def send_outbox():
+    # Drain the outbox, one reused connection per batch
+    sent, failed = outbox.drain(
+        batch_size=getattr(settings, 'OUTBOX_BATCH_SIZE', outbox.BATCH_SIZE),
+        rate_limit=getattr(settings, 'OUTBOX_RATE_LIMIT', None)
+    )
+    return {'sent': sent, 'failed': failed}
+
+@shared_task
+def purge_outbox():
+    return outbox.purge()
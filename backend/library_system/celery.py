@@ -3,7 +3,7 @@ from celery import Celery
 from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_system.settings.dev')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_system.settings')
 
 app = Celery('library_system')
 
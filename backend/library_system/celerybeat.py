@@ -11,10 +11,50 @@ CELERY_BEAT_SCHEDULE = {
     },
     'process-reservations': {
         'task': 'apps.loans.tasks.process_reservations',
-        'schedule': crontab(minute='*/15'),  # Run every 15 minutes
+        'schedule': crontab(hour='*/1', minute='30'),  # Run hourly
     },
     'cleanup-expired-reservations': {
         'task': 'apps.loans.tasks.cleanup_expired_reservations',
-        'schedule': crontab(hour='*/1', minute='0'),  # Run hourly
+        'schedule': crontab(minute='*/15'),  # Run every 15 minutes
+    },
+    'reconcile-available-copies': {
+        'task': 'apps.loans.tasks.reconcile_available_copies',
+        'schedule': crontab(hour='3', minute='0'),  # Run daily at 3 AM
+    },
+    'send-outbox': {
+        'task': 'apps.notifications.tasks.send_outbox',
+        'schedule': crontab(minute='*'),  # Run every minute
+    },
+    'purge-outbox': {
+        'task': 'apps.notifications.tasks.purge_outbox',
+        'schedule': crontab(hour='4', minute='0'),  # Run daily at 4 AM
+    },
+    'flush-daily-stats': {
+        'task': 'apps.dashboard.tasks.flush_daily_stats',
+        'schedule': crontab(minute='*'),  # Run every minute
+    },
+    'backfill-daily-stats': {
+        'task': 'apps.dashboard.tasks.backfill_daily_stats',
+        'schedule': crontab(hour='1', minute='0'),  # Run daily at 1 AM
+    },
+    'refresh-leaderboards': {
+        'task': 'apps.dashboard.tasks.refresh_leaderboards',
+        'schedule': crontab(minute='*/10'),  # Run every 10 minutes
+    },
+    'rebuild-leaderboards': {
+        'task': 'apps.dashboard.tasks.rebuild_leaderboards',
+        'schedule': crontab(hour='2', minute='0'),  # Run daily at 2 AM
+    },
+    'rollover-book-activities': {
+        'task': 'apps.dashboard.tasks.rollover_book_activities',
+        'schedule': crontab(hour='2', minute='30'),  # Run daily at 2:30 AM
+    },
+    'refresh-facets': {
+        'task': 'apps.books.tasks.refresh_facets',
+        'schedule': crontab(minute='*'),  # Run every minute
+    },
+    'compute-similar-books': {
+        'task': 'apps.books.tasks.compute_similar_books',
+        'schedule': crontab(hour='5', minute='0'),  # Run daily at 5 AM
     },
-}
\ No newline at end of file
+}
@@ -0,0 +1,96 @@
+"""
+Tagged cache for rendered page fragments.
+
+``get_or_render(name, vary, render)`` returns the fragment cached for
+``name`` and the ``vary`` values (typically the query parameters), or calls
+``render()``, which returns ``(html, tags)``, and caches the result. Tags
+name the rows the fragment was built from (``book:42``, ``catalog``);
+``invalidate(*tags)`` drops every fragment carrying one of them without
+having to know which fragments exist.
+
+Every tag keeps the time of its last invalidation in the cache and every
+fragment the time its rendering started; a fragment is only served if none
+of its tags has been invalidated since, which costs one ``get_many`` per
+hit. Invalidate after commit: a render that read the old rows started
+before the invalidation and is discarded. A tag missing from the cache
+(evicted) is re-created as "invalidated just before this render", so
+fragments older than the eviction are not trusted.
+
+Hits and misses are counted per fragment name in-process, see ``stats``.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+FRAGMENT_PREFIX = 'fragments:'
+TAG_PREFIX = 'fragments:tag:'
+
+_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _tag_keys(tags):
+    return [TAG_PREFIX + tag for tag in tags]
+
+
+def _fresh(entry):
+    keys = _tag_keys(entry['tags'])
+    stamps = cache.get_many(keys)
+    return len(stamps) == len(keys) and all(stamp < entry['started'] for stamp in stamps.values())
+
+
+def _count(name, hit):
+    with _lock:
+        (_hits if hit else _misses)[name] += 1
+
+
+def get_or_render(name, vary, render):
+    if not _setting('FRAGMENT_CACHE_ENABLED', True):
+        return render()[0]
+
+    digest = hashlib.blake2b(repr(vary).encode(), digest_size=16).hexdigest()
+    key = f'{FRAGMENT_PREFIX}{name}:{digest}'
+    entry = cache.get(key)
+    if entry is not None and _fresh(entry):
+        _count(name, True)
+        return mark_safe(entry['html'])
+
+    _count(name, False)
+    started = time.time_ns()
+    html, tags = render()
+    tags = sorted(set(tags))
+    keys = _tag_keys(tags)
+    for tag_key in set(keys) - cache.get_many(keys).keys():
+        cache.add(tag_key, started - 1, None)
+    cache.set(key, {'started': started, 'tags': tags, 'html': str(html)},
+              _setting('FRAGMENT_CACHE_TIMEOUT', 60 * 60))
+    return mark_safe(html)
+
+
+def invalidate(*tags):
+    if tags:
+        cache.set_many(dict.fromkeys(_tag_keys(tags), time.time_ns()), None)
+
+
+def stats():
+    """``{name: {'hits', 'misses', 'hit_ratio'}}`` for this process."""
+    with _lock:
+        names = set(_hits) | set(_misses)
+        return {
+            name: {
+                'hits': _hits[name],
+                'misses': _misses[name],
+                'hit_ratio': round(_hits[name] / (_hits[name] + _misses[name]), 3),
+            }
+            for name in sorted(names)
+        }
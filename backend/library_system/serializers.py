@@ -0,0 +1,53 @@
+"""
+Sparse fieldsets and opt-in expansion for API serializers.
+
+Nested objects are rendered with compact summary serializers by default.
+On GET requests clients can ask for more or less:
+
+* ``?fields=id,status,book`` keeps only the listed top-level fields;
+* ``?expand=book,loan.book`` replaces the summary of a nested field with the
+  full serializer named in ``Meta.expandable_fields`` (dotted paths expand
+  inside an expanded field).
+"""
+
+
+def split_param(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def requested_expansions(request):
+    """The ``?expand=`` paths of a GET request (used to pick the prefetch plan)."""
+    if request is None or request.method != 'GET':
+        return []
+    return split_param(request.query_params.get('expand'))
+
+
+def nested_expansions(expand, name):
+    """``['loan.book', 'user']`` -> ``['book']`` for ``name='loan'``."""
+    return [path.split('.', 1)[1] for path in expand if path.startswith(f'{name}.')]
+
+
+class DynamicFieldsMixin:
+    """Apply ``?fields=`` and ``?expand=`` to the serializer the view instantiates."""
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if fields is None and expand is None and request is not None and request.method == 'GET':
+            fields = split_param(request.query_params.get('fields'))
+            expand = split_param(request.query_params.get('expand'))
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in dict.fromkeys(path.split('.', 1)[0] for path in expand or []):
+            if name not in expandable:
+                continue
+            serializer_class = expandable[name]
+            if issubclass(serializer_class, DynamicFieldsMixin):
+                self.fields[name] = serializer_class(read_only=True, expand=nested_expansions(expand, name))
+            else:
+                self.fields[name] = serializer_class(read_only=True)
+
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
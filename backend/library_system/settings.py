@@ -22,6 +22,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Payment gateway settings
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
+RAZORPAY_API_URL = os.getenv("RAZORPAY_API_URL", "https://api.razorpay.com/v1")
+PAYMENT_GATEWAY_TIMEOUT = 10  # seconds, per call (apps.fines.gateway)
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -61,9 +63,11 @@ INSTALLED_APPS = [
     'apps.loans',
     'apps.fines',
     'apps.dashboard',
+    'apps.notifications',
 ]
 
 MIDDLEWARE = [
+    'apps.dashboard.profiling.ProfilingMiddleware',  # First, so it times the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
@@ -106,9 +110,30 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so concurrent
+            # writers wait for each other instead of failing on lock upgrade
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # A file rather than shared-cache memory, where concurrent connections
+        # (the threaded TransactionTestCases) fail instead of waiting for locks
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# PostgreSQL when DB_NAME is set (see the README's .env); SQLite otherwise
+if os.getenv('DB_NAME'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NAME'),
+        'USER': os.getenv('DB_USER', ''),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -162,7 +187,7 @@ AUTH_USER_MODEL = 'accounts.User'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'apps.accounts.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -207,11 +232,13 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+from .celerybeat import CELERY_BEAT_SCHEDULE  # noqa: E402
 
 # Cache settings
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        # RedisCache counting hits and misses for apps.dashboard.profiling
+        'BACKEND': 'apps.dashboard.profiling.InstrumentedRedisCache',
         'LOCATION': 'redis://127.0.0.1:6379/1',
     }
 }
@@ -225,6 +252,10 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
             'style': '{',
         },
+        'message': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'file': {
@@ -238,6 +269,12 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        'profiling': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'logs' / 'profiling.log',
+            'formatter': 'message',
+        },
     },
     'root': {
         'handlers': ['console', 'file'],
@@ -249,9 +286,67 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # One JSON object per profiled request
+        'apps.dashboard.profiling': {
+            'handlers': ['profiling'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        # Logs every payment gateway call at INFO
+        'httpx': {
+            'level': 'WARNING',
+        },
     },
 }
 
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
 DEFAULT_FROM_EMAIL = 'noreply@library.com'
+
+# Notification outbox (apps.notifications): messages per batch/connection and
+# the maximum send rate in messages per second (None = unlimited)
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_RATE_LIMIT = None
+
+# Book activity log (apps.dashboard.activity): events are buffered in-process
+# and written in batches by a background thread
+ACTIVITY_LOG_ENABLED = True
+ACTIVITY_BATCH_SIZE = 500
+ACTIVITY_FLUSH_INTERVAL = 1.0  # seconds
+ACTIVITY_MAX_BUFFER = 50000
+ACTIVITY_RETENTION_DAYS = 90
+
+# Per-user account snapshots (apps.accounts.snapshot); invalidated by loan and
+# fine events, the timeout only bounds memory. Catalog counters are shared.
+ACCOUNT_SNAPSHOT_TIMEOUT = 15 * 60  # seconds
+CATALOG_COUNTS_TIMEOUT = 60  # seconds
+
+# Catalog facet counts (apps.books.facets): readers rebuild a grid that has been
+# dirty for longer than this, otherwise the refresh_facets task does
+FACETS_MAX_STALENESS = 60  # seconds
+
+# Reservations (apps.loans.reservations): how long a copy is held for the
+# member at the head of the queue before it passes to the next one
+RESERVATION_HOLD_HOURS = 48
+
+# Request profiling (apps.dashboard.profiling): the share of requests measured,
+# samples kept per view for /api/profiling/, and where to write cProfile dumps
+# of requests slower than PROFILING_SLOW_MS (None = no profiler)
+PROFILING_SAMPLE_RATE = 1.0 if DEBUG else 0.05
+PROFILING_WINDOW = 1000
+PROFILING_SERVER_TIMING = True
+PROFILING_PROFILE_DIR = None
+PROFILING_SLOW_MS = 500
+
+# Cached catalog page fragments (library_system.fragments), invalidated by tag
+# when the books, authors or categories they show change
+FRAGMENT_CACHE_ENABLED = True
+FRAGMENT_CACHE_TIMEOUT = 60 * 60  # seconds
+
+# API token authentication (apps.accounts.authentication): resolved tokens are
+# kept in the shared cache and, briefly, in-process; tokens expire after
+# AUTH_TOKEN_TTL seconds (None = never)
+AUTH_TOKEN_TTL = None
+AUTH_TOKEN_CACHE_TIMEOUT = 15 * 60  # seconds
+AUTH_TOKEN_LOCAL_CACHE_TTL = 5  # seconds, 0 = shared cache only
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 10000
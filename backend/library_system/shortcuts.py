@@ -0,0 +1,12 @@
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+
+
+async def arender(request, template_name, context=None):
+    """
+    ``render`` for async views. Context processors read ``request.user``, which
+    Django loads synchronously and apart from ``request.auser()``; hand them
+    the awaited user and render in a worker thread.
+    """
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, template_name, context)
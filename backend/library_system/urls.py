@@ -10,6 +10,10 @@ urlpatterns = [
     path('books/', include('apps.books.urls')),
     path('loans/', include('apps.loans.urls')),
     path('fines/', include('apps.fines.urls')),
+    path('api/', include('apps.books.api_urls')),
+    path('api/', include('apps.fines.api_urls')),
+    path('api/', include('apps.dashboard.api_urls')),
+    path('api/', include('apps.accounts.api_urls')),
     path('api-auth/', include('rest_framework.urls')),
 ]
 